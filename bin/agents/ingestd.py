@@ -17,7 +17,18 @@ except:
     print('You need to set your PYTHONPATH to include the infoset library')
     sys.exit(2)
 from infoset.cache import cache
+from infoset.cache import watch
 from infoset.utils import hidden
+from infoset.utils import jm_configuration
+
+# Seconds between full scans of the cache directory in watch mode
+_RESCAN_INTERVAL = 300
+
+# Maximum seconds to wait for new files in watch mode
+_WAIT_INTERVAL = 60
+
+# Seconds between reports of the state of the ingest queue
+_STATUS_INTERVAL = 60
 
 
 class PollingAgent(object):
@@ -72,10 +83,43 @@ class PollingAgent(object):
             None
 
         """
+        # Initialize key variables
+        config = jm_configuration.Config()
+        watcher = None
+        rescan = 0
+        report = 0
+
+        # Watch the cache directory for new files if configured
+        if config.ingest_watch() is True:
+            watcher = watch.Watcher(config.ingest_cache_directory())
+            if watcher.enabled() is False:
+                watcher = None
+
         # Do the daemon thing
         while True:
-            cache.process(self.agent_name)
-            time.sleep(5)
+            if watcher is None:
+                # Poll the cache directory
+                cache.process(self.agent_name)
+                time.sleep(5)
+            else:
+                # Periodically rescan the whole directory in case events
+                # were missed. Process new files as soon as they arrive.
+                if time.time() - rescan >= _RESCAN_INTERVAL:
+                    rescan = time.time()
+                    cache.process(self.agent_name)
+                filepaths = watcher.wait(_WAIT_INTERVAL)
+                if filepaths is None:
+                    rescan = 0
+                elif bool(filepaths) is True:
+                    cache.process(self.agent_name, filepaths)
+
+            # Keep the claims of this daemon alive
+            cache.heartbeat(self.agent_name)
+
+            # Report the state of the ingest queue
+            if time.time() - report >= _STATUS_INTERVAL:
+                report = time.time()
+                cache.status(self.agent_name)
 
             # Update the PID file timestamp (important)
             update = hidden.Touch()
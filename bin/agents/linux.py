@@ -13,10 +13,6 @@ Description:
 import sys
 import json
 import logging
-from time import sleep
-
-# Pip3 libraries
-import requests
 
 # infoset libraries
 try:
@@ -25,7 +21,6 @@ except:
     print('You need to set your PYTHONPATH to include the infoset library')
     sys.exit(2)
 from infoset.utils import jm_configuration
-from infoset.utils import hidden
 
 logging.getLogger('requests').setLevel(logging.WARNING)
 logging.basicConfig(level=logging.DEBUG)
@@ -62,6 +57,14 @@ class PollingAgent(object):
         # Get configuration
         self.config = jm_configuration.ConfigAgent(self.agent_name)
 
+        # Keep a connection to each polled host alive, apart from the
+        # connections to the central server
+        self.session = Agent.Session(
+            self.config.agent_connect_timeout(),
+            self.config.agent_read_timeout(),
+            self.config.agent_retries(), 1,
+            servers=len(self.config.agent_hostnames()))
+
     def name(self):
         """Return agent name.
 
@@ -86,17 +89,11 @@ class PollingAgent(object):
             None
 
         """
-        # Post data to the remote server
+        # Post data to the remote server. Hosts are polled every 300
+        # seconds, each at its own offset within the interval.
         while True:
             self._poll()
 
-            # Sleep
-            sleep(300)
-
-            # Update the PID file timestamp (important)
-            update = hidden.Touch()
-            update.pid(self.name())
-
     def _poll(self):
         """Query all remote hosts for data.
 
@@ -109,16 +106,24 @@ class PollingAgent(object):
         """
         # Initialize key variables
         pollers = []
+        batch = Agent.Batch(self.config)
 
         # Create a list of polling objects
         hostnames = self.config.agent_hostnames()
         for hostname in hostnames:
-            poller = Poller(hostname, self.agent_name)
+            poller = Poller(hostname, self.agent_name, batch, self.session)
             pollers.append(poller)
 
-        # Start threaded polling
+        # Start threaded polling. This waits for the next cycle even if
+        # there are no hosts.
+        Agent.threads(self.agent_name, pollers, interval=300)
         if bool(pollers) is True:
-            Agent.threads(self.agent_name, pollers)
+            # Post the data of the remaining hosts
+            batch.post()
+
+            # Post cached data once the server has accepted new data
+            if bool(batch.posted) is True:
+                Agent.purger(self.config).start()
 
 
 class Poller(object):
@@ -136,12 +141,14 @@ class Poller(object):
         post:
     """
 
-    def __init__(self, hostname, agent_name):
+    def __init__(self, hostname, agent_name, batch, session):
         """Method initializing the class.
 
         Args:
             hostname: Hostname to poll
             agent_name: Name of agent
+            batch: Agent.Batch object to post data with
+            session: Agent.Session object to get data with
 
         Returns:
             None
@@ -150,6 +157,8 @@ class Poller(object):
         # Initialize key variables
         self.agent_name = agent_name
         self.hostname = hostname
+        self.batch = batch
+        self.session = session
 
         # Get configuration
         self.config = jm_configuration.ConfigAgent(self.agent_name)
@@ -177,7 +186,7 @@ class Poller(object):
 
         # Post data save to cache if this fails
         try:
-            result = requests.get(url)
+            result = self.session.get(url)
             response = True
         except:
             response = False
@@ -191,13 +200,10 @@ class Poller(object):
             # Initialize key variables
             agent = Agent.Agent(self.config, self.hostname)
 
-            # Post data after converting it to json from string
+            # Post data after converting it to json from string. The
+            # cache is purged once the batch is posted.
             data = json.loads(result.text)
-            post_success = agent.post(data=data)
-
-            # Purge cache if success is True
-            if post_success is True:
-                agent.purge()
+            self.batch.add(agent, data=data)
 
 
 def main():
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""Infoset receiver daemon.
+
+Receives agent data posted to /receive/<uid> with asyncio. Can replace the
+route of the web server when many agents post at the same time. Agents
+must be configured to post to the receiver's "agent_port".
+
+"""
+
+# Standard libraries
+import sys
+
+# Infoset libraries
+try:
+    from infoset.agents import agent as Agent
+except:
+    print('You need to set your PYTHONPATH to include the infoset library')
+    sys.exit(2)
+from infoset.cache import receiver
+from infoset.utils import jm_configuration
+
+
+class PollingAgent(object):
+    """Infoset agent that receives data.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Functions:
+        __init__:
+        name:
+        query:
+    """
+
+    def __init__(self):
+        """Method initializing the class.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.agent_name = 'receiverd'
+
+    def name(self):
+        """Return agent name.
+
+        Args:
+            None
+
+        Returns:
+            value: Name of agent
+
+        """
+        # Return
+        value = self.agent_name
+        return value
+
+    def query(self):
+        """Receive data until the daemon is stopped.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        config = jm_configuration.Config()
+        agent_config = jm_configuration.ConfigAgent(self.agent_name)
+
+        # Do the daemon thing
+        receiver.serve(config, agent_config.agent_port(), self.agent_name)
+
+
+def main():
+    """Receive agent data.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    """
+    # Get configuration
+    cli = Agent.AgentCLI()
+    poller = PollingAgent()
+
+    # Do control
+    cli.control(poller)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,6 @@ Extracts agent data from cache directory files.
 # Standard libraries
 import sys
 from collections import defaultdict
-from time import sleep
 
 # infoset libraries
 try:
@@ -19,7 +18,6 @@ except:
 from infoset.utils import jm_configuration
 from infoset.utils import jm_general
 from infoset.utils import log
-from infoset.utils import hidden
 from infoset.db import db_oid
 from infoset.db import db_host
 from infoset.db import db_hostoid
@@ -81,17 +79,11 @@ class PollingAgent(object):
             None
 
         """
-        # Post data to the remote server
+        # Post data to the remote server. Hosts are polled every 300
+        # seconds, each at its own offset within the interval.
         while True:
             self._poll()
 
-            # Sleep
-            sleep(300)
-
-            # Update the PID file timestamp (important)
-            update = hidden.Touch()
-            update.pid(self.name())
-
     def _poll(self):
         """Query all remote hosts for data.
 
@@ -104,6 +96,7 @@ class PollingAgent(object):
         """
         # Initialize key variables
         pollers = []
+        batch = Agent.Batch(self.config)
 
         # Create a list of polling objects
         hostnames = self.config.agent_hostnames()
@@ -120,12 +113,19 @@ class PollingAgent(object):
                 continue
 
             # Add poller
-            poller = Poller(hostname, self.agent_name)
+            poller = Poller(hostname, self.agent_name, batch)
             pollers.append(poller)
 
-        # Start threaded polling
+        # Start threaded polling. This waits for the next cycle even if
+        # there are no hosts.
+        Agent.threads(self.agent_name, pollers, interval=300)
         if bool(pollers) is True:
-            Agent.threads(self.agent_name, pollers)
+            # Post the data of the remaining hosts
+            batch.post()
+
+            # Post cached data once the server has accepted new data
+            if bool(batch.posted) is True:
+                Agent.purger(self.config).start()
 
 
 class Poller(object):
@@ -143,12 +143,13 @@ class Poller(object):
         post:
     """
 
-    def __init__(self, hostname, agent_name):
+    def __init__(self, hostname, agent_name, batch):
         """Method initializing the class.
 
         Args:
             hostname: Hostname to poll
             agent_name: Name of agent
+            batch: Agent.Batch object to post data with
 
         Returns:
             None
@@ -157,6 +158,7 @@ class Poller(object):
         # Initialize key variables
         self.agent_name = agent_name
         self.hostname = hostname
+        self.batch = batch
 
         # Get configuration
         config = jm_configuration.ConfigAgent(self.agent_name)
@@ -260,7 +262,7 @@ class Poller(object):
                 self.agent.populate(datapoints)
 
         # Post data
-        self.agent.post()
+        self.batch.add(self.agent)
 
     def _master(self):
         """Create the master dictionary for the host.
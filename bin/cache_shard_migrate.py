@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Move cache files in flat cache directories into the sharded layout.
+
+Should be run after setting "ingest_cache_sharded" to True in the
+configuration. Files in the flat layout are processed until they are
+moved, so this isn't mandatory.
+
+"""
+
+# Standard libraries
+import argparse
+
+# Infoset libraries
+from infoset.utils import jm_configuration
+from infoset.utils import spool
+
+
+def cli():
+    """Return all the CLI options.
+
+    Args:
+        None
+
+    Returns:
+        args: Namespace() containing all of our CLI arguments as objects
+            - directory: Cache directory to migrate
+
+    """
+    # Header for the help menu of the application
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    # CLI argument for the directory
+    parser.add_argument(
+        '--directory',
+        required=False,
+        type=str,
+        help=(
+            'Cache directory to migrate. Defaults to the ingest cache '
+            'directory if it uses the sharded layout.')
+    )
+
+    # Get the parser value
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    """Migrate cache directories.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    """
+    # Initialize key variables
+    directories = []
+    cli_args = cli()
+
+    # Get directories to process
+    if cli_args.directory is not None:
+        directories.append(cli_args.directory)
+    else:
+        config = jm_configuration.Config()
+        if config.ingest_cache_sharded() is True:
+            directories.append(config.ingest_cache_directory())
+
+    # Process directories
+    for directory in directories:
+        count = spool.migrate(directory)
+        print('Moved %s files in %s' % (count, directory))
+
+
+if __name__ == "__main__":
+    main()
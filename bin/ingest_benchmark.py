@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""Benchmark the ingestion of agent cache files.
+
+Generates cache files with the layout created by infoset agents, then
+ingests them and reports throughput, per-stage latency percentiles and
+peak memory use.
+
+By default files are ingested one at a time so that each stage can be
+timed:
+
+    drain:  Read, validate and decode the file (validate.ValidateCache)
+    update: Update the database (cache.UpdateDB)
+    purge:  Delete the file
+
+With --daemon the files are written to the ingest cache directory and
+ingested by the threads of the ingest daemon instead. Only the overall
+throughput is reported.
+
+Data is written to the configured database unless --sqlite is used.
+Point the configuration at a scratch database before benchmarking.
+
+"""
+
+# Standard libraries
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+
+# PIP libraries
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.dialects.mysql import BIGINT
+
+# Infoset libraries
+from infoset.db import db
+from infoset.db import db_orm
+from infoset.utils import jm_configuration
+from infoset.utils import jm_general
+from infoset.utils import log
+from infoset.utils import compact
+from infoset.utils import spool
+from infoset.cache import cache
+from infoset.cache import drain
+from infoset.cache import registry
+
+# Base types of chartable data. Gauge, Counter32 and Counter64
+_BASE_TYPES = [1, 32, 64]
+
+# Seconds between the timestamps of consecutive files of a host
+_INTERVAL = 300
+
+
+def cli():
+    """Return all the CLI options.
+
+    Args:
+        None
+
+    Returns:
+        args: Namespace() containing all of our CLI arguments as objects
+
+    """
+    # Header for the help menu of the application
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    # Shape of the data
+    parser.add_argument(
+        '--hosts', type=int, default=10,
+        help='Number of hosts. Default 10.')
+    parser.add_argument(
+        '--labels', type=int, default=10,
+        help='Number of chartable labels per file. Default 10.')
+    parser.add_argument(
+        '--sources', type=int, default=20,
+        help='Number of datapoints per label. Default 20.')
+    parser.add_argument(
+        '--other', type=int, default=5,
+        help='Number of unchartable labels per file. Default 5.')
+    parser.add_argument(
+        '--backlog', type=int, default=10,
+        help='Number of files per host. Default 10.')
+
+    # Format of the data
+    parser.add_argument(
+        '--compact', action='store_true',
+        help='Create files in the compact format.')
+    parser.add_argument(
+        '--dids', action='store_true',
+        help='Add precomputed DIDs to the datapoints.')
+
+    # How to ingest
+    parser.add_argument(
+        '--daemon', action='store_true',
+        help='Ingest with the threads of the ingest daemon.')
+    parser.add_argument(
+        '--sqlite', type=str,
+        help='Use a new SQLite database in this file.')
+    parser.add_argument(
+        '--json', action='store_true',
+        help='Print the results as JSON.')
+
+    # Get the parser value
+    args = parser.parse_args()
+    return args
+
+
+def generate(args, uid, directory, sharded):
+    """Create cache files.
+
+    Args:
+        args: CLI arguments
+        uid: Agent UID
+        directory: Cache directory
+        sharded: Use the sharded layout if True
+
+    Returns:
+        filepaths: List of cache filepaths, oldest first
+        datapoints: Number of datapoints in the files
+
+    """
+    # Initialize key variables
+    filepaths = []
+    datapoints = 0
+    last = jm_general.normalized_timestamp()
+
+    for host in range(args.hosts):
+        hostname = ('benchmark-host-%s') % (host)
+        hosthash = jm_general.hashstring(hostname, sha=1)
+
+        for count in range(args.backlog):
+            # Create data
+            timestamp = last - _INTERVAL * (args.backlog - count - 1)
+            data = {
+                'uid': uid, 'agent': 'benchmark', 'hostname': hostname,
+                'timestamp': timestamp, 'chartable': {}, 'other': {}}
+            for number in range(args.labels):
+                label = ('benchmark_chartable_%s') % (number)
+                data['chartable'][label] = {
+                    'base_type': _BASE_TYPES[number % len(_BASE_TYPES)],
+                    'description': label,
+                    'data': [
+                        [index, random.randint(0, 2 ** 32),
+                         ('interface%s') % (index)]
+                        for index in range(args.sources)]}
+            for number in range(args.other):
+                label = ('benchmark_other_%s') % (number)
+                data['other'][label] = {
+                    'base_type': None,
+                    'description': label,
+                    'data': [[0, ('version %s') % (number), None]]}
+            datapoints += args.labels * args.sources + args.other
+
+            # Add DIDs
+            if args.dids is True:
+                for data_type in ['chartable', 'other']:
+                    for label, group in data[data_type].items():
+                        for datapoint in group['data']:
+                            datapoint.append(jm_general.did(
+                                uid, label, datapoint[0], 'benchmark',
+                                hostname))
+
+            # Save
+            if args.compact is True:
+                filepath = spool.save(
+                    directory, data, hosthash, sharded,
+                    payload=compact.encode(data),
+                    extension=compact.EXTENSION)
+            else:
+                filepath = spool.save(directory, data, hosthash, sharded)
+            filepaths.append((timestamp, filepath))
+
+    # Return
+    filepaths = [filepath for (_, filepath) in sorted(filepaths)]
+    return (filepaths, datapoints)
+
+
+def ingest(filepaths):
+    """Ingest cache files one at a time.
+
+    Args:
+        filepaths: List of cache filepaths, oldest first
+
+    Returns:
+        timings: Dict of lists of the seconds taken by each stage
+
+    """
+    # Initialize key variables
+    timings = {'drain': [], 'update': [], 'purge': []}
+    registry.REGISTRY.refresh(force=True)
+
+    for filepath in filepaths:
+        start = time.perf_counter()
+        drained = drain.Drain(filepath)
+        if drained.valid() is False:
+            log_message = ('Benchmark cache file %s is invalid') % (filepath)
+            log.log2die(1121, log_message)
+        drained_at = time.perf_counter()
+        cache.UpdateDB(drained).update()
+        updated_at = time.perf_counter()
+        drained.purge()
+        purged_at = time.perf_counter()
+
+        timings['drain'].append(drained_at - start)
+        timings['update'].append(updated_at - drained_at)
+        timings['purge'].append(purged_at - updated_at)
+
+    # Return
+    return timings
+
+
+def ingest_daemon():
+    """Ingest the files in the ingest cache directory with the daemon.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    """
+    # Wait for the ingest threads to finish
+    cache.process('ingestd')
+    while cache.SCHEDULER.idle() is False:
+        time.sleep(0.01)
+
+
+def percentile(values, percent):
+    """Get a percentile of a list of values using the nearest rank.
+
+    Args:
+        values: List of values
+        percent: Percentile
+
+    Returns:
+        value: Value
+
+    """
+    # Return
+    ordered = sorted(values)
+    rank = max(0, math.ceil(len(ordered) * percent / 100) - 1)
+    value = ordered[rank]
+    return value
+
+
+def sqlite(filename):
+    """Use a new SQLite database in place of the configured database.
+
+    The MySQL specific column types and defaults of the tables are
+    replaced with ones SQLite supports.
+
+    Args:
+        filename: SQLite database file
+
+    Returns:
+        None
+
+    """
+    # Use INTEGER so that primary keys are auto incremented
+    @compiles(BIGINT, 'sqlite')
+    def _bigint(element, compiler, **kw):
+        return 'INTEGER'
+
+    for table in db_orm.BASE.metadata.tables.values():
+        for column in table.columns:
+            if column.name in ['ts_modified', 'ts_created']:
+                column.server_default = None
+
+    # Create the database
+    if os.path.exists(filename) is True:
+        os.remove(filename)
+    engine = create_engine(('sqlite:///%s') % (filename))
+    db_orm.BASE.metadata.create_all(engine)
+    db.POOL = sessionmaker(bind=engine)
+
+
+def main():
+    """Run the benchmark.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    """
+    # Initialize key variables
+    args = cli()
+    config = jm_configuration.Config()
+    uid = jm_general.hashstring(str(random.random()))[:16]
+    results = {
+        'hosts': args.hosts, 'files': args.hosts * args.backlog,
+        'compact': args.compact, 'dids': args.dids, 'daemon': args.daemon}
+
+    if args.sqlite is not None:
+        sqlite(args.sqlite)
+
+    # Create files
+    if args.daemon is True:
+        directory = None
+        (filepaths, datapoints) = generate(
+            args, uid, config.ingest_cache_directory(),
+            config.ingest_cache_sharded())
+    else:
+        directory = tempfile.mkdtemp()
+        (filepaths, datapoints) = generate(args, uid, directory, False)
+    results['datapoints'] = datapoints
+
+    # Ingest
+    start = time.perf_counter()
+    if args.daemon is True:
+        ingest_daemon()
+    else:
+        timings = ingest(filepaths)
+        shutil.rmtree(directory)
+        for stage, values in sorted(timings.items()):
+            results[stage] = {
+                'p50': percentile(values, 50),
+                'p90': percentile(values, 90),
+                'p99': percentile(values, 99),
+                'max': max(values)}
+    seconds = time.perf_counter() - start
+
+    # Summarize
+    results['seconds'] = seconds
+    results['files_per_second'] = len(filepaths) / seconds
+    results['datapoints_per_second'] = datapoints / seconds
+    results['peak_rss_kb'] = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    # Report
+    if args.json is True:
+        print(json.dumps(results, sort_keys=True))
+        return
+    print(('Files:            %s (%s datapoints)') % (
+        results['files'], datapoints))
+    print(('Time:             %.2f s') % (seconds))
+    print(('Throughput:       %.1f files/s, %.0f datapoints/s') % (
+        results['files_per_second'], results['datapoints_per_second']))
+    print(('Peak RSS:         %s KB') % (results['peak_rss_kb']))
+    for stage in ['drain', 'update', 'purge']:
+        if stage in results:
+            print((
+                '%-7s latency:   p50 %.1f ms, p90 %.1f ms, p99 %.1f ms, '
+                'max %.1f ms') % (
+                    stage.capitalize(), results[stage]['p50'] * 1000,
+                    results[stage]['p90'] * 1000,
+                    results[stage]['p99'] * 1000,
+                    results[stage]['max'] * 1000))
+
+
+if __name__ == "__main__":
+    main()
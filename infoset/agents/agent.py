@@ -17,11 +17,11 @@ import json
 import logging
 import time
 from collections import defaultdict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from random import random
 import argparse
-import queue as Queue
 import threading
-from copy import deepcopy
 
 # pip3 libraries
 import requests
@@ -32,10 +32,31 @@ from infoset.utils import Daemon
 from infoset.utils import log
 from infoset.utils import jm_general
 from infoset.utils import jm_configuration
+from infoset.utils import spool
+from infoset.utils import segment
+from infoset.utils import compact
+from infoset.utils import encoding
+from infoset.utils.log import LogThread
+from infoset.agents import payload
+from infoset.agents import scheduler
 from infoset.metadata import language
 
-# Define a key global variable
-THREAD_QUEUE = Queue.Queue()
+# Connection pool of the agent. Created on first use
+SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+# Circuit breakers keyed by server URL. Created on first use
+BREAKERS = {}
+_BREAKER_LOCK = threading.Lock()
+
+# Language files keyed by agent name. Read on first use
+LANGUAGES = {}
+_LANGUAGE_LOCK = threading.Lock()
+
+# Segment logs and purges keyed by agent UID. Created on first use
+SEGMENTS = {}
+PURGES = {}
+_SPOOL_LOCK = threading.Lock()
 
 logging.getLogger('requests').setLevel(logging.WARNING)
 logging.basicConfig(level=logging.DEBUG)
@@ -69,31 +90,39 @@ class Agent(object):
 
         """
         # Initialize key variables
-        self.data = defaultdict(lambda: defaultdict(dict))
         agent_name = config.agent_name()
         uid = get_uid(agent_name)
-        self.lang = language.Agent(agent_name)
+        self.lang = language_agent(agent_name)
 
         # Add timestamp
-        self.data['timestamp'] = jm_general.normalized_timestamp()
-        self.data['uid'] = uid
-        self.data['agent'] = agent_name
-        self.data['hostname'] = hostname
+        self.payload = payload.Payload(
+            jm_general.normalized_timestamp(), uid, agent_name, hostname)
 
         # Construct URL for server
-        if config.server_https() is True:
-            prefix = 'https://'
-        else:
-            prefix = 'http://'
-        self.url = (
-            '%s%s:%s/receive/%s') % (
-                prefix, config.server_name(),
-                config.server_port(), uid)
+        self.url = ('%s/receive/%s') % (server_url(config), uid)
+        self.session = session(config)
+        self.breaker = breaker(config)
 
-        # Create the cache directory
-        self.cache_dir = config.agent_cache_directory()
-        if os.path.exists(self.cache_dir) is False:
-            os.mkdir(self.cache_dir)
+        # Data that can't be posted is saved in the segment log
+        self.segments = segments(config)
+        self.purger = purger(config)
+
+        # Send DIDs so that the server doesn't have to create them
+        self.precompute_dids = config.agent_precompute_dids()
+
+        # Post data in the compact format. Disabled if the server
+        # doesn't support it.
+        self.compact = config.agent_compact_format()
+
+        # Compress posted JSON data. Disabled if the server doesn't
+        # support it.
+        self.compression = config.agent_compression()
+        if encoding.supported(self.compression) is False:
+            log_message = (
+                'Compression "%s" is not supported. Using gzip.'
+                '') % (self.compression)
+            log.log2warn(1123, log_message)
+            self.compression = 'gzip'
 
     def name(self):
         """Return the name of the agent.
@@ -106,39 +135,28 @@ class Agent(object):
 
         """
         # Return
-        value = self.data['agent']
+        value = self.payload.agent
         return value
 
     def populate(self, data_in):
         """Populate data for agent to eventually send to server.
 
         Args:
-            data_in: dict of datapoint values from agent
-            chartable: Chartable data if True
+            data_in: dict of datapoint values from agent. The list of
+                datapoints is used as is, not copied.
 
         Returns:
             None
 
         """
-        # Initialize data
-        data = deepcopy(data_in)
-
         # Validate base_type
-        if len(data) != 1 or isinstance(data, defaultdict) is False:
-            log_message = ('Agent data "%s" is invalid') % (data)
+        if len(data_in) != 1 or isinstance(data_in, defaultdict) is False:
+            log_message = ('Agent data "%s" is invalid') % (data_in)
             log.log2die(1025, log_message)
 
-        # Get a description to use for label value
-        for label in data.keys():
-            description = self.lang.label_description(label)
-            data[label]['description'] = description
-            break
-
-        # Add data to appropriate self.data key
-        if data[label]['base_type'] is not None:
-            self.data['chartable'].update(data)
-        else:
-            self.data['other'].update(data)
+        # Add the data of the label
+        for label, values in data_in.items():
+            self._add(label, values['base_type'], values['data'])
 
     def populate_single(self, label, value, base_type=None, source=None):
         """Populate a single value in the agent.
@@ -153,13 +171,8 @@ class Agent(object):
             None
 
         """
-        # Initialize key variables
-        data = defaultdict(lambda: defaultdict(dict))
-        data[label]['base_type'] = base_type
-        data[label]['data'] = [[0, value, source]]
-
         # Update
-        self.populate(data)
+        self._add(label, base_type, [[0, value, source]])
 
     def populate_named_tuple(self, named_tuple, prefix='', base_type=1):
         """Post system data to the central server.
@@ -173,22 +186,10 @@ class Agent(object):
             None
 
         """
-        # Get data
-        system_dict = named_tuple._asdict()
-        for label, value in system_dict.items():
-            # Convert the dict to two dimensional dict keyed by [label][source]
-            # for use by self.populate_dict
+        # Add each field as a label
+        for label, value in zip(named_tuple._fields, named_tuple):
             new_label = ('%s_%s') % (prefix, label)
-
-            # Initialize data
-            data = defaultdict(lambda: defaultdict(dict))
-
-            # Add data
-            data[new_label]['data'] = [[0, value, None]]
-            data[new_label]['base_type'] = base_type
-
-            # Update
-            self.populate(data)
+            self._add(new_label, base_type, [[0, value, None]])
 
     def populate_dict(self, data_in, prefix='', base_type=1):
         """Populate agent with data that's a dict keyed by [label][source].
@@ -202,29 +203,14 @@ class Agent(object):
             None
 
         """
-        # Initialize data
-        data_input = deepcopy(data_in)
-
         # Iterate over labels
-        for label in data_input.keys():
-            # Initialize tuple list to use by agent.populate
-            value_sources = []
+        for label, sources in data_in.items():
             new_label = ('%s_%s') % (prefix, label)
 
-            # Initialize data
-            data = defaultdict(lambda: defaultdict(dict))
-            data[new_label]['base_type'] = base_type
-
-            # Append to tuple list
             # (Sorting is important to keep consistent ordering)
-            for source, value in sorted(data_input[label].items()):
-                value_sources.append(
-                    [source, value, source]
-                )
-            data[new_label]['data'] = value_sources
-
-            # Update
-            self.populate(data)
+            self._add(new_label, base_type, [
+                [source, value, source]
+                for source, value in sorted(sources.items())])
 
     def polled_data(self):
         """Return that that should be posted.
@@ -233,18 +219,44 @@ class Agent(object):
             None
 
         Returns:
-            None
+            value: Dict of agent data
 
         """
         # Return
-        return self.data
+        value = self.payload.data()
+        return value
+
+    def _add(self, label, base_type, data):
+        """Add the datapoints of a label to the payload.
+
+        Args:
+            label: Agent label
+            base_type: Base type of data
+            data: List of [source, value, source] datapoints
+
+        Returns:
+            None
+
+        """
+        # Append DIDs to the datapoints. Servers that predate
+        # this option will reject the data.
+        if self.precompute_dids is True:
+            data = [
+                list(datapoint[:3]) + [jm_general.did(
+                    self.payload.uid, label, datapoint[0],
+                    self.payload.agent, self.payload.hostname)]
+                for datapoint in data]
+
+        # Add data with the description of the label
+        self.payload.add(
+            label, base_type, self.lang.label_description(label), data)
 
     def post(self, save=True, data=None):
         """Post data to central server.
 
         Args:
             save: When True, save data to cache directory if postinf fails
-            data: Data to post. If None, then uses self.data
+            data: Data to post. If None, then uses self.polled_data()
 
         Returns:
             success: "True: if successful
@@ -253,32 +265,31 @@ class Agent(object):
         # Initialize key variables
         success = False
         response = False
-        timestamp = self.data['timestamp']
-        uid = self.data['uid']
 
         # Create data to post
         if data is None:
-            data = self.data
+            data = self.polled_data()
 
-        # Post data save to cache if this fails
-        try:
-            result = requests.post(self.url, json=data)
-            response = True
-        except:
-            if save is True:
-                # Create a unique very long filename to reduce risk of
-                hosthash = jm_general.hashstring(self.data['hostname'], sha=1)
-                filename = ('%s/%s_%s_%s.json') % (
-                    self.cache_dir, timestamp, uid, hosthash)
-
-                # Save data
-                with open(filename, 'w') as f_handle:
-                    json.dump(data, f_handle)
+        # Post data save to cache if this fails. The server isn't
+        # contacted while the breaker is open.
+        allowed = self.breaker.allow()
+        if allowed is True:
+            try:
+                result = self._post(data)
+                response = True
+            except:
+                pass
+            self.breaker.update(response)
+        if response is False and save is True:
+            self.save(data)
 
-        # Define success
+        # Define success. Save the data if the server is too busy to
+        # accept it
         if response is True:
             if result.status_code == 200:
                 success = True
+            elif result.status_code == 503 and save is True:
+                self.save(data)
 
         # Log message
         if success is True:
@@ -286,6 +297,11 @@ class Agent(object):
                 'Agent "%s" successfully contacted server %s'
                 '') % (self.name(), self.url)
             log.log2quiet(1027, log_message)
+        elif allowed is False:
+            log_message = (
+                'Agent "%s" did not contact unreachable server %s'
+                '') % (self.name(), self.url)
+            log.log2quiet(1135, log_message)
         else:
             log_message = (
                 'Agent "%s" failed to contact server %s'
@@ -295,56 +311,721 @@ class Agent(object):
         # Return
         return success
 
+    def save(self, data=None):
+        """Save data to the segment log for posting later.
+
+        Args:
+            data: Data to save. If None, then uses self.polled_data()
+
+        Returns:
+            None
+
+        """
+        # Create data to save
+        if data is None:
+            data = self.polled_data()
+
+        # Save data
+        self.segments.append(data)
+
+    def _post(self, data):
+        """Post data to the central server in the preferred format.
+
+        Args:
+            data: Data to post
+
+        Returns:
+            result: requests.Response object
+
+        """
+        # Initialize key variables
+        payload = None
+        result = None
+
+        # Try the compact format
+        if self.compact is True:
+            try:
+                payload = compact.encode(data)
+            except ValueError:
+                payload = None
+        if payload is not None:
+            result = self.session.post(
+                self.url, data=payload,
+                headers={'Content-Type': compact.CONTENT_TYPE})
+
+            # Fall back to JSON if the server doesn't support it
+            if result.status_code == 415:
+                self.compact = False
+                result = None
+                log_message = (
+                    'Server %s does not support the compact data format. '
+                    'Using JSON.') % (self.url)
+                log.log2warn(1117, log_message)
+
+        # Post JSON, compressed if possible. Compact data is already
+        # compressed
+        if result is None:
+            compression = self.compression
+            (result, self.compression) = post_json(
+                self.session, self.url, json.dumps(data).encode(),
+                compression=compression)
+            if compression is not None and self.compression is None:
+                log_message = (
+                    'Server %s does not support compressed data. '
+                    'Sending uncompressed data.') % (self.url)
+                log.log2warn(1124, log_message)
+
+        # Return
+        return result
+
     def purge(self):
         """Purge data from cache by posting to central server.
 
+        The saved data of all the hosts of the agent is posted.
+
         Args:
             None
 
         Returns:
-            success: "True: if successful
+            None
+
+        """
+        # Post the data in the segment log
+        if self.segments.pending() is True:
+            self.purger.run()
+
+
+class Batch(object):
+    """Post the data of many hosts in a few requests.
+
+    Poller agents add the Agent object of each polled host. The data is
+    posted to the /receive/batch route of the central server whenever
+    enough hosts have been added, and when the poll is complete. Data is
+    posted one host at a time if the server doesn't support batches.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Functions:
+        __init__:
+        add:
+        post:
+    """
+
+    def __init__(self, config):
+        """Method initializing the class.
+
+        Args:
+            config: ConfigAgent configuration object
+
+        Returns:
+            None
 
         """
         # Initialize key variables
-        uid = self.data['uid']
-
-        # Add files in cache directory to list
-        filenames = [filename for filename in os.listdir(
-            self.cache_dir) if os.path.isfile(
-                os.path.join(self.cache_dir, filename))]
-
-        # Read cache file
-        for filename in filenames:
-            # Only post files for our own UID value
-            if uid not in filename:
-                continue
-
-            # Get the full filepath for the cache file and post
-            filepath = os.path.join(self.cache_dir, filename)
-            with open(filepath, 'r') as f_handle:
-                try:
-                    data = json.load(f_handle)
-                except:
-                    # Log removal
+        self.agents = []
+        self.posted = []
+        self.lock = threading.Lock()
+        self.size = config.agent_batch_size()
+        self.url = ('%s/receive/batch/%s') % (
+            server_url(config), get_uid(config.agent_name()))
+        self.session = session(config)
+        self.breaker = breaker(config)
+
+        # Compress posted data. Disabled if the server doesn't support it.
+        self.compression = config.agent_compression()
+        if encoding.supported(self.compression) is False:
+            self.compression = 'gzip'
+
+    def add(self, agent, data=None):
+        """Add the data of a host, posting the batch if it is full.
+
+        Args:
+            agent: Agent object of the host
+            data: Data to post. If None, then uses agent.polled_data()
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        if data is None:
+            data = agent.polled_data()
+
+        # Post data one host at a time if batches are disabled
+        if self.size <= 1:
+            if agent.post(data=data) is True:
+                with self.lock:
+                    self.posted.append(agent)
+            return
+
+        # Add
+        with self.lock:
+            self.agents.append((agent, data))
+            if len(self.agents) < self.size:
+                return
+            agents = self.agents
+            self.agents = []
+
+        # Post outside the lock so that other threads can keep adding
+        self._post(agents)
+
+    def post(self):
+        """Post the data of the hosts added since the last post.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Post
+        with self.lock:
+            agents = self.agents
+            self.agents = []
+        if bool(agents) is True:
+            self._post(agents)
+
+    def _post(self, agents):
+        """Post the data of hosts in a single request.
+
+        Data is saved in the cache directory of each host if posting
+        fails.
+
+        Args:
+            agents: List of (Agent object, data) tuples
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        result = None
+        name = agents[0][0].name()
+
+        # Post data. The server isn't contacted while the breaker is open.
+        allowed = self.breaker.allow()
+        if allowed is True:
+            try:
+                result = self._request([data for (_, data) in agents])
+            except:
+                pass
+            self.breaker.update(result is not None)
+
+        # Post data one host at a time if the server doesn't support
+        # batches
+        if result is not None and result.status_code in [404, 405]:
+            log_message = (
+                'Server %s does not support batches. Posting data one '
+                'host at a time.') % (self.url)
+            log.log2warn(1125, log_message)
+            self.size = 1
+            for (agent, data) in agents:
+                self.add(agent, data=data)
+            return
+
+        # Log message
+        if result is not None and result.status_code == 200:
+            with self.lock:
+                self.posted.extend([agent for (agent, _) in agents])
+            log_message = (
+                'Agent "%s" successfully posted data of %s hosts to '
+                'server %s') % (name, len(agents), self.url)
+            log.log2quiet(1126, log_message)
+        else:
+            # The server may have accepted some of the hosts before
+            # refusing the rest. Their data is sent again with the rest,
+            # and the server ignores data it has already ingested.
+            for (agent, data) in agents:
+                agent.save(data)
+            if allowed is False:
+                log_message = (
+                    'Agent "%s" saved data of %s hosts instead of contacting '
+                    'unreachable server %s') % (name, len(agents), self.url)
+                log.log2quiet(1136, log_message)
+            else:
+                log_message = (
+                    'Agent "%s" failed to post data of %s hosts to server %s'
+                    '') % (name, len(agents), self.url)
+                log.log2warn(1127, log_message)
+
+    def _request(self, data):
+        """Post a batch in the preferred format.
+
+        Args:
+            data: List of agent data
+
+        Returns:
+            result: requests.Response object
+
+        """
+        # Post
+        (result, self.compression) = post_json(
+            self.session, self.url, json.dumps(data).encode(),
+            compression=self.compression)
+        return result
+
+
+class Session(object):
+    """Connection pool shared by the threads of an agent.
+
+    Connections are kept alive between requests so that each post doesn't
+    need a new TCP and TLS handshake. Requests that can't reach the server
+    are retried after a random delay that doubles with each attempt, so
+    that the threads of many agents don't retry together. Requests that
+    timed out waiting for a response are retried too. The server ignores
+    data it has already ingested, so data isn't ingested twice.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        get:
+        post:
+        request:
+    """
+
+    def __init__(self, connect_timeout, read_timeout, retries, connections,
+                 servers=1):
+        """Method initializing the class.
+
+        Args:
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait for a response
+            retries: Number of times a request is retried
+            connections: Number of connections kept alive per server
+            servers: Number of servers connections are kept alive with.
+                Connections to the least recently used server are closed
+                when more servers are contacted.
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = max(0, retries)
+        self.backoff = 0.5
+        self.backoff_max = 30
+
+        # Create the pool
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=max(1, servers),
+            pool_maxsize=max(1, connections))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url, **kwargs):
+        """Get data from a URL.
+
+        Args:
+            url: URL
+            kwargs: Keyword arguments of requests.get
+
+        Returns:
+            result: requests.Response object
+
+        """
+        # Return
+        result = self.request('GET', url, **kwargs)
+        return result
+
+    def post(self, url, **kwargs):
+        """Post data to a URL.
+
+        Args:
+            url: URL
+            kwargs: Keyword arguments of requests.post
+
+        Returns:
+            result: requests.Response object
+
+        """
+        # Return
+        result = self.request('POST', url, **kwargs)
+        return result
+
+    def request(self, method, url, **kwargs):
+        """Make a request, retrying if the server can't be reached.
+
+        Args:
+            method: HTTP method
+            url: URL
+            kwargs: Keyword arguments of requests.request
+
+        Returns:
+            result: requests.Response object. The exception of the last
+                attempt is raised if all attempts fail.
+
+        """
+        # Initialize key variables
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+
+        while True:
+            try:
+                result = self.session.request(method, url, **kwargs)
+                break
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as exception_error:
+                if attempt >= self.retries:
+                    raise
+
+                # Wait for a random time up to the backoff limit
+                delay = random() * min(
+                    self.backoff_max, self.backoff * 2 ** attempt)
+                attempt += 1
+                log_message = (
+                    'Request to %s failed. Retrying in %.1f seconds. '
+                    'Error: %s') % (url, delay, exception_error)
+                log.log2quiet(1130, log_message)
+                time.sleep(delay)
+
+        # Return
+        return result
+
+
+class Breaker(object):
+    """Circuit breaker of the connection to the central server.
+
+    The breaker opens after a number of consecutive requests fail to reach
+    the server. Agents then save their data in the cache directory without
+    contacting the server. After a random delay a single request is let
+    through to probe the server, the delay doubling with each failed
+    probe. The breaker closes when a probe succeeds, and the recover
+    function is run in a thread to post the cached data.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        allow:
+        update:
+    """
+
+    def __init__(self, url, failures, recover=None):
+        """Method initializing the class.
+
+        Args:
+            url: URL of the server
+            failures: Number of consecutive failures that open the breaker
+            recover: Function to run when the server can be reached again
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.url = url
+        self.failures = max(1, failures)
+        self.recover = recover
+        self.backoff = 5
+        self.backoff_max = 300
+        self.lock = threading.Lock()
+
+        # State
+        self.count = 0
+        self.opened = False
+        self.probing = False
+        self.delay = self.backoff
+        self.retry = 0
+
+    def allow(self):
+        """Determine whether a request may be made to the server.
+
+        Args:
+            None
+
+        Returns:
+            value: True if the request may be made. The result of the
+                request must be passed to update.
+
+        """
+        # Only one thread probes the server when the breaker is open
+        with self.lock:
+            if self.opened is False:
+                value = True
+            elif self.probing is True or time.time() < self.retry:
+                value = False
+            else:
+                self.probing = True
+                value = True
+
+        # Return
+        return value
+
+    def update(self, reachable):
+        """Record the result of a request.
+
+        Args:
+            reachable: True if the server responded
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        recovered = False
+        log_message = None
+
+        with self.lock:
+            if reachable is True:
+                # Close the breaker
+                recovered = self.opened
+                self.opened = False
+                self.probing = False
+                self.count = 0
+                self.delay = self.backoff
+
+            else:
+                self.count += 1
+                if self.opened is True:
+                    # Back off further when the probe fails. Requests
+                    # made before the breaker opened are ignored.
+                    if self.probing is True:
+                        self.probing = False
+                        self.delay = min(self.backoff_max, self.delay * 2)
+                        self._schedule()
+                elif self.count >= self.failures:
+                    # Open the breaker
+                    self.opened = True
+                    self.delay = self.backoff
+                    self._schedule()
                     log_message = (
-                        'Error reading previously cached agent data file %s '
-                        'for agent %s. May be corrupted.'
-                        '') % (filepath, self.name())
-                    log.log2die(1064, log_message)
+                        'Server %s could not be reached %s times. Saving '
+                        'data in the cache directory until it can be '
+                        'reached.') % (self.url, self.count)
+
+        # Log changes outside the lock
+        if log_message is not None:
+            log.log2warn(1131, log_message)
+        if recovered is True:
+            log_message = (
+                'Server %s can be reached again. Purging the cache '
+                'directory.') % (self.url)
+            log.log2quiet(1132, log_message)
 
-            # Post file
-            success = self.post(save=False, data=data)
+            # Post the cached data
+            if self.recover is not None:
+                recover_thread = LogThread(target=self.recover)
+                recover_thread.daemon = True
+                recover_thread.start()
 
-            # Delete file if successful
-            if success is True:
-                os.remove(filepath)
+    def _schedule(self):
+        """Set the time of the next probe of the server.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Wait between half and all of the delay so that the agents of
+        # many hosts don't probe the server together
+        self.retry = time.time() + self.delay * (1 + random()) / 2
+
+
+class Purge(object):
+    """Post the data saved in the segment log of an agent.
+
+    Records are posted in batches by a few threads, at a limited rate of
+    requests. Records are posted one at a time if the server doesn't
+    support batches. Data is only removed from the log once it has been
+    posted.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        run:
+        start:
+    """
+
+    def __init__(self, session, server, uid, segments, rate, size,
+                 compression=None, threads=4):
+        """Method initializing the class.
+
+        Args:
+            session: Session object
+            server: URL of the server
+            uid: UID of the agent
+            segments: SegmentLog object of the agent
+            rate: Maximum number of requests per second
+            size: Maximum number of records posted in one request
+            compression: Content-Encoding to compress data with
+            threads: Number of threads posting data
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.session = session
+        self.url = ('%s/receive/%s') % (server, uid)
+        self.batch_url = ('%s/receive/batch/%s') % (server, uid)
+        self.segments = segments
+        self.interval = 1 / max(0.001, rate)
+        self.size = size
+        self.compression = compression
+        self.threads = max(1, threads)
+        self.lock = threading.Lock()
+        self.running = threading.Lock()
+        self.next = 0
+
+    def run(self):
+        """Post all the data in the segment log.
 
-                # Log removal
+        Posting stops at the first failure. The remaining data is posted
+        by the next purge.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Only purge once at a time
+        if self.running.acquire(blocking=False) is False:
+            return
+
+        try:
+            # Initialize key variables
+            position = self.segments.start()
+            pending = deque()
+            stopped = False
+            posted = 0
+            self.next = time.time()
+
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                while True:
+                    # Keep the threads busy, reading records in order
+                    while stopped is False and len(pending) < self.threads:
+                        (records, position) = self.segments.read(
+                            position, max(1, self.size))
+                        if bool(records) is False:
+                            break
+                        self._wait()
+                        pending.append((
+                            position, len(records),
+                            executor.submit(self._post, records)))
+                    if bool(pending) is False:
+                        break
+
+                    # Remove records from the log in order once they
+                    # have been posted
+                    (end, count, future) = pending.popleft()
+                    if stopped is False and future.result() is True:
+                        self.segments.commit(end)
+                        posted += count
+                    else:
+                        stopped = True
+
+            # Log
+            if posted > 0:
                 log_message = (
-                    'Purging cache file %s after successfully '
-                    'contacting server %s'
-                    '') % (filepath, self.url)
-                log.log2quiet(1029, log_message)
+                    'Purged %s cached records after contacting server %s'
+                    '') % (posted, self.url)
+                log.log2quiet(1133, log_message)
+
+        finally:
+            self.running.release()
+
+    def start(self):
+        """Post all the data in the segment log in a background thread.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Don't delay polling while the cache is purged at a limited rate
+        purge_thread = LogThread(target=self.run)
+        purge_thread.daemon = True
+        purge_thread.start()
+
+    def _wait(self):
+        """Wait until the next request may be made.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Wait for our turn
+        with self.lock:
+            delay = self.next - time.time()
+            self.next = max(self.next, time.time()) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def _post(self, records):
+        """Post records.
+
+        Args:
+            records: List of records as JSON bytes
+
+        Returns:
+            success: True if all records were posted
+
+        """
+        # Post a batch
+        if self.size > 1:
+            result = self._request(
+                self.batch_url, b'[' + b','.join(records) + b']')
+
+            # Post records one at a time if the server doesn't support
+            # batches
+            if result is None or result.status_code not in [404, 405]:
+                success = result is not None and result.status_code == 200
+                return success
+            self.size = 1
+
+        # Post records one at a time
+        for record in records:
+            result = self._request(self.url, record)
+            if result is None or result.status_code != 200:
+                return False
+        return True
+
+    def _request(self, url, body):
+        """Post JSON data.
+
+        Args:
+            url: URL
+            body: JSON data as bytes
+
+        Returns:
+            result: requests.Response object. None if the server couldn't
+                be reached.
+
+        """
+        # Post
+        try:
+            (result, self.compression) = post_json(
+                self.session, url, body, compression=self.compression)
+        except:
+            result = None
+        return result
 
 
 class AgentDaemon(Daemon):
@@ -522,29 +1203,6 @@ class AgentCLI(object):
             sys.exit(2)
 
 
-class AgentThread(threading.Thread):
-    """Threaded ingestion of agent files.
-
-    Graciously modified from:
-    http://www.ibm.com/developerworks/aix/library/au-threadingpython/
-
-    """
-
-    def __init__(self, queue):
-        """Initialize the threads."""
-        threading.Thread.__init__(self)
-        self.queue = queue
-
-    def run(self):
-        """Update the database using threads."""
-        while True:
-            poller = self.queue.get()
-            poller.query()
-
-            # All done!
-            self.queue.task_done()
-
-
 def agent_sleep(agent_name, seconds=300):
     """Make agent sleep for a specified time, while updating PID every 300s.
 
@@ -616,92 +1274,225 @@ def get_uid(agent_name):
     return uid
 
 
-def threads(agent_name, pollers):
+def language_agent(agent_name):
+    """Get the language file of an agent, reading it only once.
+
+    Args:
+        agent_name: Name of agent
+
+    Returns:
+        value: language.Agent object
+
+    """
+    # Read the file
+    with _LANGUAGE_LOCK:
+        if agent_name not in LANGUAGES:
+            LANGUAGES[agent_name] = language.Agent(agent_name)
+        value = LANGUAGES[agent_name]
+    return value
+
+
+def server_url(config):
+    """Get the URL of the central server.
+
+    Args:
+        config: ConfigAgent configuration object
+
+    Returns:
+        url: URL without a trailing slash
+
+    """
+    # Construct URL for server
+    if config.server_https() is True:
+        prefix = 'https://'
+    else:
+        prefix = 'http://'
+    url = ('%s%s:%s') % (prefix, config.server_name(), config.server_port())
+    return url
+
+
+def session(config):
+    """Get the connection pool shared by the threads of the agent.
+
+    Args:
+        config: ConfigAgent configuration object
+
+    Returns:
+        value: Session object
+
+    """
+    # Initialize key variables
+    global SESSION
+
+    # Create the pool with a connection for each polling thread
+    with _SESSION_LOCK:
+        if SESSION is None:
+            SESSION = Session(
+                config.agent_connect_timeout(),
+                config.agent_read_timeout(),
+                config.agent_retries(),
+                jm_configuration.Config().agent_threads())
+        value = SESSION
+    return value
+
+
+def post_json(session, url, body, compression=None):
+    """Post JSON data, compressed if the server supports it.
+
+    Args:
+        session: Session object
+        url: URL
+        body: JSON data as bytes
+        compression: Content-Encoding to compress the data with
+
+    Returns:
+        (result, compression): requests.Response object, and the
+            Content-Encoding to use next time. None if the server doesn't
+            support compressed data.
+
+    """
+    # Initialize key variables
+    result = None
+
+    # Try compressed JSON
+    if compression is not None:
+        result = session.post(
+            url, data=encoding.compress(body, compression),
+            headers={
+                'Content-Type': 'application/json',
+                'Content-Encoding': compression})
+
+        # Retry uncompressed JSON if the server may not support
+        # compressed data. Invalid data also gets a 400 response, so only
+        # stop compressing if the server accepts the data uncompressed.
+        if result.status_code in [400, 415]:
+            uncompressed = session.post(
+                url, data=body, headers={'Content-Type': 'application/json'})
+            if result.status_code == 415 or uncompressed.ok is True:
+                compression = None
+            result = uncompressed
+
+    # Post JSON
+    if result is None:
+        result = session.post(
+            url, data=body, headers={'Content-Type': 'application/json'})
+
+    # Return
+    return (result, compression)
+
+
+def segments(config):
+    """Get the segment log of the agent.
+
+    Data saved as cache files by previous versions of the agent is moved
+    to the log when it is opened.
+
+    Args:
+        config: ConfigAgent configuration object
+
+    Returns:
+        value: SegmentLog object shared by the threads of the agent
+
+    """
+    # Initialize key variables
+    uid = get_uid(config.agent_name())
+    cache_dir = config.agent_cache_directory()
+
+    with _SPOOL_LOCK:
+        if uid not in SEGMENTS:
+            # Open the log
+            segment_log = segment.SegmentLog(
+                os.path.join(cache_dir, 'segments', uid),
+                config.agent_cache_quota())
+
+            # Move cache files of the agent to the log, oldest first
+            for filepath in sorted(
+                    spool.files(cache_dir),
+                    key=lambda path: os.path.basename(path)):
+                if os.path.basename(filepath).split('_')[1] != uid:
+                    continue
+                try:
+                    with open(filepath, 'r') as f_handle:
+                        segment_log.append(json.load(f_handle))
+                except ValueError:
+                    log_message = (
+                        'Error reading previously cached agent data file '
+                        '%s. May be corrupted.') % (filepath)
+                    log.log2warn(1134, log_message)
+                    continue
+                os.remove(filepath)
+
+            SEGMENTS[uid] = segment_log
+        value = SEGMENTS[uid]
+    return value
+
+
+def purger(config):
+    """Get the object that posts the data in the segment log of the agent.
+
+    Args:
+        config: ConfigAgent configuration object
+
+    Returns:
+        value: Purge object shared by the threads of the agent
+
+    """
+    # Initialize key variables
+    uid = get_uid(config.agent_name())
+    segment_log = segments(config)
+    agent_session = session(config)
+
+    # Compress posted data if possible
+    compression = config.agent_compression()
+    if encoding.supported(compression) is False:
+        compression = 'gzip'
+
+    with _SPOOL_LOCK:
+        if uid not in PURGES:
+            PURGES[uid] = Purge(
+                agent_session, server_url(config), uid, segment_log,
+                config.agent_purge_rate(), config.agent_batch_size(),
+                compression=compression)
+        value = PURGES[uid]
+    return value
+
+
+def breaker(config):
+    """Get the circuit breaker of the central server.
+
+    Args:
+        config: ConfigAgent configuration object
+
+    Returns:
+        value: Breaker object shared by the threads of the agent
+
+    """
+    # Initialize key variables
+    url = server_url(config)
+    agent_purge = purger(config)
+
+    # Create the breaker, purging the cache when the server recovers
+    with _BREAKER_LOCK:
+        if url not in BREAKERS:
+            BREAKERS[url] = Breaker(
+                url, config.agent_breaker_failures(),
+                recover=agent_purge.run)
+        value = BREAKERS[url]
+    return value
+
+
+def threads(agent_name, pollers, interval=0):
     """Function where agents poll devices using multithreading.
 
     Args:
         agent_name: Agent name
         pollers: List of polling objects
+        interval: Seconds between polls of a host. Hosts are polled right
+            away if 0, otherwise at their offset within the next cycle.
 
     Returns:
         None
 
     """
-    # Get configuration
-    config = jm_configuration.Config()
-    threads_in_pool = config.agent_threads()
-
-    # Spawn processes only if we have files to process
-    if bool(pollers) is True:
-        # Process lock file
-        f_obj = hidden.File()
-        lockfile = f_obj.lock(agent_name)
-        if os.path.exists(lockfile) is True:
-            # Return if lock file is present
-            log_message = (
-                'Agent lock file %s exists. Multiple agent daemons '
-                'running or the daemon may have died '
-                'catastrophically in the past, in which case the lockfile '
-                'should be deleted. Exiting agent process. '
-                'Will try again later.'
-                '') % (lockfile)
-            log.log2warn(1044, log_message)
-            return
-        else:
-            # Create lockfile
-            open(lockfile, 'a').close()
-
-        # Spawn a pool of threads, and pass them queue instance
-        for _ in range(
-                min(threads_in_pool, len(pollers))):
-            update_thread = AgentThread(THREAD_QUEUE)
-            update_thread.daemon = True
-
-            # Sometimes we exhaust the thread abilities of the OS
-            # even with the "threads_in_pool" limit. This is because
-            # there could be a backlog of files to cache files process
-            # and we have overlapping ingests due to a deleted lockfile.
-            # This code ensures we don't exceed the limits.
-            try:
-                update_thread.start()
-            except RuntimeError:
-                log_message = (
-                    'Too many threads created for agent "%s". '
-                    'Verify that agent lock file is present.') % (agent_name)
-
-                # Remove the lockfile so we can restart later then die
-                os.remove(lockfile)
-                log.log2die(1078, log_message)
-            except:
-                log_message = (
-                    'Unknown error occurred when trying to '
-                    'create threads for agent "%s"') % (agent_name)
-
-                # Remove the lockfile so we can restart later then die
-                os.remove(lockfile)
-                log.log2die(1079, log_message)
-
-        # Start polling
-        for poller in pollers:
-            ##############################################################
-            #
-            # Define variables that will be required for the threading
-            # We have to initialize the dict during every loop to prevent
-            # data corruption
-            #
-            ##############################################################
-            THREAD_QUEUE.put(poller)
-
-        # Wait on the queue until everything has been processed
-        THREAD_QUEUE.join()
-
-        # PYTHON BUG. Join can occur while threads are still shutting down.
-        # This can create spurious "Exception in thread (most likely raised
-        # during interpreter shutdown)" errors.
-        # The "time.sleep(1)" adds a delay to make sure things really terminate
-        # properly. This seems to be an issue on virtual machines in Dev only
-        time.sleep(1)
-
-        # Return if lock file is present
-        if os.path.exists(lockfile) is True:
-            os.remove(lockfile)
+    # Poll with the threads of the agent's scheduler
+    scheduler.poll(agent_name, pollers, interval=interval)
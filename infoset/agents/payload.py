@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Payload of agent data.
+
+Agents add the datapoints of each label to a Payload. Labels are kept as
+small records that refer to the lists of datapoints, so nothing is copied
+when data is added. The dict posted to the server, which is also the
+input of the compact format, is only assembled when it is needed:
+
+    {
+        'timestamp': ..., 'uid': ..., 'agent': ..., 'hostname': ...,
+        'chartable': {label: {'base_type', 'description', 'data'}},
+        'other': {label: {'base_type', 'description', 'data'}}
+    }
+
+Labels with a base_type of None are 'other' data. A group is left out if
+it has no labels.
+
+"""
+
+
+class Label(object):
+    """Datapoints of a label.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    """
+
+    __slots__ = ('base_type', 'description', 'data')
+
+    def __init__(self, base_type, description, data):
+        """Method initializing the class.
+
+        Args:
+            base_type: SNMP style base_type. None if the data isn't
+                chartable
+            description: Description of the label
+            data: List of [source, value, source] datapoints
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.base_type = base_type
+        self.description = description
+        self.data = data
+
+
+class Payload(object):
+    """Data of a host gathered by an agent.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        add:
+        data:
+
+    """
+
+    __slots__ = ('timestamp', 'uid', 'agent', 'hostname', 'labels')
+
+    def __init__(self, timestamp, uid, agent, hostname):
+        """Method initializing the class.
+
+        Args:
+            timestamp: Timestamp of the data
+            uid: UID of the agent
+            agent: Name of the agent
+            hostname: Hostname that the data applies to
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.timestamp = timestamp
+        self.uid = uid
+        self.agent = agent
+        self.hostname = hostname
+        self.labels = {}
+
+    def add(self, label, base_type, description, data):
+        """Add the datapoints of a label, replacing any previous ones.
+
+        Args:
+            label: Agent label
+            base_type: SNMP style base_type. None if the data isn't
+                chartable
+            description: Description of the label
+            data: List of datapoints. It is used as is, not copied.
+
+        Returns:
+            None
+
+        """
+        # Add
+        self.labels[label] = Label(base_type, description, data)
+
+    def data(self):
+        """Assemble the data posted to the server.
+
+        Args:
+            None
+
+        Returns:
+            value: Dict of agent data
+
+        """
+        # Initialize key variables
+        value = {
+            'timestamp': self.timestamp,
+            'uid': self.uid,
+            'agent': self.agent,
+            'hostname': self.hostname}
+
+        # Add labels
+        for label, record in self.labels.items():
+            if record.base_type is not None:
+                group = 'chartable'
+            else:
+                group = 'other'
+            if group not in value:
+                value[group] = {}
+            value[group][label] = {
+                'base_type': record.base_type,
+                'description': record.description,
+                'data': record.data}
+
+        # Return
+        return value
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+"""Scheduler of the polls of agents.
+
+Hosts are polled by a pool of threads that lasts as long as the agent.
+Each host is given a stable offset within the polling interval, derived
+from a hash of its hostname, so that polls are spread over the interval
+instead of starting in one burst. Cycles start at multiples of the
+interval, so the period stays the same however long the polls take.
+
+The lag of each poll, the time between when it was due and when it
+started, is recorded and logged at the end of each cycle.
+
+"""
+
+# Standard libraries
+import os
+import sys
+import time
+import queue
+import threading
+
+# Infoset libraries
+from infoset.utils import hidden
+from infoset.utils import log
+from infoset.utils import jm_general
+from infoset.utils import jm_configuration
+
+# Polls are spread over this fraction of the interval, leaving time for
+# the slowest polls to finish before the next cycle
+_SPREAD = 0.8
+
+# Polls that start this many seconds late are logged as warnings
+_LATE = 30
+
+# Schedulers keyed by agent name. Created on first use
+SCHEDULERS = {}
+_LOCK = threading.Lock()
+
+
+class Scheduler(object):
+    """Poll hosts in cycles with a persistent pool of threads.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        offset:
+        cycle:
+        lags:
+
+    """
+
+    def __init__(self, agent_name, interval, threads):
+        """Method initializing the class.
+
+        Args:
+            agent_name: Name of agent
+            interval: Seconds between polls of a host. Hosts are polled
+                right away if 0.
+            threads: Maximum number of threads polling hosts
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.agent_name = agent_name
+        self.interval = interval
+        self.size = max(1, threads)
+        self.queue = queue.Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+        self.lag = {}
+
+        # Start of the last cycle
+        self.begin = None
+
+    def offset(self, hostname):
+        """Get the offset of the polls of a host within the interval.
+
+        Args:
+            hostname: Hostname
+
+        Returns:
+            value: Seconds after the start of a cycle
+
+        """
+        # Initialize key variables
+        value = 0
+
+        # Use the hash of the hostname to get the same offset every time
+        if self.interval > 0:
+            fraction = int(
+                jm_general.hashstring(hostname, sha=1)[:8], 16) / 2 ** 32
+            value = fraction * self.interval * _SPREAD
+        return value
+
+    def cycle(self, pollers):
+        """Poll each host once, at its offset within the next cycle.
+
+        Args:
+            pollers: List of polling objects with a hostname attribute
+                and a query method
+
+        Returns:
+            None
+
+        """
+        # Wait for the next cycle
+        first = self.begin is None
+        begin = self._wait()
+
+        # Update the PID file timestamp (important)
+        update = hidden.Touch()
+        update.pid(self.agent_name)
+
+        # Process lock file
+        if bool(pollers) is False:
+            return
+        f_obj = hidden.File()
+        lockfile = f_obj.lock(self.agent_name)
+        if os.path.exists(lockfile) is True:
+            # Return if lock file is present
+            log_message = (
+                'Agent lock file %s exists. Multiple agent daemons '
+                'running or the daemon may have died '
+                'catastrophically in the past, in which case the lockfile '
+                'should be deleted. Exiting agent process. '
+                'Will try again later.'
+                '') % (lockfile)
+            log.log2warn(1044, log_message)
+            return
+        else:
+            # Create lockfile
+            open(lockfile, 'a').close()
+
+        try:
+            # Start threads if there are more hosts than before
+            self._start(min(self.size, len(pollers)), lockfile)
+
+            # Get the time each host is due. Hosts whose offset has
+            # already passed when the agent starts are polled right away.
+            schedule = []
+            now = time.time()
+            for poller in pollers:
+                due = begin + self.offset(poller.hostname)
+                if first is True:
+                    due = max(due, now)
+                schedule.append((due, poller.hostname, poller))
+            schedule.sort(key=lambda item: item[:2])
+
+            # Queue the polls when they are due
+            with self.lock:
+                self.lag = {}
+            for (due, _, poller) in schedule:
+                delay = due - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                self.queue.put((due, poller))
+
+            # Wait on the queue until everything has been processed
+            self.queue.join()
+            self._report()
+
+        finally:
+            # Remove the lock file
+            if os.path.exists(lockfile) is True:
+                os.remove(lockfile)
+
+    def lags(self):
+        """Get the lag of the polls of the last cycle.
+
+        Args:
+            None
+
+        Returns:
+            value: Dict of seconds each poll started late keyed by
+                hostname
+
+        """
+        # Return
+        with self.lock:
+            value = dict(self.lag)
+        return value
+
+    def _wait(self):
+        """Wait for the start of the next cycle.
+
+        Args:
+            None
+
+        Returns:
+            begin: Start time of the cycle
+
+        """
+        # Initialize key variables
+        now = time.time()
+        begin = now
+
+        # Cycles start at multiples of the interval. Cycles that were
+        # missed because polls took too long are skipped.
+        if self.interval > 0:
+            begin = now - (now % self.interval)
+            if self.begin is not None and begin <= self.begin:
+                begin = self.begin + self.interval
+            if begin > now:
+                time.sleep(begin - now)
+        self.begin = begin
+
+        # Return
+        return begin
+
+    def _start(self, count, lockfile):
+        """Start threads until there are enough to poll hosts.
+
+        Args:
+            count: Number of threads needed
+            lockfile: Lock file to remove if threads can't be started
+
+        Returns:
+            None
+
+        """
+        while len(self.workers) < count:
+            worker = _Worker(self)
+            worker.daemon = True
+
+            # Sometimes we exhaust the thread abilities of the OS
+            # even with the "threads_in_pool" limit.
+            try:
+                worker.start()
+            except RuntimeError:
+                log_message = (
+                    'Too many threads created for agent "%s". '
+                    'Verify that agent lock file is present.'
+                    '') % (self.agent_name)
+
+                # Remove the lockfile so we can restart later then die
+                os.remove(lockfile)
+                log.log2die(1078, log_message)
+            except:
+                log_message = (
+                    'Unknown error occurred when trying to '
+                    'create threads for agent "%s"') % (self.agent_name)
+
+                # Remove the lockfile so we can restart later then die
+                os.remove(lockfile)
+                log.log2die(1079, log_message)
+            self.workers.append(worker)
+
+    def _report(self):
+        """Log the lag of the polls of the cycle.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        lags = self.lags()
+        if bool(lags) is False:
+            return
+        hostname = max(lags, key=lags.get)
+        late = sorted(
+            [host for (host, lag) in lags.items() if lag > _LATE])
+
+        # Log
+        log_message = (
+            'Agent "%s" polled %s hosts. Maximum lag %.1f seconds for host '
+            '%s.') % (self.agent_name, len(lags), lags[hostname], hostname)
+        log.log2quiet(1139, log_message)
+        if bool(late) is True:
+            log_message = (
+                'Agent "%s" started polling %s hosts more than %s seconds '
+                'late: %s') % (
+                    self.agent_name, len(late), _LATE, ', '.join(late[:10]))
+            log.log2warn(1140, log_message)
+
+
+class _Worker(threading.Thread):
+    """Thread polling hosts for a scheduler."""
+
+    def __init__(self, scheduler):
+        """Initialize the thread.
+
+        Args:
+            scheduler: Scheduler object
+
+        Returns:
+            None
+
+        """
+        threading.Thread.__init__(self)
+        self.scheduler = scheduler
+
+    def run(self):
+        """Poll hosts as they become due."""
+        while True:
+            (due, poller) = self.scheduler.queue.get()
+            try:
+                # Record the lag
+                with self.scheduler.lock:
+                    self.scheduler.lag[poller.hostname] = max(
+                        0, time.time() - due)
+
+                # Poll
+                poller.query()
+
+            except:
+                log_message = (
+                    'Agent "%s" failed to poll host %s. Error: %s'
+                    '') % (
+                        self.scheduler.agent_name, poller.hostname,
+                        sys.exc_info()[1])
+                log.log2warn(1141, log_message)
+
+            finally:
+                # All done!
+                self.scheduler.queue.task_done()
+
+
+def poll(agent_name, pollers, interval=0):
+    """Poll hosts with the scheduler of an agent.
+
+    Args:
+        agent_name: Name of agent
+        pollers: List of polling objects
+        interval: Seconds between polls of a host. Used when the
+            scheduler is created.
+
+    Returns:
+        None
+
+    """
+    # Create the scheduler
+    with _LOCK:
+        if agent_name not in SCHEDULERS:
+            config = jm_configuration.Config()
+            SCHEDULERS[agent_name] = Scheduler(
+                agent_name, interval, config.agent_threads())
+        scheduler = SCHEDULERS[agent_name]
+
+    # Poll
+    scheduler.cycle(pollers)
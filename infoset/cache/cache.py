@@ -8,31 +8,86 @@ This could be a modified to be a daemon
 
 # Standard libraries
 import os
+import sys
 import time
 import shutil
-from collections import defaultdict
-import queue as Queue
-import re
+import json
+import multiprocessing
+import threading
 
 # PIP libraries
-from sqlalchemy import and_
+from sqlalchemy import and_, update, select, bindparam
 
 # Infoset libraries
 from infoset.db import db
-from infoset.db.db_orm import Data, Datapoint, Agent, Host, HostAgent
-from infoset.db import db_agent as agent
+from infoset.db.db_orm import Datapoint, Agent, Host, HostAgent
 from infoset.db import db_datapoint as dpoint
-from infoset.db import db_host as dhost
-from infoset.db import db_hostagent as hagent
+from infoset.db import db_data
 from infoset.utils import jm_configuration
 from infoset.utils import jm_general
 from infoset.utils import log
 from infoset.utils.log import LogThread
 from infoset.cache import drain
+from infoset.cache import registry
+from infoset.cache import scheduler
+from infoset.cache import claim
+from infoset.cache import journal
 from infoset.utils import hidden
-
-# Define a key global variable
-THREAD_QUEUE = Queue.Queue()
+from infoset.utils import spool
+
+# Scheduler of the ingest threads and claims of the daemon.
+# Created on first use
+SCHEDULER = None
+CLAIMS = None
+
+# Number of datapoints committed at a time
+_CHUNK = 5000
+
+# Seconds ingest threads wait before processing files again after an
+# error, doubling with each consecutive error up to the maximum
+_RETRY_DELAY = 5
+_RETRY_DELAY_MAX = 300
+
+# Number of files of a UID handed to the process pool at a time
+_POOL_CHUNK = 16
+
+# Process pool kept for the life of the daemon. Workers keep their
+# DID memo tables between ingests.
+POOL = None
+
+# DID memo table (hits, misses) of each worker process, keyed by PID.
+# Workers return them with each Drain object.
+_DID_CACHE = {}
+_DID_LOCK = threading.Lock()
+
+# Multi-row (executemany) statements used for datapoint updates
+# Timestamps never go backwards, even when several ingest daemons
+# are running. Statements that only update last_timestamp keep the
+# ts_modified value, so that registry refreshes only read datapoints
+# whose metadata or uncharted_value changed.
+_DATAPOINT_TIMESTAMP_UPDATE = update(Datapoint.__table__).where(and_(
+    Datapoint.__table__.c.idx == bindparam('b_idx'),
+    Datapoint.__table__.c.last_timestamp < bindparam(
+        'b_last_timestamp'))).values(
+            last_timestamp=bindparam('b_last_timestamp'),
+            ts_modified=Datapoint.__table__.c.ts_modified)
+_DATAPOINT_UNCHARTED_UPDATE = update(Datapoint.__table__).where(and_(
+    Datapoint.__table__.c.idx == bindparam('b_idx'),
+    Datapoint.__table__.c.last_timestamp < bindparam(
+        'b_last_timestamp'))).values(
+        uncharted_value=bindparam('b_uncharted_value'),
+        last_timestamp=bindparam('b_last_timestamp'))
+
+# Only updates the last_timestamp of datapoints whose uncharted_value is
+# unchanged if no other ingest thread or daemon has updated them since
+# this one last read or wrote them
+_DATAPOINT_UNCHANGED_UPDATE = update(Datapoint.__table__).where(and_(
+    Datapoint.__table__.c.idx == bindparam('b_idx'),
+    Datapoint.__table__.c.last_timestamp == bindparam('b_previous'),
+    Datapoint.__table__.c.last_timestamp < bindparam(
+        'b_last_timestamp'))).values(
+            last_timestamp=bindparam('b_last_timestamp'),
+            ts_modified=Datapoint.__table__.c.ts_modified)
 
 
 class ProcessUID(LogThread):
@@ -43,85 +98,155 @@ class ProcessUID(LogThread):
 
     """
 
-    def __init__(self, queue):
+    def __init__(self, schedule, claims, name, pool=None):
         """Initialize the threads."""
         LogThread.__init__(self)
-        self.queue = queue
+        self.schedule = schedule
+        self.claims = claims
+        self.pool = pool
+        self.journal = journal.Journal(claims.directory, name)
 
     def run(self):
         """Update the database using threads."""
+        # Initialize key variables
+        delay = _RETRY_DELAY
+
         while True:
-            # Initialize key variables
-            hostname = None
-
-            # Get the data_dict
-            data_dict = self.queue.get()
-            uid = data_dict['uid']
-            metadata = data_dict['metadata']
-            config = data_dict['config']
-
-            # Initialize other values
-            max_timestamp = 0
-
-            # Sort metadata by timestamp
-            metadata.sort()
-
-            # Process file for each timestamp, starting from the oldes file
-            for (timestamp, filepath) in metadata:
-                # Read in data
-                ingest = drain.Drain(filepath)
-
-                # Make sure file is OK
-                # Move it to a directory for further analysis
-                # by administrators
-                if ingest.valid() is False:
-                    log_message = (
-                        'Cache ingest file %s is invalid. Moving.'
-                        '') % (filepath)
-                    log.log2warn(1054, log_message)
-                    shutil.copy(
-                        filepath, config.ingest_failures_directory())
-                    os.remove(filepath)
-                    continue
-
-                # Update database
-                dbase = UpdateDB(ingest)
-                dbase.update()
-
-                # Get the max timestamp
-                max_timestamp = max(timestamp, max_timestamp)
-
-                # Get hostname
-                hostname = ingest.hostname()
-
-                # Purge source file
-                ingest.purge()
+            # Get the next files of a host / agent, oldest first
+            (key, metadata) = self.schedule.next()
 
-            # Update the last time the agent was contacted
-            _update_agent_last_update(uid, max_timestamp)
+            # Skip the host / agent if another ingest daemon has it
+            if self.claims.claim(key) is False:
+                self.schedule.done(key, metadata)
+                continue
 
-            # Update the host / agent table timestamp if hostname was processed
-            if hostname is not None:
-                _host_agent_last_update(hostname, uid, max_timestamp)
+            # Errors, such as a database outage, must neither stop the
+            # thread nor leave the host / agent claimed. Files that weren't
+            # ingested are returned to the spool and scheduled again.
+            filepaths = []
+            returned = []
+            try:
+                self._process(key, metadata, filepaths)
+                delay = _RETRY_DELAY
+            except:
+                returned = self.claims.unclaim_files(filepaths) + [
+                    filepath for (_, filepath) in metadata
+                    if os.path.isfile(filepath) is True]
+                log_message = (
+                    'Ingest of cache files %s failed. Retrying in %s '
+                    'seconds. Error: %s %s'
+                    '') % (
+                        [filepath for (_, filepath) in metadata], delay,
+                        sys.exc_info()[0], sys.exc_info()[1])
+                log.log2warn(1149, log_message)
+                time.sleep(delay)
+                delay = min(_RETRY_DELAY_MAX, delay * 2)
+            finally:
+                self.claims.release(key)
+                self.schedule.done(key, metadata)
+            self.schedule.add(returned)
+
+    def _process(self, key, metadata, filepaths):
+        """Ingest the files of a claimed host / agent.
 
-            # All done!
-            self.queue.task_done()
+        Args:
+            key: (hosthash, uid) tuple
+            metadata: List of (timestamp, filepath) tuples, oldest first
+            filepaths: List to which the paths of the claimed files are
+                added
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        config = jm_configuration.Config()
+        failures_directory = config.ingest_failures_directory()
+
+        # Move the files into this daemon's in progress directory.
+        # Skip files processed since they were scheduled
+        self.journal.start()
+        for (_, filepath) in metadata:
+            claimed = self.claims.claim_file(filepath)
+            if claimed is not None:
+                filepaths.append(claimed)
+
+        # Process file for each timestamp, starting from the oldes file
+        for ingest in _drains(filepaths, self.pool):
+            filepath = ingest.filename
+
+            # Stop if the claim was lost. The files were returned to
+            # the spool
+            if self.claims.holds(key) is False:
+                break
+
+            # Get the chunks committed before a crash
+            committed = journal.load(filepath)
+
+            # Move bad files to a directory for further analysis
+            # by administrators
+            if ingest.valid() is False:
+                log_message = (
+                    'Cache ingest file %s is invalid. Moving.'
+                    '') % (filepath)
+                log.log2warn(1054, log_message)
+                shutil.copy(filepath, failures_directory)
+                os.remove(filepath)
+                journal.remove(filepath)
+                continue
+
+            # Purge data that was already ingested. Agents send data
+            # again when they don't get a reply, and the last chunk
+            # of a file may have been committed before a crash
+            if registry.REGISTRY.unprocessed(
+                    ingest.uid(), ingest.hostname(),
+                    ingest.timestamp()) is False:
+                log_message = (
+                    'Cache ingest file %s was already ingested. '
+                    'Purging.') % (filepath)
+                log.log2quiet(1144, log_message)
+                ingest.purge()
+                journal.remove(filepath)
+                continue
+
+            # Update database. The agent and host / agent
+            # timestamps are updated with the last chunk.
+            dbase = UpdateDB(
+                ingest, journal=self.journal, committed=committed)
+            dbase.update()
+
+            # Purge source file
+            ingest.purge()
+            journal.remove(filepath)
 
 
 class UpdateDB(object):
     """Update database with agent data."""
 
-    def __init__(self, ingest):
+    def __init__(self, ingest, journal=None, committed=None):
         """Instantiate the class.
 
         Args:
             ingest: Drain object
+            journal: Journal in which to record committed chunks
+            committed: Set of chunks committed before a crash
 
         Returns:
             None
 
         """
         self.ingest = ingest
+        self.registry = registry.REGISTRY
+        self.journal = journal
+        self.committed = committed
+        if committed is None:
+            self.committed = set()
+
+        # DID keyed dict of last_timestamp values committed by the update
+        self.timestamps = {}
+
+        # DID keyed dict of digests of the uncharted values written
+        self.digests = {}
 
     def update(self):
         """Update the database.
@@ -134,39 +259,81 @@ class UpdateDB(object):
 
         """
         # Initialize key variables
-        uid = self.ingest.uid()
-        hostname = self.ingest.hostname()
+        timestamp = self.ingest.timestamp()
 
         # Update Agent, Host and HostAgent database tables if
         # Host and agent are not already there
-        self._insert_agent()
-        self._insert_host()
+        (idx_agent, enabled) = self._insert_agent()
+        idx_host = self._insert_host(idx_agent)
 
         # Update datapoints if agent is enabled
-        agent_object = agent.GetUID(uid)
-        if agent_object.enabled() is True:
-            # Get Agent and Host indexes
-            idx_agent = agent_object.idx()
-
-            # Get idx of host
-            host_info = dhost.GetHost(hostname)
-            idx_host = host_info.idx()
-
+        mapping = {}
+        if enabled is True:
             # Update datapoint metadata if not there
+            dids = []
             for item in self.ingest.sources():
                 did = item[1]
+                dids.append(did)
 
                 # We need the host that the data was generated for
                 # and the agent that got the data
-                if dpoint.did_exists(did) is False:
+                if self.registry.datapoint(did) is None:
                     _insert_datapoint(item, idx_agent, idx_host)
 
             # Create map of DIDs to database row index values
-            mapping = _datapoints_by_did(idx_agent)
+            mapping = self.registry.mapping(dids)
+
+        # Large files are committed in chunks of datapoints. Chunks
+        # committed before a crash are skipped.
+        chartable = self.ingest.chartable()
+        other = self.ingest.other()
+        size = max(len(chartable), len(other))
+        chunks = max(1, (size + _CHUNK - 1) // _CHUNK)
+        filename = os.path.basename(self.ingest.filename or '')
+        for chunk in range(chunks):
+            if chunk in self.committed:
+                continue
+            start = chunk * _CHUNK
+            database = db.Database()
+            session = database.session()
+
+            # Update data
+            if enabled is True:
+                self._update_chartable(
+                    database, session, mapping,
+                    chartable[start:start + _CHUNK])
+                self._update_unchartable(
+                    database, session, mapping,
+                    other[start:start + _CHUNK])
+
+            # Update the last time the agent and host / agent were
+            # updated with the last chunk
+            if chunk == chunks - 1:
+                _update_agent_last_update(
+                    database, session, idx_agent, timestamp)
+                _host_agent_last_update(
+                    database, session, idx_host, idx_agent, timestamp)
+
+            # Commit the chunk
+            database.commit(session, 1083)
+            if self.journal is not None:
+                if chunk == chunks - 1:
+                    self.journal.done(filename)
+                else:
+                    self.journal.commit(filename, chunk)
+
+            # Update the registry now that the data is in the database
+            self.registry.update_timestamps(self.timestamps)
+            self.registry.update_uncharted(self.digests)
 
-            # Update chartable data
-            self._update_chartable(mapping)
-            self._update_unchartable(mapping)
+        self.registry.update_host_agent(
+            self.ingest.hostname(), self.ingest.uid(), timestamp)
+
+        # Report success
+        log_message = (
+            'Successful cache drain for UID %s at timestamp %s') % (
+                self.ingest.uid(), timestamp)
+        log.log2quiet(1058, log_message)
 
     def _insert_agent(self):
         """Insert new agent into database.
@@ -175,7 +342,7 @@ class UpdateDB(object):
             None
 
         Returns:
-            None
+            value: Tuple of (idx_agent, enabled)
 
         """
         # Initialize key variables
@@ -183,64 +350,67 @@ class UpdateDB(object):
         agent_name = self.ingest.agent()
 
         # Return if agent already exists in the table
-        if agent.uid_exists(uid) is True:
-            return
+        value = self.registry.agent(uid)
+        if value is not None:
+            return value
 
-        # Prepare SQL query to read a record from the database.
-        record = Agent(
-            id=jm_general.encode(uid),
-            name=jm_general.encode(agent_name))
-        database = db.Database()
-        database.add(record, 1081)
+        # Insert the agent. Another ingest daemon may have done so already
+        _insert_ignore(Agent, {
+            'id': jm_general.encode(uid),
+            'name': jm_general.encode(agent_name)}, 1081)
 
-    def _insert_host(self):
-        """Insert new agent into database.
+        # Return
+        value = self.registry.agent(uid)
+        return value
+
+    def _insert_host(self, idx_agent):
+        """Insert new host into database.
 
         Args:
-            None
+            idx_agent: Index of agent in the Agent db table
 
         Returns:
-            None
+            idx_host: Index of host in the Host db table
 
         """
         # Initialize key variables
-        uid = self.ingest.uid()
         hostname = self.ingest.hostname()
 
         # Update Host table
-        if dhost.hostname_exists(hostname) is False:
+        idx_host = self.registry.host(hostname)
+        if idx_host is None:
             # Add to Host table
-            record = Host(hostname=jm_general.encode(hostname))
-            database = db.Database()
-            database.add(record, 1080)
+            _insert_ignore(
+                Host, {'hostname': jm_general.encode(hostname)}, 1080)
 
-        # Get idx of host
-        host_info = dhost.GetHost(hostname)
-        idx_host = host_info.idx()
-
-        # Get idx of agent
-        uid_info = agent.GetUID(uid)
-        idx_agent = uid_info.idx()
+            # Get idx of host
+            idx_host = self.registry.host(hostname)
 
         # Update HostAgent table
-        if hagent.host_agent_exists(idx_host, idx_agent) is False:
+        if self.registry.host_agent_exists(idx_host, idx_agent) is False:
             # Add to HostAgent table
-            record = HostAgent(idx_host=idx_host, idx_agent=idx_agent)
-            database = db.Database()
-            database.add(record, 1038)
+            _insert_ignore(
+                HostAgent, {'idx_host': idx_host, 'idx_agent': idx_agent},
+                1038)
+            self.registry.add_host_agent(idx_host, idx_agent)
+
+        # Return
+        return idx_host
 
-    def _update_chartable(self, mapping):
+    def _update_chartable(self, database, session, mapping, data):
         """Insert data into the database "iset_data" table.
 
         Args:
+            database: Database object
+            session: Database session of the ingest transaction
             mapping: Map of DIDs to database row index values
+            data: List of chartable (uid, did, value, timestamp) tuples
 
         Returns:
             None
 
         """
         # Initialize key variables
-        data = self.ingest.chartable()
         data_list = []
         timestamp_tracker = {}
 
@@ -248,6 +418,11 @@ class UpdateDB(object):
         for item in data:
             # Process each datapoint item found
             (_, did, string_value, timestamp) = item
+
+            # Skip disabled datapoints
+            if did not in mapping:
+                continue
+
             idx_datapoint = int(mapping[did][0])
             last_timestamp = int(mapping[did][2])
             value = float(string_value)
@@ -256,100 +431,109 @@ class UpdateDB(object):
             # the most recent DID update. Don't do anything more
             if timestamp > last_timestamp:
                 data_list.append(
-                    Data(
-                        idx_datapoint=idx_datapoint,
-                        value=value,
-                        timestamp=timestamp
-                    )
+                    {'idx_datapoint': idx_datapoint,
+                     'value': value,
+                     'timestamp': timestamp}
                 )
 
                 # Update DID's last updated timestamp
-                if idx_datapoint in timestamp_tracker:
-                    timestamp_tracker[idx_datapoint] = max(
-                        timestamp, timestamp_tracker[idx_datapoint])
+                if did in timestamp_tracker:
+                    timestamp_tracker[did] = max(
+                        timestamp, timestamp_tracker[did])
                 else:
-                    timestamp_tracker[idx_datapoint] = timestamp
+                    timestamp_tracker[did] = timestamp
 
         # Update if there is data
         if bool(data_list) is True:
             # Do performance data update
-            database = db.Database()
-            database.add_all(data_list, 1056)
-
-            # Change the last updated timestamp
-            for idx_datapoint, last_timestamp in timestamp_tracker.items():
-                # Update the database
-                database = db.Database()
-                session = database.session()
-                record = session.query(Datapoint).filter(
-                    Datapoint.idx == idx_datapoint).one()
-                record.last_timestamp = last_timestamp
-                database.commit(session, 1057)
+            db_data.insert_rows(database, session, data_list, 1056)
 
-            # Report success
-            log_message = (
-                'Successful cache drain for UID %s at timestamp %s') % (
-                    self.ingest.uid(), self.ingest.timestamp())
-            log.log2quiet(1058, log_message)
+            # Change the last updated timestamps
+            database.execute(
+                session, _DATAPOINT_TIMESTAMP_UPDATE, 1057,
+                [{'b_idx': mapping[did][0], 'b_last_timestamp': last_timestamp}
+                 for did, last_timestamp in sorted(
+                     timestamp_tracker.items())])
+            self.timestamps.update(timestamp_tracker)
 
-    def _update_unchartable(self, mapping):
+    def _update_unchartable(self, database, session, mapping, data):
         """Update unchartable data into the database "iset_datapoint" table.
 
         Args:
+            database: Database object
+            session: Database session of the ingest transaction
             mapping: Map of DIDs to database row index values
+            data: List of unchartable (uid, did, value, timestamp) tuples
 
         Returns:
             None
 
         """
         # Initialize key variables
-        data = self.ingest.other()
-        data_list = []
-        timestamp_tracker = {}
+        data_dict = {}
+        values = {}
+        changed = []
+        unchanged = []
 
         # Update data
         for item in data:
             # Process each datapoint item found
             (_, did, value, timestamp) = item
-            idx_datapoint = int(mapping[did][0])
+
+            # Skip disabled datapoints
+            if did not in mapping:
+                continue
+
             last_timestamp = int(mapping[did][2])
 
             # Only update with data collected after
-            # the most recent update. Don't do anything more
+            # the most recent update. Don't do anything more.
+            # The most recent value per datapoint wins.
             if timestamp > last_timestamp:
-                data_list.append(
-                    (idx_datapoint, value)
-                )
-
-                # Update DID's last updated timestamp
-                if idx_datapoint in timestamp_tracker:
-                    timestamp_tracker[idx_datapoint] = max(
-                        timestamp, timestamp_tracker[idx_datapoint])
-                else:
-                    timestamp_tracker[idx_datapoint] = timestamp
-
-        # Update if there is data
-        if bool(data_list) is True:
-            for item in data_list:
-                (idx_datapoint, value) = item
-
-                # Update database
-                database = db.Database()
-                session = database.session()
-                record = session.query(Datapoint).filter(
-                    Datapoint.idx == idx_datapoint).one()
-                record.uncharted_value = jm_general.encode(value)
-                database.commit(session, 1037)
-
-            # Change the last updated timestamp
-            for idx_datapoint, last_timestamp in timestamp_tracker.items():
-                # Update database
-                database = db.Database()
-                session = database.session()
-                record = session.query(Datapoint).filter(
-                    Datapoint.idx == idx_datapoint).one()
-                record.last_timestamp = last_timestamp
-                database.commit(session, 1083)
+                if did in data_dict:
+                    if timestamp < data_dict[did][1]:
+                        continue
+                data_dict[did] = (value, timestamp)
+
+        # Only write values that changed. The last_timestamp of the
+        # other datapoints is updated in a single statement
+        for did, (value, timestamp) in sorted(data_dict.items()):
+            encoded = jm_general.encode(value)
+            value_digest = registry.digest(encoded)
+            values[mapping[did][0]] = encoded
+            if value_digest == self.registry.uncharted(did):
+                unchanged.append(
+                    {'b_idx': mapping[did][0],
+                     'b_previous': mapping[did][2],
+                     'b_last_timestamp': timestamp})
+            else:
+                changed.append(
+                    {'b_idx': mapping[did][0],
+                     'b_uncharted_value': encoded,
+                     'b_last_timestamp': timestamp})
+            self.digests[did] = value_digest
+
+        # Update the unchanged values first. Datapoints updated by other
+        # ingest threads or daemons since they were last read may not have
+        # the value in the registry, so their value is written too.
+        if bool(unchanged) is True:
+            result = database.execute(
+                session, _DATAPOINT_UNCHANGED_UPDATE, 1037, unchanged)
+            stale = []
+            if result.rowcount != len(unchanged):
+                stale = _stale(database, session, unchanged)
+            for item in stale:
+                changed.append(
+                    {'b_idx': item['b_idx'],
+                     'b_uncharted_value': values[item['b_idx']],
+                     'b_last_timestamp': item['b_last_timestamp']})
+        if bool(changed) is True:
+            database.execute(
+                session, _DATAPOINT_UNCHARTED_UPDATE, 1037, changed)
+        if bool(data_dict) is True:
+            for did, (_, timestamp) in data_dict.items():
+                self.timestamps[did] = max(
+                    timestamp, self.timestamps.get(did, 0))
 
             # Report success
             log_message = (
@@ -359,6 +543,35 @@ class UpdateDB(object):
             log.log2quiet(1045, log_message)
 
 
+def _stale(database, session, items):
+    """Get the datapoints whose last_timestamp wasn't updated.
+
+    Args:
+        database: Database object
+        session: Database session of the ingest transaction
+        items: List of update parameter dicts
+
+    Returns:
+        stale: List of the parameter dicts of datapoints whose
+            last_timestamp is still older than that of the update
+
+    """
+    # Get the last_timestamp of the datapoints
+    statement = select([
+        Datapoint.__table__.c.idx,
+        Datapoint.__table__.c.last_timestamp]).where(
+            Datapoint.__table__.c.idx.in_(
+                [item['b_idx'] for item in items]))
+    result = database.execute(session, statement, 1145)
+    timestamps = dict(result.fetchall())
+
+    # Return
+    stale = [
+        item for item in items
+        if timestamps.get(item['b_idx'], 0) < item['b_last_timestamp']]
+    return stale
+
+
 def _insert_datapoint(metadata, idx_agent, idx_host):
     """Insert new datapoint into database.
 
@@ -381,62 +594,54 @@ def _insert_datapoint(metadata, idx_agent, idx_host):
     # Initialize key variables
     (_, did, agent_label, agent_source, _, base_type) = metadata
 
-    # Insert record
-    record = Datapoint(
-        id=jm_general.encode(did),
-        idx_agent=idx_agent,
-        idx_host=idx_host,
-        agent_label=jm_general.encode(agent_label),
-        agent_source=jm_general.encode(agent_source),
-        base_type=base_type)
-    database = db.Database()
-    database.add(record, 1082)
+    # Insert record. Another ingest daemon may have done so already
+    _insert_ignore(Datapoint, {
+        'id': jm_general.encode(did),
+        'idx_agent': idx_agent,
+        'idx_host': idx_host,
+        'agent_label': jm_general.encode(agent_label),
+        'agent_source': jm_general.encode(agent_source),
+        'base_type': base_type}, 1082)
+
+    # Add to the registry
+    datapoint = dpoint.GetDID(did)
+    registry.REGISTRY.add_datapoint(
+        did, datapoint.idx(), datapoint.idx_agent(),
+        last_timestamp=datapoint.last_timestamp(),
+        enabled=bool(datapoint.enabled()))
 
 
-def _datapoints_by_did(idx_agent):
-    """Create dict of enabled datapoints and their corresponding indices.
+def _insert_ignore(table, values, error_code):
+    """Insert a row, unless a row with the same unique key exists.
 
     Args:
-        idx_agent: Index of agent
+        table: ORM class of the table
+        values: Dict of column values
+        error_code: Error number to use if one occurs
 
     Returns:
-        data: Dict keyed by datapoint ID,
-            with a tuple as its value (idx, idx_agent)
-            idx: Datapoint index
-            idx_agent: Agent index
-            last_timestamp: The last time the timestamp was updated
+        None
 
     """
-    # Initialize key variables
-    data = {}
-
-    # Update database
-    session = db.Database().session()
-    result = session.query(
-        Datapoint.id, Datapoint.idx,
-        Datapoint.idx_agent, Datapoint.last_timestamp).filter(
-            and_(Datapoint.enabled == 1, Datapoint.idx_agent == idx_agent))
-
-    # Massage data
-    for instance in result:
-        did = instance.id.decode('utf-8')
-        idx = instance.idx
-        idx_agent = instance.idx_agent
-        last_timestamp = instance.last_timestamp
-        data[did] = (idx, idx_agent, last_timestamp)
-
-    # Return the session to the database pool after processing
-    session.close()
-
-    # Return
-    return data
+    # Insert
+    statement = table.__table__.insert().prefix_with(
+        'IGNORE', dialect='mysql').prefix_with(
+            'OR IGNORE', dialect='sqlite').values(values)
+    database = db.Database()
+    session = database.session()
+    database.execute(session, statement, error_code)
+    database.commit(session, error_code)
 
 
-def _host_agent_last_update(hostname, uid, last_timestamp):
-    """Insert new datapoint into database.
+def _host_agent_last_update(
+        database, session, idx_host, idx_agent, last_timestamp):
+    """Update the host / agent last_timestamp in the ingest transaction.
 
     Args:
-        uid: UID of agent
+        database: Database object
+        session: Database session of the ingest transaction
+        idx_host: Index of host in the Host db table
+        idx_agent: Index of agent in the Agent db table
         last_timestamp: The last time a DID for the agent was updated
             in the database
 
@@ -444,26 +649,23 @@ def _host_agent_last_update(hostname, uid, last_timestamp):
         None
 
     """
-    # Initialize key variables
-    idx_agent = agent.GetUID(uid).idx()
-    idx_host = dhost.GetHost(hostname).idx()
-
     # Update database
-    database = db.Database()
-    session = database.session()
-    record = session.query(HostAgent).filter(
+    statement = update(HostAgent.__table__).where(
         and_(
-            HostAgent.idx_host == idx_host,
-            HostAgent.idx_agent == idx_agent)).one()
-    record.last_timestamp = last_timestamp
-    database.commit(session, 1042)
+            HostAgent.__table__.c.idx_host == idx_host,
+            HostAgent.__table__.c.idx_agent == idx_agent,
+            HostAgent.__table__.c.last_timestamp < last_timestamp)).values(
+                last_timestamp=last_timestamp)
+    database.execute(session, statement, 1042)
 
 
-def _update_agent_last_update(uid, last_timestamp):
-    """Insert new datapoint into database.
+def _update_agent_last_update(database, session, idx_agent, last_timestamp):
+    """Update the agent last_timestamp in the ingest transaction.
 
     Args:
-        uid: UID of agent
+        database: Database object
+        session: Database session of the ingest transaction
+        idx_agent: Index of agent in the Agent db table
         last_timestamp: The last time a DID for the agent was updated
             in the database
 
@@ -471,93 +673,179 @@ def _update_agent_last_update(uid, last_timestamp):
         None
 
     """
-    # Initialize key variables
-    value = jm_general.encode(uid)
-
     # Update the database
-    database = db.Database()
-    session = database.session()
-    record = session.query(Agent).filter(Agent.id == value).one()
-    record.last_timestamp = last_timestamp
-    database.commit(session, 1055)
+    statement = update(Agent.__table__).where(
+        and_(
+            Agent.__table__.c.idx == idx_agent,
+            Agent.__table__.c.last_timestamp < last_timestamp)).values(
+                last_timestamp=last_timestamp)
+    database.execute(session, statement, 1055)
 
 
-def validate_cache_files():
-    """Method initializing the class.
+def _drain(filepath):
+    """Read, validate and create the DIDs of a cache file.
+
+    This is run in worker processes when a process pool is used. The
+    duplicate check uses the daemon's registry and is left to the caller.
 
     Args:
-        agent_name: agent name
+        filepath: Cache filepath
 
     Returns:
-        None
+        ingest: Drain object
 
     """
-    # Initialize key variables
-    uid_metadata = defaultdict(lambda: defaultdict(dict))
+    # Return
+    ingest = drain.Drain(filepath, duplicates=False)
+    return ingest
 
-    # Configuration setup
-    config = jm_configuration.Config()
-    cache_dir = config.ingest_cache_directory()
 
-    # Filenames must start with a numeric timestamp and #
-    # end with a hex string. This will be tested later
-    regex = re.compile(r'^\d+_[0-9a-f]+_[0-9a-f]+.json')
-
-    # Add files in cache directory to list
-    all_filenames = [filename for filename in os.listdir(
-        cache_dir) if os.path.isfile(
-            os.path.join(cache_dir, filename))]
-
-    ######################################################################
-    # Create threads
-    ######################################################################
-
-    # Process only valid agent filenames
-    for filename in all_filenames:
-        # Add valid data to lists
-        if bool(regex.match(filename)) is True:
-            # Create a complete filepath
-            filepath = os.path.join(cache_dir, filename)
-
-            # Only read files that are 15 seconds or older
-            # to prevent corruption caused by reading a file that could be
-            # updating simultaneously
-            if time.time() - os.path.getmtime(filepath) < 15:
-                continue
+def _pool_drain(filepath):
+    """Read, validate and create the DIDs of a cache file in a worker.
 
-            # Create a dict of UIDs, timestamps and filepaths
-            (name, _) = filename.split('.')
-            (tstamp, uid, hosthash) = name.split('_')
-            timestamp = int(tstamp)
+    The DID memo table statistics of the worker are returned as well, as
+    the daemon can't read them.
 
-            # Keep track of hosts and the UIDs that track them
-            # Create a list of timestamp, host filepath tuples for each UID
-            if bool(uid_metadata[hosthash][uid]) is True:
-                uid_metadata[hosthash][uid].append((timestamp, filepath))
-            else:
-                uid_metadata[hosthash][uid] = [(timestamp, filepath)]
+    Args:
+        filepath: Cache filepath
+
+    Returns:
+        (ingest, pid, hits, misses): Drain object, PID of the worker, and
+            hits and misses of its DID memo table
 
+    """
     # Return
-    return uid_metadata
+    ingest = _drain(filepath)
+    cache_info = jm_general.did_cache_info()
+    return (ingest, os.getpid(), cache_info.hits, cache_info.misses)
 
 
-def process(agent_name):
-    """Method initializing the class.
+def _did_cache_info():
+    """Get the DID memo table statistics of the daemon and its workers.
 
     Args:
-        agent_name: agent name
+        None
+
+    Returns:
+        (hits, misses): Total hits and misses of the DID memo tables
+
+    """
+    # Initialize key variables
+    cache_info = jm_general.did_cache_info()
+    hits = cache_info.hits
+    misses = cache_info.misses
+
+    # Add the statistics of the worker processes
+    with _DID_LOCK:
+        for (worker_hits, worker_misses) in _DID_CACHE.values():
+            hits += worker_hits
+            misses += worker_misses
+
+    # Return
+    return (hits, misses)
+
+
+def _drains(filepaths, pool=None):
+    """Create Drain objects for a list of files, preserving their order.
+
+    Args:
+        filepaths: List of cache filepaths
+        pool: multiprocessing.Pool object. Files are processed in the
+            current thread if None.
 
     Returns:
         None
 
+    Yields:
+        ingest: Drain object for each file
+
+    """
+    # Process in this thread
+    if pool is None:
+        for filepath in filepaths:
+            yield _drain(filepath)
+        return
+
+    # Process in the pool a few files at a time so that a large backlog
+    # for a single UID doesn't get buffered in memory in its entirety.
+    # imap returns results in the same order as the filepaths.
+    chunk = _POOL_CHUNK
+    for start in range(0, len(filepaths), chunk):
+        for (ingest, pid, hits, misses) in pool.imap(
+                _pool_drain, filepaths[start:start + chunk]):
+            with _DID_LOCK:
+                _DID_CACHE[pid] = (hits, misses)
+            yield ingest
+
+
+def _process_pool(processes):
+    """Get the process pool used to read cache files.
+
+    The pool is created on first use, before any ingest threads are
+    started, and kept for the life of the daemon.
+
+    Args:
+        processes: Number of processes in the pool
+
+    Returns:
+        pool: multiprocessing.Pool object. None if processes is zero
+
     """
     # Initialize key variables
-    uid_metadata = defaultdict(lambda: defaultdict(dict))
+    global POOL
+
+    # Create the pool
+    if POOL is None and processes > 0:
+        POOL = multiprocessing.Pool(processes)
+
+    # Return
+    pool = POOL
+    return pool
+
 
+def cache_files(filepaths=None):
+    """Get the cache files to process.
+
+    Args:
+        filepaths: List of cache filepaths to process. All files in the
+            ingest cache directory are processed if None.
+
+    Returns:
+        filepaths: Iterable of cache filepaths
+
+    """
     # Configuration setup
     config = jm_configuration.Config()
-    threads_in_pool = config.ingest_threads()
+    cache_dir = config.ingest_cache_directory()
+
+    # Add files in cache directory and its shards to list.
+    # Skip files in lists provided by the caller that have
+    # already been processed.
+    if filepaths is None:
+        filepaths = spool.files(cache_dir)
+    else:
+        filepaths = [
+            filepath for filepath in filepaths if os.path.isfile(filepath)]
+
+    # Return
+    return filepaths
+
+
+def process(agent_name, filepaths=None):
+    """Schedule cache files for ingestion.
 
+    The ingest threads are started on the first call and run for the
+    life of the daemon. Calls don't wait for the files to be processed.
+
+    Args:
+        agent_name: agent name
+        filepaths: List of cache filepaths to process. All files in the
+            ingest cache directory are processed if None.
+
+    Returns:
+        None
+
+    """
     # Make sure we have database connectivity
     if db.connectivity() is False:
         log_message = (
@@ -567,87 +855,125 @@ def process(agent_name):
         log.log2warn(1053, log_message)
         return
 
-    # Get meta data on files
-    uid_metadata = validate_cache_files()
+    # Update the registry of datapoints with any changes made
+    # outside of the ingest process
+    registry.REGISTRY.refresh()
+
+    # Schedule the files
+    _scheduler(agent_name).add(cache_files(filepaths))
+
+
+def status(agent_name):
+    """Report the state of the ingest queue.
 
-    # Spawn processes only if we have files to process
-    if bool(uid_metadata.keys()) is True:
-        # Process lock file
-        f_obj = hidden.File()
-        lockfile = f_obj.lock(agent_name)
-        if os.path.exists(lockfile) is True:
-            # Return if lock file is present
+    The state is logged and saved in the agent's hidden status file.
+
+    Args:
+        agent_name: agent name
+
+    Returns:
+        data: Dict of queue statistics. See Scheduler.status()
+
+    """
+    # Get the state
+    data = _scheduler(agent_name).status()
+    (data['did_hits'], data['did_misses']) = _did_cache_info()
+
+    # Log
+    log_message = (
+        'Ingest queue has %s pending and %s in progress files for %s '
+        'host / agent pairs, %s with a backlog. Oldest data is %s seconds '
+        'old. DID memo table %s hits, %s misses.'
+        '') % (
+            data['pending'], data['in_progress'], data['keys'],
+            data['backlogged'], data['oldest_age'],
+            data['did_hits'], data['did_misses'])
+    log.log2quiet(1116, log_message)
+
+    # Save to file. Rename so that readers never see partial files
+    filename = hidden.File().status(agent_name)
+    temp_filename = ('%s.tmp') % (filename)
+    with open(temp_filename, 'w') as f_handle:
+        json.dump(data, f_handle)
+    os.rename(temp_filename, filename)
+
+    # Return
+    return data
+
+
+def heartbeat(agent_name):
+    """Renew the daemon's claims and recover those of dead daemons.
+
+    Must be called more often than the "ingest_lease_timeout" interval.
+
+    Args:
+        agent_name: agent name
+
+    Returns:
+        None
+
+    """
+    # Renew and reap
+    _scheduler(agent_name)
+    CLAIMS.renew()
+    CLAIMS.reap()
+
+
+def _scheduler(agent_name):
+    """Get the scheduler, starting the ingest threads if necessary.
+
+    Args:
+        agent_name: agent name
+
+    Returns:
+        schedule: scheduler.Scheduler object
+
+    """
+    # Initialize key variables
+    global SCHEDULER
+    global CLAIMS
+
+    # Return the existing scheduler
+    if SCHEDULER is not None:
+        return SCHEDULER
+
+    # Configuration setup
+    config = jm_configuration.Config()
+    threads_in_pool = config.ingest_threads()
+    processes_in_pool = config.ingest_processes()
+    schedule = scheduler.Scheduler()
+
+    # Files are claimed so that several ingest daemons can share the
+    # cache directory
+    CLAIMS = claim.Claims(
+        config.ingest_cache_directory(), config.ingest_lease_timeout(),
+        sharded=config.ingest_cache_sharded())
+
+    # Get the pool of processes that read, validate and create the
+    # DIDs of files. This must be done before any threads are started.
+    # The threads then only do the database updates.
+    pool = _process_pool(processes_in_pool)
+
+    # Spawn a pool of threads that process files until the daemon stops
+    for thread_number in range(threads_in_pool):
+        update_thread = ProcessUID(schedule, CLAIMS, thread_number, pool)
+        update_thread.daemon = True
+
+        # Sometimes we exhaust the thread abilities of the OS
+        # even with the "threads_in_pool" limit.
+        try:
+            update_thread.start()
+        except RuntimeError:
             log_message = (
-                'Ingest lock file %s exists. Multiple ingest daemons running '
-                'or lots of cache files to ingest. Ingester may have died '
-                'catastrophically in the past, in which case the lockfile '
-                'should be deleted. Exiting ingest process. '
-                'Will try again later.'
-                '') % (lockfile)
-            log.log2warn(1069, log_message)
-            return
-        else:
-            # Create lockfile
-            open(lockfile, 'a').close()
-
-        # Spawn a pool of threads, and pass them queue instance
-        # Only create the required number of threads up to the
-        # threads_in_pool maximum
-        for _ in range(
-                min(threads_in_pool, len(uid_metadata))):
-            update_thread = ProcessUID(THREAD_QUEUE)
-            update_thread.daemon = True
-
-            # Sometimes we exhaust the thread abilities of the OS
-            # even with the "threads_in_pool" limit. This is because
-            # there could be a backlog of files to cache files process
-            # and we have overlapping ingests due to a deleted lockfile.
-            # This code ensures we don't exceed the limits.
-            try:
-                update_thread.start()
-            except RuntimeError:
-                log_message = (
-                    'Too many threads created for cache ingest. '
-                    'Verify that ingest lock file is present.')
+                'Too many threads created for cache ingest. '
+                'Reduce the value of ingest_threads.')
+            log.log2die(1067, log_message)
+        except:
+            log_message = (
+                'Unknown error occurred when trying to '
+                'create cache ingest threads')
+            log.log2die(1072, log_message)
 
-                # Remove the lockfile so we can restart later then die
-                os.remove(lockfile)
-                log.log2die(1067, log_message)
-            except:
-                log_message = (
-                    'Unknown error occurred when trying to '
-                    'create cache ingest threads')
-
-                # Remove the lockfile so we can restart later then die
-                os.remove(lockfile)
-                log.log2die(1072, log_message)
-
-        # Read each cache file
-        for hosthash in uid_metadata.keys():
-            for uid in uid_metadata[hosthash].keys():
-                ##############################################################
-                #
-                # Define variables that will be required for the threading
-                # We have to initialize the dict during every loop to prevent
-                # data corruption
-                #
-                ##############################################################
-                data_dict = {}
-                data_dict['uid'] = uid
-                data_dict['metadata'] = uid_metadata[hosthash][uid]
-                data_dict['config'] = config
-                THREAD_QUEUE.put(data_dict)
-
-        # Wait on the queue until everything has been processed
-        THREAD_QUEUE.join()
-
-        # PYTHON BUG. Join can occur while threads are still shutting down.
-        # This can create spurious "Exception in thread (most likely raised
-        # during interpreter shutdown)" errors.
-        # The "time.sleep(1)" adds a delay to make sure things really terminate
-        # properly. This seems to be an issue on virtual machines in Dev only
-        time.sleep(1)
-
-        # Return if lock file is present
-        if os.path.exists(lockfile) is True:
-            os.remove(lockfile)
+    # Return
+    SCHEDULER = schedule
+    return schedule
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+
+"""Claim cache files so that several ingest daemons can share a spool.
+
+Each ingest daemon is a worker with its own directory in the "progress"
+sub-directory of the ingest cache directory. The directory contains a
+token file whose modification time is the worker's lease. The worker
+renews the lease while it is running.
+
+A worker claims a host / agent key by hard linking its token file into
+the "claims" sub-directory. Linking fails if another worker holds the
+claim, which makes it atomic, even over NFS. Files of a claimed key are
+then renamed into the worker's directory before they are processed.
+
+Workers whose lease expires are presumed dead. Their files are returned
+to the spool, with the checkpoints of their ingest journals, and their
+claims are removed by the other workers. Workers on the same host whose
+process has stopped are reaped without waiting for their lease to
+expire. A worker that finds it was reaped drops all its claims.
+
+"""
+
+# Standard libraries
+import os
+import time
+import socket
+import threading
+
+# Infoset libraries
+from infoset.utils import log
+from infoset.utils import spool
+from infoset.cache import journal
+
+# Name of the token file of a worker
+_TOKEN = '.token'
+
+
+class Claims(object):
+    """Claims of an ingest worker.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        claim:
+        release:
+        holds:
+        claim_file:
+        unclaim_files:
+        renew:
+        reap:
+
+    """
+
+    def __init__(self, cache_dir, timeout, sharded=False):
+        """Method initializing the class.
+
+        Args:
+            cache_dir: Ingest cache directory
+            timeout: Seconds after which leases that haven't been
+                renewed expire
+            sharded: Return files to the sharded layout if True
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.sharded = sharded
+        self.worker = ('%s-%s') % (socket.gethostname(), os.getpid())
+        self.progress_dir = os.path.join(cache_dir, 'progress')
+        self.claims_dir = os.path.join(cache_dir, 'claims')
+        self.directory = os.path.join(self.progress_dir, self.worker)
+        self.token = os.path.join(self.directory, _TOKEN)
+        self.held = set()
+        self.lock = threading.Lock()
+
+        # Create directories
+        for directory in [self.progress_dir, self.claims_dir]:
+            try:
+                os.mkdir(directory)
+            except FileExistsError:
+                pass
+
+        # Recover files left by a dead worker with the same name
+        if os.path.isdir(self.directory) is True:
+            self._recover(self.directory, self.worker)
+        self._create()
+
+        # Recover files left by workers that stopped on this host
+        self.reap()
+
+    def claim(self, key):
+        """Claim a host / agent key.
+
+        Args:
+            key: (hosthash, uid) tuple
+
+        Returns:
+            success: True if claimed. False if another worker has the claim
+
+        """
+        # Initialize key variables
+        success = True
+
+        # Claim
+        with self.lock:
+            try:
+                os.link(self.token, self._claim_path(key))
+            except FileExistsError:
+                success = False
+            if success is True:
+                self.held.add(key)
+
+        # Return
+        return success
+
+    def release(self, key):
+        """Release the claim on a host / agent key.
+
+        Args:
+            key: (hosthash, uid) tuple
+
+        Returns:
+            None
+
+        """
+        # Release. Claims dropped when the worker was reaped may now
+        # belong to another worker
+        with self.lock:
+            if key in self.held:
+                self.held.remove(key)
+                _remove(self._claim_path(key))
+
+    def holds(self, key):
+        """Check whether the worker still holds the claim on a key.
+
+        Args:
+            key: (hosthash, uid) tuple
+
+        Returns:
+            result: True if the claim is held
+
+        """
+        # Return
+        with self.lock:
+            result = key in self.held
+        return result
+
+    def claim_file(self, filepath):
+        """Move a file of a claimed key into the worker's directory.
+
+        Args:
+            filepath: Cache filepath
+
+        Returns:
+            claimed: New filepath. None if the file no longer exists
+
+        """
+        # Initialize key variables
+        claimed = os.path.join(self.directory, os.path.basename(filepath))
+
+        # Move the file and its checkpoint, if any
+        try:
+            os.rename(filepath, claimed)
+        except FileNotFoundError:
+            claimed = None
+        if claimed is not None:
+            try:
+                os.rename(
+                    journal.checkpoint(filepath), journal.checkpoint(claimed))
+            except FileNotFoundError:
+                pass
+
+        # Return
+        return claimed
+
+    def unclaim_files(self, filepaths):
+        """Return claimed files to the spool.
+
+        Files keep a checkpoint of the chunks already committed. Files that
+        were completely committed are deleted.
+
+        Args:
+            filepaths: List of filepaths returned by claim_file()
+
+        Returns:
+            returned: List of the filepaths of the files in the spool
+
+        """
+        # Initialize key variables
+        committed = journal.read(self.directory)
+        returned = []
+
+        # Return files that weren't taken back by another worker
+        for filepath in filepaths:
+            if os.path.isfile(filepath) is False:
+                continue
+            chunks = committed.get(os.path.basename(filepath), set())
+            target = self._return(filepath, chunks)
+            journal.remove(filepath)
+            if target is not None:
+                returned.append(target)
+
+        # Return
+        return returned
+
+    def renew(self):
+        """Renew the lease of the worker and all its claims.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Claims are links to the token, so they share its timestamp
+        try:
+            os.utime(self.token)
+            return
+        except FileNotFoundError:
+            pass
+
+        # The worker was reaped. Its files were returned to the spool and
+        # its claims may already be held by other workers, so drop them
+        # and start again. Only the first of the threads that found the
+        # token missing does this.
+        with self.lock:
+            if os.path.exists(self.token) is True:
+                return
+            dropped = len(self.held)
+            self.held.clear()
+            self._create()
+        log_message = (
+            'Ingest worker %s lease expired while it was running. '
+            'Dropped its %s claims.') % (self.worker, dropped)
+        log.log2warn(1146, log_message)
+
+    def reap(self):
+        """Recover the files and claims of workers that stopped.
+
+        Workers stopped if their lease expired, or if their process is no
+        longer running on this host.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        now = time.time()
+
+        # Find expired workers
+        for worker in os.listdir(self.progress_dir):
+            if worker == self.worker or worker.startswith('.') is True:
+                continue
+            directory = os.path.join(self.progress_dir, worker)
+            try:
+                mtime = os.stat(os.path.join(directory, _TOKEN)).st_mtime
+            except FileNotFoundError:
+                try:
+                    mtime = os.stat(directory).st_mtime
+                except FileNotFoundError:
+                    continue
+            stopped = _stopped(worker)
+            if now - mtime < self.timeout and stopped is False:
+                continue
+
+            # Take over the directory. Only one worker can rename it
+            reaped = os.path.join(
+                self.progress_dir, ('.%s.%s') % (worker, self.worker))
+            try:
+                os.rename(directory, reaped)
+            except FileNotFoundError:
+                continue
+            self._recover(reaped, worker)
+
+            if stopped is True:
+                log_message = (
+                    'Ingest worker %s is no longer running. Its cache '
+                    'files were returned to the spool.') % (worker)
+                log.log2warn(1147, log_message)
+            else:
+                log_message = (
+                    'Ingest worker %s lease expired. Its cache files were '
+                    'returned to the spool.') % (worker)
+                log.log2warn(1118, log_message)
+
+    def _recover(self, directory, worker):
+        """Return the files of a worker to the spool and drop its claims.
+
+        Args:
+            directory: Directory of the worker
+            worker: Name of the worker
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        committed = journal.read(directory)
+
+        # Return files to the spool first, so that nothing newer for
+        # their keys can be processed before them. Files that were
+        # completely committed are deleted. The others keep a checkpoint
+        # of the chunks already committed.
+        for filepath in spool.files_in(directory):
+            filename = os.path.basename(filepath)
+            self._return(filepath, committed.get(filename, set()))
+
+        # Drop the worker's claims
+        for name in os.listdir(self.claims_dir):
+            path = os.path.join(self.claims_dir, name)
+            try:
+                with open(path, 'r') as f_handle:
+                    owner = f_handle.read()
+            except FileNotFoundError:
+                continue
+            if owner == worker:
+                _remove(path)
+
+        # Delete the directory
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    def _return(self, filepath, chunks):
+        """Return a file to the spool with a checkpoint of its chunks.
+
+        Args:
+            filepath: Filepath in a worker's directory
+            chunks: Set of committed chunk numbers. None if the file was
+                completely committed
+
+        Returns:
+            target: Filepath in the spool. None if the file was deleted
+
+        """
+        # Initialize key variables
+        target = None
+
+        # Delete files that were completely committed. Return the others
+        if chunks is None:
+            os.remove(filepath)
+        else:
+            filename = os.path.basename(filepath)
+            hosthash = filename.split('.')[0].split('_')[2]
+            target = os.path.join(spool.directory(
+                self.cache_dir, hosthash, self.sharded), filename)
+            if bool(chunks) is True:
+                journal.save(target, chunks)
+            os.rename(filepath, target)
+
+        # Return
+        return target
+
+    def _create(self):
+        """Create the directory and token file of the worker.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Create
+        try:
+            os.mkdir(self.directory)
+        except FileExistsError:
+            pass
+        with open(self.token, 'w') as f_handle:
+            f_handle.write(self.worker)
+
+    def _claim_path(self, key):
+        """Get the path of the claim file of a host / agent key.
+
+        Args:
+            key: (hosthash, uid) tuple
+
+        Returns:
+            path: Path of the claim file
+
+        """
+        # Return
+        (hosthash, uid) = key
+        path = os.path.join(self.claims_dir, ('%s_%s') % (hosthash, uid))
+        return path
+
+
+def _stopped(worker):
+    """Check whether the process of a worker on this host has stopped.
+
+    Args:
+        worker: Name of the worker
+
+    Returns:
+        result: True if the worker ran on this host and its process no
+            longer exists
+
+    """
+    # Initialize key variables
+    result = False
+    (hostname, _, pid) = worker.rpartition('-')
+
+    # Only processes on this host can be checked
+    if hostname == socket.gethostname() and pid.isdigit() is True:
+        if int(pid) > 0:
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                result = True
+            except PermissionError:
+                pass
+
+    # Return
+    return result
+
+
+def _remove(path):
+    """Delete a file if it exists.
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        None
+
+    """
+    # Delete
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,728 @@
+#!/usr/bin/env python3
+
+"""Ingest agent data received by the web server without the spool.
+
+Data posted to /receive is handed to ingest threads running in the web
+server. It is only saved in the ingest cache directory, by the writer
+thread for the ingest daemon, when:
+
+    1) The queue of the ingest threads is full
+    2) The database recently failed
+    3) Files of the same host / agent are already waiting in the cache
+       directory or with the writer thread, or an ingest daemon is
+       processing them. Data of a host / agent is always ingested in
+       timestamp order.
+
+Requests are only acknowledged once the data is in the database or its
+cache file is on disk. Requests that wait longer than
+ingest_direct_timeout seconds are answered with HTTP 503 so that the
+agent sends the data again later. Data that was already ingested is
+ignored, so sending it again is safe.
+
+The data must have been checked with validate.check when it was
+received. Cache files of the data are named so that ingest daemons don't
+check it again.
+
+"""
+
+# Standard libraries
+import os
+import sys
+import queue
+import threading
+import time
+
+# Infoset libraries
+from infoset.utils import jm_configuration
+from infoset.utils import jm_general
+from infoset.utils import compact
+from infoset.utils import log
+from infoset.utils import spool
+from infoset.utils.log import LogThread
+from infoset.cache import cache
+from infoset.cache import claim
+from infoset.cache import drain
+from infoset.cache import registry
+from infoset.cache import watch
+from infoset.cache import writer
+
+# Ingest threads of the web server. Created on first use
+DIRECT = None
+_LOCK = threading.Lock()
+
+# Seconds during which data is saved in the cache directory after a
+# database error
+_RETRY = 60
+
+# Seconds between renewals of the lease of idle threads
+_RENEW = 60
+
+# Seconds between full scans of the cache directory when watching it,
+# and when polling it because inotify isn't available
+_RESCAN_INTERVAL = 300
+_POLL_INTERVAL = 5
+
+
+class Receipt(object):
+    """Outcome of the processing of received data.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        done:
+        wait:
+
+    """
+
+    def __init__(self):
+        """Method initializing the class.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.event = threading.Event()
+        self.success = False
+
+    def done(self, success):
+        """Record the outcome.
+
+        Args:
+            success: True if the data was ingested or saved
+
+        Returns:
+            None
+
+        """
+        # Update
+        self.success = success
+        self.event.set()
+
+    def wait(self, timeout):
+        """Wait for the outcome.
+
+        Args:
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            success: True if the data was ingested or saved. False if
+                that failed or the timeout expired
+
+        """
+        # Return
+        self.event.wait(timeout)
+        success = self.success
+        return success
+
+
+class Spooled(object):
+    """Track the cache files waiting in the ingest cache directory.
+
+    The cache directory is scanned once. Files saved later by any process
+    are then reported by a watcher thread, or found by rescanning the
+    directory every few seconds if inotify isn't available. Files are
+    forgotten once they no longer exist.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        scan:
+        add:
+        pending:
+
+    """
+
+    def __init__(self, cache_dir, watching=True):
+        """Method initializing the class.
+
+        Args:
+            cache_dir: Cache directory
+            watching: Use inotify to find new files if True
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.watcher = None
+
+        # (uid, hosthash) keyed dict of sets of cache filepaths
+        self.paths = {}
+
+        # Start watching before the scan so that no file is missed
+        if watching is True:
+            self.watcher = watch.Watcher(cache_dir)
+            if self.watcher.enabled() is False:
+                self.watcher = None
+        self.scan()
+
+        # Start the thread
+        watch_thread = _Watch(self)
+        watch_thread.daemon = True
+        watch_thread.start()
+
+    def scan(self):
+        """Scan the cache directory for files.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Add the files found, then forget those that were removed
+        self.add(spool.files(self.cache_dir))
+        with self.lock:
+            for key in list(self.paths):
+                self._prune(key)
+
+    def add(self, filepaths):
+        """Add cache files.
+
+        Args:
+            filepaths: Iterable of cache filepaths. The files may be
+                created later, by the writer thread
+
+        Returns:
+            None
+
+        """
+        # Update
+        with self.lock:
+            for filepath in filepaths:
+                key = _key(filepath)
+                if key not in self.paths:
+                    self.paths[key] = set()
+                self.paths[key].add(filepath)
+
+    def pending(self, uid, hosthash):
+        """Determine whether there are cache files for a host / agent.
+
+        Args:
+            uid: UID of the agent
+            hosthash: Hash of the hostname
+
+        Returns:
+            value: True if there are files
+
+        """
+        # Return
+        with self.lock:
+            value = self._prune((uid, hosthash))
+        return value
+
+    def _prune(self, key):
+        """Forget the files of a host / agent that no longer exist.
+
+        The lock must be held.
+
+        Args:
+            key: (uid, hosthash) tuple
+
+        Returns:
+            value: True if files remain
+
+        """
+        # Initialize key variables
+        filepaths = self.paths.get(key, set())
+
+        # Prune
+        for filepath in list(filepaths):
+            if os.path.exists(filepath) is False:
+                filepaths.discard(filepath)
+        value = bool(filepaths)
+        if value is False:
+            self.paths.pop(key, None)
+
+        # Return
+        return value
+
+
+class _Watch(LogThread):
+    """Thread finding new files in the ingest cache directory."""
+
+    def __init__(self, spooled):
+        """Initialize the thread.
+
+        Args:
+            spooled: Spooled object
+
+        Returns:
+            None
+
+        """
+        LogThread.__init__(self)
+        self.spooled = spooled
+
+    def run(self):
+        """Track new files until the web server stops."""
+        # Initialize key variables
+        watcher = self.spooled.watcher
+        rescan = time.time()
+
+        while True:
+            # Poll the cache directory
+            if watcher is None:
+                time.sleep(_POLL_INTERVAL)
+                self.spooled.scan()
+                continue
+
+            # Rescan the whole directory when events were lost, and
+            # periodically to forget files that were removed
+            filepaths = watcher.wait(_RESCAN_INTERVAL)
+            if filepaths is None or (
+                    time.time() - rescan >= _RESCAN_INTERVAL):
+                rescan = time.time()
+                self.spooled.scan()
+            else:
+                self.spooled.add(filepaths)
+
+
+class Direct(object):
+    """Queue agent data for the ingest threads of the web server.
+
+    Hosts are assigned to threads by hash, so that the data of a host is
+    always ingested by the same thread in the order it was received.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        submit:
+        failed:
+
+    """
+
+    def __init__(self):
+        """Method initializing the class.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        config = jm_configuration.Config()
+        threads = max(1, config.ingest_direct_threads())
+        self.config = config
+        size = max(1, config.ingest_direct_queue() // threads)
+        self.cache_dir = config.ingest_cache_directory()
+        self.sharded = config.ingest_cache_sharded()
+        self.failures_dir = config.ingest_failures_directory()
+        self.claims = claim.Claims(
+            self.cache_dir, config.ingest_lease_timeout(),
+            sharded=self.sharded)
+        self.spooled = Spooled(self.cache_dir, config.ingest_watch())
+        self.queues = []
+        self.down_until = 0
+
+        # Start the threads
+        for _ in range(threads):
+            items = queue.Queue(maxsize=size)
+            ingest_thread = _Ingest(self, items)
+            ingest_thread.daemon = True
+            ingest_thread.start()
+            self.queues.append(items)
+
+    def submit(self, data, hosthash, payload=None):
+        """Queue agent data for ingestion.
+
+        Args:
+            data: Dict of validated agent data
+            hosthash: Hash of the hostname
+            payload: Data in the compact format
+
+        Returns:
+            receipt: Receipt of the data if queued. The caller must save
+                the data in the cache directory if None
+
+        """
+        # Initialize key variables
+        receipt = None
+
+        # Don't queue while the database is unavailable
+        if time.time() < self.down_until:
+            return receipt
+
+        # Queue
+        items = self.queues[int(hosthash[:8], 16) % len(self.queues)]
+        try:
+            receipt = Receipt()
+            items.put_nowait((data, hosthash, payload, receipt))
+        except queue.Full:
+            receipt = None
+
+        # Return
+        return receipt
+
+    def failed(self):
+        """Report a database error.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Save data in the cache directory for a while
+        self.down_until = time.time() + _RETRY
+
+
+class _Ingest(LogThread):
+    """Ingest thread of the web server."""
+
+    def __init__(self, direct, items):
+        """Initialize the thread.
+
+        Args:
+            direct: Direct object
+            items: Queue of (data, hosthash, payload, receipt) tuples
+
+        Returns:
+            None
+
+        """
+        LogThread.__init__(self)
+        self.direct = direct
+        self.items = items
+
+    def run(self):
+        """Ingest queued data."""
+        while True:
+            # Keep the lease of the web server's claims while idle
+            try:
+                (data, hosthash, payload, receipt) = self.items.get(
+                    timeout=_RENEW)
+            except queue.Empty:
+                self.direct.claims.renew()
+                continue
+            self.direct.claims.renew()
+
+            # Make sure the request is answered if anything goes wrong.
+            # Keep the thread running for the other requests of its queue
+            try:
+                self._process(data, hosthash, payload, receipt)
+            except:
+                receipt.done(False)
+                log_message = (
+                    'Direct ingest of data from host %s failed: %s %s'
+                    '') % (hosthash, sys.exc_info()[0], sys.exc_info()[1])
+                log.log2warn(1148, log_message)
+
+    def _process(self, data, hosthash, payload, receipt):
+        """Ingest or save queued data.
+
+        Args:
+            data: Dict of agent data
+            hosthash: Hash of the hostname
+            payload: Data in the compact format
+            receipt: Receipt of the data
+
+        Returns:
+            None
+
+        """
+        # Skip the host / agent while an ingest daemon has it
+        key = (hosthash, data['uid'])
+        if self.direct.claims.claim(key) is False:
+            self._spool(data, hosthash, payload, receipt)
+            return
+
+        try:
+            self._ingest(data, hosthash, payload, receipt)
+        finally:
+            self.direct.claims.release(key)
+
+    def _ingest(self, data, hosthash, payload, receipt):
+        """Ingest data of a claimed host / agent.
+
+        Args:
+            data: Dict of agent data
+            hosthash: Hash of the hostname
+            payload: Data in the compact format
+            receipt: Receipt of the data
+
+        Returns:
+            None
+
+        """
+        # Older data is waiting to be saved, or in the cache directory
+        if writer.pending(data['uid'], hosthash) is True or (
+                self.direct.spooled.pending(
+                    data['uid'], hosthash) is True):
+            self._spool(data, hosthash, payload, receipt)
+            return
+
+        # Update the database. Database errors are logged with log2die,
+        # which raises SystemExit. Rows are inserted with INSERT IGNORE,
+        # so the ingest daemon can safely process the data again.
+        try:
+            registry.REGISTRY.refresh()
+            ingest = drain.Drain(data=data, duplicates=False, validated=True)
+            processed = ingest.valid() is True and (
+                registry.REGISTRY.unprocessed(
+                    ingest.uid(), ingest.hostname(),
+                    ingest.timestamp()) is False)
+            if ingest.valid() is True and processed is False:
+                cache.UpdateDB(ingest).update()
+        except:
+            self.direct.failed()
+            self._spool(data, hosthash, payload, receipt)
+            log_message = (
+                'Could not ingest received data of host %s. Saved it for '
+                'the ingest daemon.') % (data['hostname'])
+            log.log2warn(1120, log_message)
+            return
+
+        # Ignore data sent again by agents that didn't get a reply
+        if processed is True:
+            log_message = (
+                'Received data of host %s at timestamp %s was already '
+                'ingested. Ignoring it.') % (
+                    data['hostname'], data['timestamp'])
+            log.log2quiet(1142, log_message)
+
+        # Move bad data to a directory for further analysis
+        # by administrators
+        if ingest.valid() is False:
+            filepath = save(
+                data, hosthash, payload, self.direct.failures_dir, False,
+                validated=False)
+            log_message = (
+                'Received data is invalid. Saved as %s.') % (filepath)
+            log.log2warn(1119, log_message)
+
+        # The data was dealt with
+        receipt.done(True)
+
+    def _spool(self, data, hosthash, payload, receipt):
+        """Save data as a cache file for the ingest daemon.
+
+        The data is queued for the writer thread, behind any older data of
+        the host / agent. It is saved right away if the queue is full.
+
+        Args:
+            data: Dict of agent data
+            hosthash: Hash of the hostname
+            payload: Data in the compact format
+            receipt: Receipt of the data, completed once the file is on
+                disk
+
+        Returns:
+            None
+
+        """
+        # Track the file so that newer data of the host / agent is saved
+        # behind it
+        self.direct.spooled.add([filepath(
+            data, hosthash, payload, self.direct.cache_dir,
+            self.direct.sharded)])
+
+        # Save
+        if writer.save(
+                self.direct.config, data, hosthash, payload=payload,
+                receipt=receipt) is True:
+            return
+        try:
+            save(data, hosthash, payload,
+                 self.direct.cache_dir, self.direct.sharded)
+        except OSError as exception_error:
+            log_message = (
+                'Could not save received data of host %s. Error: %s'
+                '') % (data['hostname'], exception_error)
+            log.log2warn(1143, log_message)
+            receipt.done(False)
+            return
+        receipt.done(True)
+
+
+def filepath(data, hosthash, payload, cache_dir, sharded, validated=True):
+    """Get the path of the cache file of received data.
+
+    Args:
+        data: Dict of agent data
+        hosthash: Hash of the hostname
+        payload: Data in the compact format
+        cache_dir: Cache directory
+        sharded: Use the sharded layout if True
+        validated: Name the file as one with validated data if True
+
+    Returns:
+        value: Path of the cache file
+
+    """
+    # Return
+    value = spool.filepath(
+        cache_dir, data['timestamp'], data['uid'], hosthash, sharded,
+        extension=_extension(payload, validated))
+    return value
+
+
+def save(data, hosthash, payload, cache_dir, sharded, validated=True):
+    """Save received data as a cache file.
+
+    Args:
+        data: Dict of agent data
+        hosthash: Hash of the hostname
+        payload: Data in the compact format
+        cache_dir: Cache directory
+        sharded: Use the sharded layout if True
+        validated: Name the file as one with validated data if True
+
+    Returns:
+        filepath: Path of the cache file
+
+    """
+    # Save
+    value = spool.save(
+        cache_dir, data, hosthash, sharded, payload=payload,
+        extension=_extension(payload, validated))
+    return value
+
+
+def _extension(payload, validated):
+    """Get the filename extension of the cache file of received data.
+
+    Args:
+        payload: Data in the compact format
+        validated: Name the file as one with validated data if True
+
+    Returns:
+        extension: Filename extension
+
+    """
+    # Initialize key variables
+    extension = 'json'
+    if payload is not None:
+        extension = compact.EXTENSION
+    if validated is True:
+        extension = spool.validated_extension(extension)
+
+    # Return
+    return extension
+
+
+def _key(filepath):
+    """Get the host / agent of a cache file.
+
+    Args:
+        filepath: Cache filepath
+
+    Returns:
+        key: (uid, hosthash) tuple
+
+    """
+    # Return
+    (_, uid, hosthash) = os.path.basename(
+        filepath).split('.')[0].split('_')
+    key = (uid, hosthash)
+    return key
+
+
+def receive(config, data, payload=None):
+    """Ingest data received by the web server.
+
+    Args:
+        config: Config object
+        data: Dict of agent data, checked with validate.check
+        payload: Data in the compact format
+
+    Returns:
+        success: True if the data was accepted. Web servers must answer
+            with HTTP 503 if False, so the agent sends it again later
+
+    """
+    # Return
+    success = receive_batch(config, [data], payloads=[payload])
+    return success
+
+
+def receive_batch(config, batch, payloads=None):
+    """Ingest data of many hosts received by the web server.
+
+    Data that was accepted is ignored when the agent sends it again.
+
+    Args:
+        config: Config object
+        batch: List of dicts of agent data, checked with validate.check
+        payloads: List of the data in the compact format
+
+    Returns:
+        success: True if all the data was accepted. Web servers must
+            answer with HTTP 503 if False, so the agent sends it again
+            later
+
+    """
+    # Initialize key variables
+    receipts = []
+    if payloads is None:
+        payloads = [None] * len(batch)
+
+    # Hand the data to the ingest threads or the writer thread
+    for data, payload in zip(batch, payloads):
+        receipt = _accept(config, data, payload)
+        if receipt is None:
+            return False
+        receipts.append(receipt)
+
+    # Wait until the data is in the database or on disk
+    deadline = time.time() + config.ingest_direct_timeout()
+    for receipt in receipts:
+        if receipt.wait(max(0, deadline - time.time())) is False:
+            return False
+    return True
+
+
+def _accept(config, data, payload):
+    """Hand received data to the ingest threads or the writer thread.
+
+    Args:
+        config: Config object
+        data: Dict of agent data, checked with validate.check
+        payload: Data in the compact format
+
+    Returns:
+        receipt: Receipt of the data. None if it was refused
+
+    """
+    # Initialize key variables
+    global DIRECT
+    hosthash = jm_general.hashstring(data['hostname'], sha=1)
+
+    # Queue the data for the ingest threads
+    if config.ingest_direct() is True:
+        with _LOCK:
+            if DIRECT is None:
+                DIRECT = Direct()
+        receipt = DIRECT.submit(data, hosthash, payload=payload)
+        if receipt is not None:
+            return receipt
+
+    # Queue the data for saving for the ingest daemon. It is accepted
+    # once queued
+    receipt = None
+    if writer.save(config, data, hosthash, payload=payload) is True:
+        receipt = Receipt()
+        receipt.done(True)
+    return receipt
@@ -12,7 +12,6 @@ from collections import defaultdict
 
 # Infoset libraries
 from infoset.utils import log
-from infoset.utils import jm_general
 from infoset.cache import validate
 
 
@@ -31,11 +30,19 @@ class Drain(object):
         post:
     """
 
-    def __init__(self, filename):
+    def __init__(
+            self, filename=None, duplicates=True, data=None, validated=False):
         """Method initializing the class.
 
+        Drain objects can be pickled. This allows them to be created in
+        worker processes.
+
         Args:
             filename: Cache filename
+            duplicates: Check for data older than that already ingested
+                if True
+            data: Dict of agent data to use instead of a cache file
+            validated: True if the data was validated when it was received
 
         Returns:
             None
@@ -43,78 +50,29 @@ class Drain(object):
         """
         # Initialize key variables
         self.filename = filename
-        self.data = defaultdict(lambda: defaultdict(dict))
+        self.data = defaultdict(dict)
         self.metadata = []
         self.validated = False
         self.agent_meta = {}
-        data_types = ['chartable', 'other']
-        agent_meta_keys = ['timestamp', 'uid', 'agent', 'hostname']
 
-        # Ingest data
-        validator = validate.ValidateCache(filename)
-        information = validator.getinfo()
+        # Ingest data. The data is decoded while it is validated
+        if filename is None:
+            validator = validate.ValidateCache(data=data, validated=validated)
+        else:
+            validator = validate.ValidateCache(filename)
 
         # Log if data is bad
-        if information is False:
-            log_message = (
-                'Cache ingest file %s is invalid.') % (filename)
-            log.log2warn(1051, log_message)
+        if validator.valid(duplicates=duplicates) is False:
+            if filename is not None:
+                log_message = (
+                    'Cache ingest file %s is invalid.') % (filename)
+                log.log2warn(1051, log_message)
             return
         else:
             self.validated = True
 
-        if self.validated is True:
-            # Get universal parameters from file. Convert to unicode
-            for key in agent_meta_keys:
-                if key == 'timestamp':
-                    self.agent_meta[key] = int(information[key])
-                else:
-                    self.agent_meta[key] = information[key]
-            timestamp = self.agent_meta['timestamp']
-            uid = self.agent_meta['uid']
-
-            # Process chartable data
-            for data_type in data_types:
-                # Skip if data type isn't in the data
-                if data_type not in information:
-                    continue
-
-                # Process the data type
-                for label, group in sorted(
-                        information[data_type].items()):
-                    # Get universal parameters for group
-                    base_type = _base_type(group['base_type'])
-                    description = group['description']
-
-                    # Initialize base type
-                    if base_type not in self.data[data_type]:
-                        self.data[data_type][base_type] = []
-
-                    # Process data
-                    for datapoint in group['data']:
-                        index = datapoint[0]
-                        value = datapoint[1]
-                        source = datapoint[2]
-                        did = _did(
-                            uid, label, index,
-                            self.agent_meta['agent'],
-                            self.agent_meta['hostname'])
-
-                        # Update data
-                        if base_type != 0:
-                            self.data[data_type][base_type].append(
-                                (uid, did, value, timestamp)
-                            )
-                        else:
-                            self.data[data_type][base_type].append(
-                                (uid, did, value, timestamp)
-                            )
-
-                        # Update sources after fixing encoding
-                        self.metadata.append(
-                            (uid, did, label, source,
-                             description, base_type)
-                        )
+        # Get the decoded data
+        (self.agent_meta, self.data, self.metadata) = validator.decoded()
 
     def valid(self):
         """Determine whether data is valid.
@@ -371,56 +329,3 @@ class Drain(object):
 
         # Return
         return success
-
-
-def _did(uid, label, index, agent_name, hostname):
-    """Create a unique DID from ingested data.
-
-    Args:
-        uid: UID of device that created the cache data file
-        label: Label of the data
-        index: Index of the data
-        agent_name: Name of agent
-        hostname: Hostname
-
-    Returns:
-        did: Datapoint ID
-
-    """
-    # Initialize key variables
-    prehash = ('%s%s%s%s%s') % (uid, label, index, agent_name, hostname)
-    result = jm_general.hashstring(prehash)
-    did = result
-
-    # Return
-    return did
-
-
-def _base_type(data):
-    """Create a base_type integer value from the string sent by agents.
-
-    Args:
-        data: base_type value as string
-
-    Returns:
-        base_type: Base type value as integer
-
-    """
-    # Initialize key variables
-    if bool(data) is False:
-        value = 'NULL'
-    else:
-        value = data
-
-    # Assign base type code
-    if value == 1:
-        base_type = 1
-    elif value == 32:
-        base_type = 32
-    elif value == 64:
-        base_type = 64
-    else:
-        base_type = 0
-
-    # Return
-    return base_type
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+"""Journal of the parts of cache files committed to the database.
+
+Large cache files are committed in chunks of datapoints. Each ingest
+thread appends a line to its own journal file in the worker's "progress"
+directory after every commit:
+
+    <filename> <chunk number>
+    <filename> done
+
+The journal only covers the files the thread is currently processing.
+It is truncated whenever the thread starts on a new set of files.
+
+When the files of a dead worker are returned to the spool, the chunks
+already committed are saved in a hidden checkpoint file next to each
+cache file. Files that were completely committed are deleted. The worker
+that processes a file next skips the chunks in its checkpoint.
+
+A worker can die after the last chunk of a file is committed but before
+that is recorded in the journal. The file is then returned to the spool
+as if nothing was committed. The host / agent timestamp was updated with
+the last chunk, so the next worker recognizes the file as already
+ingested and purges it.
+
+"""
+
+# Standard libraries
+import os
+
+# Prefix of the names of journal files
+_PREFIX = '.journal-'
+
+# Marker of files whose chunks have all been committed
+_DONE = 'done'
+
+
+class Journal(object):
+    """Append-only journal of an ingest thread.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        start:
+        commit:
+        done:
+
+    """
+
+    def __init__(self, directory, name):
+        """Method initializing the class.
+
+        Args:
+            directory: Directory of the ingest worker
+            name: Name of the thread
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.path = os.path.join(directory, ('%s%s') % (_PREFIX, name))
+
+    def start(self):
+        """Start the journal of a new set of files.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Truncate
+        open(self.path, 'w').close()
+
+    def commit(self, filename, chunk):
+        """Record that a chunk of a cache file was committed.
+
+        Args:
+            filename: Name of the cache file
+            chunk: Chunk number
+
+        Returns:
+            None
+
+        """
+        # Record
+        self._append(('%s %s\n') % (filename, chunk))
+
+    def done(self, filename):
+        """Record that all chunks of a cache file were committed.
+
+        Args:
+            filename: Name of the cache file
+
+        Returns:
+            None
+
+        """
+        # Record
+        self._append(('%s %s\n') % (filename, _DONE))
+
+    def _append(self, line):
+        """Append a line to the journal.
+
+        The line is written with a single call, so a crash never leaves
+        a partial line followed by a complete one.
+
+        Args:
+            line: Line
+
+        Returns:
+            None
+
+        """
+        # Append
+        with open(self.path, 'a') as f_handle:
+            f_handle.write(line)
+
+
+def read(directory):
+    """Read the journals and checkpoints in a worker's directory.
+
+    Args:
+        directory: Directory of the ingest worker
+
+    Returns:
+        committed: Dict keyed by cache filename of sets of committed chunk
+            numbers. The set is None if the file was completely committed.
+
+    """
+    # Initialize key variables
+    committed = {}
+
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+
+        # Read checkpoints
+        if name.startswith('.') and name.endswith('.checkpoint'):
+            filename = name[1:-len('.checkpoint')]
+            chunks = load(os.path.join(directory, filename))
+            if filename in committed:
+                if committed[filename] is not None:
+                    committed[filename].update(chunks)
+            else:
+                committed[filename] = chunks
+
+        # Read journals. Ignore incomplete lines
+        elif name.startswith(_PREFIX):
+            with open(path, 'r') as f_handle:
+                lines = f_handle.read().split('\n')[:-1]
+            for line in lines:
+                (filename, chunk) = line.split(' ')
+                if chunk == _DONE:
+                    committed[filename] = None
+                    continue
+                if filename not in committed:
+                    committed[filename] = set()
+                if committed[filename] is not None:
+                    committed[filename].add(int(chunk))
+
+    # Return
+    return committed
+
+
+def checkpoint(filepath):
+    """Get the path of the checkpoint file of a cache file.
+
+    Args:
+        filepath: Path of the cache file
+
+    Returns:
+        value: Path of the checkpoint file
+
+    """
+    # Return
+    value = os.path.join(
+        os.path.dirname(filepath),
+        ('.%s.checkpoint') % (os.path.basename(filepath)))
+    return value
+
+
+def load(filepath):
+    """Get the committed chunks of a cache file from its checkpoint.
+
+    Args:
+        filepath: Path of the cache file
+
+    Returns:
+        chunks: Set of committed chunk numbers. Empty if there is no
+            checkpoint
+
+    """
+    # Initialize key variables
+    chunks = set()
+
+    # Read
+    try:
+        with open(checkpoint(filepath), 'r') as f_handle:
+            for chunk in f_handle.read().split():
+                chunks.add(int(chunk))
+    except FileNotFoundError:
+        pass
+
+    # Return
+    return chunks
+
+
+def save(filepath, chunks):
+    """Save the committed chunks of a cache file in its checkpoint.
+
+    Args:
+        filepath: Path of the cache file
+        chunks: Iterable of committed chunk numbers
+
+    Returns:
+        None
+
+    """
+    # Initialize key variables
+    path = checkpoint(filepath)
+    temp_path = ('%s.tmp') % (path)
+
+    # Write
+    with open(temp_path, 'w') as f_handle:
+        f_handle.write(' '.join([str(chunk) for chunk in sorted(chunks)]))
+    os.rename(temp_path, path)
+
+
+def remove(filepath):
+    """Delete the checkpoint of a cache file if it exists.
+
+    Args:
+        filepath: Path of the cache file
+
+    Returns:
+        None
+
+    """
+    # Delete
+    try:
+        os.remove(checkpoint(filepath))
+    except FileNotFoundError:
+        pass
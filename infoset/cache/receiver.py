@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+
+"""Asynchronous receiver of agent data.
+
+Implements the /receive/<uid> and /receive/batch/<uid> routes of the web
+server with asyncio, so that thousands of agents posting at the same time
+can be served by a single process. Requests are parsed by the event loop.
+Decoding and saving the data is done by a pool of threads, with a limit
+on the number of requests processed at a time. Data is handled exactly
+as it is by the web server.
+
+Only the HTTP/1.1 features used by agents are supported. Bodies must
+have a Content-Length header, and may be compressed with a supported
+Content-Encoding.
+
+"""
+
+# Standard libraries
+import asyncio
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Infoset libraries
+from infoset.utils import compact
+from infoset.utils import encoding
+from infoset.utils import hidden
+from infoset.utils import log
+from infoset.cache import direct
+from infoset.cache import validate
+from infoset.cache.writer import RETRY_AFTER
+
+# Paths of the routes
+_PATH_REGEX = re.compile(r'^/receive/[^/]+$')
+_BATCH_REGEX = re.compile(r'^/receive/batch/[^/]+$')
+
+# Largest accepted request body in bytes
+_MAX_BODY = 16 * 1024 * 1024
+
+# Largest accepted batch in bytes, once decompressed
+_MAX_BATCH = 256 * 1024 * 1024
+
+# Seconds to wait for the next request on an idle connection
+_IDLE_TIMEOUT = 60
+
+# Seconds to wait for the headers, and then the body, of a request
+_READ_TIMEOUT = 30
+
+# Largest accepted number of headers
+_MAX_HEADERS = 100
+
+# Seconds between updates of the PID file timestamp
+_PID_INTERVAL = 60
+
+# Maximum number of connections waiting to be accepted
+_BACKLOG = 4096
+
+# HTTP status messages
+_REASONS = {
+    100: 'Continue',
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    415: 'Unsupported Media Type',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable'}
+
+
+class Receiver(object):
+    """Serve the /receive/<uid> and /receive/batch/<uid> routes.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        handle:
+
+    """
+
+    def __init__(self, config, concurrency, threads):
+        """Method initializing the class.
+
+        Args:
+            config: Config object
+            concurrency: Maximum number of requests processed at a time
+            threads: Number of threads that decode and save data
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.config = config
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    async def handle(self, reader, writer):
+        """Serve the requests of a connection.
+
+        Args:
+            reader: asyncio.StreamReader
+            writer: asyncio.StreamWriter
+
+        Returns:
+            None
+
+        """
+        try:
+            keep_alive = True
+            while keep_alive is True:
+                keep_alive = await self._request(reader, writer)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _request(self, reader, writer):
+        """Serve a request.
+
+        Args:
+            reader: asyncio.StreamReader
+            writer: asyncio.StreamWriter
+
+        Returns:
+            keep_alive: True if the connection can be reused
+
+        """
+        # Read the request line
+        line = await asyncio.wait_for(reader.readline(), _IDLE_TIMEOUT)
+        if bool(line) is False:
+            return False
+        (method, path, version) = line.decode('latin-1').split()
+
+        # Read the headers
+        headers = await asyncio.wait_for(_headers(reader), _READ_TIMEOUT)
+
+        # Connections are persistent by default from HTTP/1.1
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close'
+        if version == 'HTTP/1.0':
+            keep_alive = connection == 'keep-alive'
+
+        # Check the request
+        status = 200
+        path = path.split('?')[0]
+        if 'transfer-encoding' in headers:
+            status = 411
+        elif int(headers.get('content-length', 0)) > _MAX_BODY:
+            status = 413
+        if status != 200:
+            await _respond(writer, status, False)
+            return False
+        if _BATCH_REGEX.match(path) is not None:
+            function = receive_batch
+        elif _PATH_REGEX.match(path) is not None:
+            function = receive
+        else:
+            status = 404
+        if status == 200 and method != 'POST':
+            status = 405
+
+        # Close the connection rather than read the body of bad requests
+        if status != 200:
+            await _respond(writer, status, False)
+            return False
+
+        # Read the body and save the data. Bodies are only buffered while
+        # the request is being processed, which limits the memory used.
+        async with self.semaphore:
+            if headers.get('expect', '').lower() == '100-continue':
+                writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            length = int(headers.get('content-length', 0))
+            body = await asyncio.wait_for(
+                reader.readexactly(length), _READ_TIMEOUT)
+            mimetype = headers.get('content-type', '').split(';')[0].strip()
+            status = await asyncio.get_event_loop().run_in_executor(
+                self.executor, function, self.config, mimetype, body,
+                headers.get('content-encoding'))
+
+        # Respond
+        await _respond(writer, status, keep_alive)
+        return keep_alive
+
+
+async def _headers(reader):
+    """Read the headers of a request.
+
+    Args:
+        reader: asyncio.StreamReader
+
+    Returns:
+        headers: Dict of header values keyed by lowercase name. A
+            ValueError is raised if there are too many headers.
+
+    """
+    # Initialize key variables
+    headers = {}
+
+    # Read
+    for _ in range(_MAX_HEADERS + 1):
+        line = await reader.readline()
+        if line in [b'\r\n', b'\n', b'']:
+            return headers
+        (name, _, value) = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    raise ValueError('Too many headers')
+
+
+async def _respond(writer, status, keep_alive):
+    """Send a response.
+
+    Args:
+        writer: asyncio.StreamWriter
+        status: HTTP status code
+        keep_alive: Keep the connection open if True
+
+    Returns:
+        None
+
+    """
+    # Initialize key variables
+    if status == 200:
+        body = b'Received'
+    else:
+        body = _REASONS[status].encode()
+    lines = [
+        ('HTTP/1.1 %s %s') % (status, _REASONS[status]),
+        'Content-Type: text/html; charset=utf-8',
+        ('Content-Length: %s') % (len(body))]
+    if status == 503:
+        lines.append(('Retry-After: %s') % (RETRY_AFTER))
+    if keep_alive is False:
+        lines.append('Connection: close')
+
+    # Send
+    header = ('%s\r\n\r\n') % ('\r\n'.join(lines))
+    writer.write(header.encode() + body)
+    await writer.drain()
+
+
+def receive(config, mimetype, body, content_encoding=None):
+    """Ingest the body of a request, or save it for the ingest daemon.
+
+    Args:
+        config: Config object
+        mimetype: MIME type of the body
+        body: Body as bytes
+        content_encoding: Content-Encoding of the body
+
+    Returns:
+        status: HTTP status code
+
+    """
+    # Initialize key variables
+    status = 200
+    payload = None
+    if encoding.supported(content_encoding) is False:
+        return 415
+
+    # Get data. Compact data is saved as is
+    try:
+        body = encoding.decompress(body, content_encoding)
+        if mimetype == compact.CONTENT_TYPE:
+            payload = body
+            data = compact.decode(payload)
+        elif mimetype == 'application/json':
+            data = json.loads(body.decode())
+        else:
+            return 415
+    except (ValueError, UnicodeDecodeError):
+        return 400
+
+    # Reject invalid data now rather than when it is ingested
+    if validate.check(data) is False:
+        return 400
+
+    # Ingest the data. Ask the agent to try again later if the server is
+    # busy
+    try:
+        if direct.receive(config, data, payload=payload) is False:
+            status = 503
+    except OSError as exception_error:
+        log_message = (
+            'Could not save received data. Error: %s') % (exception_error)
+        log.log2warn(1122, log_message)
+        status = 500
+
+    # Return
+    return status
+
+
+def receive_batch(config, mimetype, body, content_encoding=None):
+    """Ingest a batch of agent data of many hosts.
+
+    The batch is a JSON list of agent data. Nothing is saved if any of
+    it is invalid.
+
+    Args:
+        config: Config object
+        mimetype: MIME type of the body
+        body: Body as bytes
+        content_encoding: Content-Encoding of the body
+
+    Returns:
+        status: HTTP status code
+
+    """
+    # Initialize key variables
+    status = 200
+    if mimetype != 'application/json':
+        return 415
+    if encoding.supported(content_encoding) is False:
+        return 415
+
+    # Get data
+    try:
+        body = encoding.decompress(body, content_encoding, limit=_MAX_BATCH)
+        batch = json.loads(body.decode())
+    except (ValueError, UnicodeDecodeError):
+        return 400
+    if isinstance(batch, list) is False:
+        return 400
+    for data in batch:
+        if validate.check(data) is False:
+            return 400
+
+    # Ingest the data of each host. The agent sends the whole batch again
+    # if any of it is refused. Data of hosts that was already ingested is
+    # then ignored
+    try:
+        if direct.receive_batch(config, batch) is False:
+            status = 503
+    except OSError as exception_error:
+        log_message = (
+            'Could not save received data. Error: %s') % (exception_error)
+        log.log2warn(1122, log_message)
+        status = 500
+
+    # Return
+    return status
+
+
+def serve(config, port, agent_name):
+    """Receive agent data until the process is stopped.
+
+    Args:
+        config: Config object
+        port: TCP port
+        agent_name: Name of the daemon, used for its PID file
+
+    Returns:
+        None
+
+    """
+    # Initialize key variables
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    receiver = Receiver(
+        config, config.receiver_concurrency(), config.receiver_threads())
+
+    # Start the server
+    server = loop.run_until_complete(asyncio.start_server(
+        receiver.handle, host='0.0.0.0', port=port, backlog=_BACKLOG))
+    loop.create_task(_touch(agent_name))
+
+    # Serve
+    try:
+        loop.run_forever()
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+
+
+async def _touch(agent_name):
+    """Periodically update the PID file timestamp of the daemon.
+
+    Args:
+        agent_name: Name of the daemon
+
+    Returns:
+        None
+
+    """
+    # Update
+    while True:
+        update = hidden.Touch()
+        update.pid(agent_name)
+        await asyncio.sleep(_PID_INTERVAL)
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+
+"""In-memory registry of database metadata used by the ingest daemon.
+
+Keeps the datapoint, agent and host index values needed to ingest cache
+files so that the database doesn't have to be queried for every file.
+
+"""
+
+# Standard libraries
+import threading
+import hashlib
+import time
+
+# Infoset libraries
+from infoset.db import db_agent as agent
+from infoset.db import db_datapoint as dpoint
+from infoset.db import db_host as dhost
+from infoset.db import db_hostagent as hagent
+from infoset.utils import jm_configuration
+from infoset.utils import log
+
+
+class Registry(object):
+    """Thread-safe registry of ingest metadata.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        refresh:
+        datapoint:
+        add_datapoint:
+        mapping:
+        update_timestamps:
+        agent:
+        host:
+        host_agent_exists:
+        add_host_agent:
+        unprocessed:
+        update_host_agent:
+        uncharted:
+        update_uncharted:
+
+    """
+
+    def __init__(self):
+        """Method initializing the class.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.lock = threading.RLock()
+
+        # DID keyed dict of (idx, idx_agent, last_timestamp, enabled) tuples
+        self.datapoints = {}
+
+        # DID keyed dict of digests of uncharted_value values
+        self.digests = {}
+
+        # UID keyed dict of (idx_agent, enabled) tuples
+        self.agents = {}
+
+        # Hostname keyed dict of idx_host values
+        self.hosts = {}
+
+        # Set of (idx_host, idx_agent) tuples
+        self.host_agents = set()
+
+        # (hostname, uid) keyed dict of the timestamps of the most
+        # recently ingested data
+        self.host_agent_timestamps = {}
+
+        # Largest Datapoint.ts_modified value read from the database
+        self.watermark = None
+        self.refreshed = 0
+
+    def refresh(self, force=False):
+        """Refresh the registry from the database.
+
+        The first call loads all datapoints. Later calls only read the
+        datapoints whose ts_modified value has changed since the last
+        refresh. Ingests that only update last_timestamp don't change
+        ts_modified. Refreshes are done at most every
+        "ingest_registry_refresh" seconds unless forced.
+
+        Args:
+            force: Refresh regardless of the time of the last refresh
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        config = jm_configuration.Config()
+        interval = config.ingest_registry_refresh()
+        now = time.time()
+
+        # Return if it isn't time to refresh
+        if force is False and self.watermark is not None:
+            if now - self.refreshed < interval:
+                return
+
+        # Get datapoints and host / agent timestamps from the database
+        rows = dpoint.datapoints_modified(self.watermark)
+        host_agent_rows = hagent.host_agent_timestamps()
+
+        with self.lock:
+            for (did, idx, idx_agent, last_timestamp,
+                 enabled, ts_modified, uncharted_value) in rows:
+                # Don't go backwards if the database row was read
+                # before a more recent ingest updated the registry
+                current = True
+                if did in self.datapoints:
+                    if last_timestamp < self.datapoints[did][2]:
+                        last_timestamp = self.datapoints[did][2]
+                        current = False
+                self.datapoints[did] = (
+                    idx, idx_agent, last_timestamp, enabled)
+                if current is True and uncharted_value is not None:
+                    self.digests[did] = digest(uncharted_value)
+
+                # Track the most recent modification time
+                if ts_modified is not None:
+                    if self.watermark is None or ts_modified > self.watermark:
+                        self.watermark = ts_modified
+
+            # Update host / agent timestamps
+            for (hostname, uid, last_timestamp) in host_agent_rows:
+                self._update_host_agent(hostname, uid, last_timestamp)
+
+            # Agents can be enabled / disabled. Reread them when needed
+            self.agents = {}
+            self.refreshed = now
+
+        # Log
+        log_message = (
+            'Ingest registry refreshed with %s datapoints. '
+            'Tracking %s datapoints.') % (len(rows), len(self.datapoints))
+        log.log2quiet(1110, log_message)
+
+    def datapoint(self, did):
+        """Get the registry entry for a datapoint.
+
+        Args:
+            did: Datapoint ID
+
+        Returns:
+            value: Tuple of (idx, idx_agent, last_timestamp, enabled)
+                None if not found
+
+        """
+        # Return
+        with self.lock:
+            value = self.datapoints.get(did)
+        return value
+
+    def add_datapoint(self, did, idx, idx_agent, last_timestamp=0,
+                      enabled=True):
+        """Add a newly inserted datapoint to the registry.
+
+        Args:
+            did: Datapoint ID
+            idx: Datapoint index
+            idx_agent: Agent index
+            last_timestamp: The last time the datapoint was updated
+            enabled: True if the datapoint is enabled
+
+        Returns:
+            None
+
+        """
+        # Update
+        with self.lock:
+            self.datapoints[did] = (idx, idx_agent, last_timestamp, enabled)
+
+    def mapping(self, dids):
+        """Create dict of enabled datapoints and their corresponding indices.
+
+        Args:
+            dids: List of DIDs to include
+
+        Returns:
+            data: Dict keyed by datapoint ID,
+                with a tuple as its value (idx, idx_agent, last_timestamp)
+                idx: Datapoint index
+                idx_agent: Agent index
+                last_timestamp: The last time the timestamp was updated
+
+        """
+        # Initialize key variables
+        data = {}
+
+        # Create the mapping
+        with self.lock:
+            for did in dids:
+                value = self.datapoints.get(did)
+                if value is None:
+                    continue
+                (idx, idx_agent, last_timestamp, enabled) = value
+                if enabled is True:
+                    data[did] = (idx, idx_agent, last_timestamp)
+
+        # Return
+        return data
+
+    def update_timestamps(self, timestamps):
+        """Update datapoint last_timestamp values after a commit.
+
+        Args:
+            timestamps: Dict of last_timestamp values keyed by DID
+
+        Returns:
+            None
+
+        """
+        # Update
+        with self.lock:
+            for did, timestamp in timestamps.items():
+                if did not in self.datapoints:
+                    continue
+                (idx, idx_agent, last_timestamp,
+                 enabled) = self.datapoints[did]
+                self.datapoints[did] = (
+                    idx, idx_agent, max(timestamp, last_timestamp), enabled)
+
+    def uncharted(self, did):
+        """Get the digest of the uncharted_value of a datapoint.
+
+        Args:
+            did: Datapoint ID
+
+        Returns:
+            value: Digest. None if not known
+
+        """
+        # Return
+        with self.lock:
+            value = self.digests.get(did)
+        return value
+
+    def update_uncharted(self, digests):
+        """Update uncharted_value digests after a commit.
+
+        Args:
+            digests: Dict of digests keyed by DID
+
+        Returns:
+            None
+
+        """
+        # Update
+        with self.lock:
+            self.digests.update(digests)
+
+    def agent(self, uid):
+        """Get agent information.
+
+        Args:
+            uid: UID of agent
+
+        Returns:
+            value: Tuple of (idx_agent, enabled). None if not found
+
+        """
+        # Get cached value
+        with self.lock:
+            value = self.agents.get(uid)
+
+        # Read from the database if necessary
+        if value is None:
+            if agent.uid_exists(uid) is True:
+                agent_object = agent.GetUID(uid)
+                value = (agent_object.idx(), agent_object.enabled())
+                with self.lock:
+                    self.agents[uid] = value
+
+        # Return
+        return value
+
+    def host(self, hostname):
+        """Get the host index.
+
+        Args:
+            hostname: Hostname
+
+        Returns:
+            value: idx_host value. None if not found
+
+        """
+        # Get cached value
+        with self.lock:
+            value = self.hosts.get(hostname)
+
+        # Read from the database if necessary
+        if value is None:
+            if dhost.hostname_exists(hostname) is True:
+                value = dhost.GetHost(hostname).idx()
+                with self.lock:
+                    self.hosts[hostname] = value
+
+        # Return
+        return value
+
+    def host_agent_exists(self, idx_host, idx_agent):
+        """Determine whether a host / agent entry exists.
+
+        Args:
+            idx_host: Host idx
+            idx_agent: Agent idx
+
+        Returns:
+            found: True if found
+
+        """
+        # Get cached value
+        key = (idx_host, idx_agent)
+        with self.lock:
+            found = key in self.host_agents
+
+        # Read from the database if necessary
+        if found is False:
+            found = hagent.host_agent_exists(idx_host, idx_agent)
+            if found is True:
+                self.add_host_agent(idx_host, idx_agent)
+
+        # Return
+        return found
+
+    def add_host_agent(self, idx_host, idx_agent):
+        """Add a host / agent entry to the registry.
+
+        Args:
+            idx_host: Host idx
+            idx_agent: Agent idx
+
+        Returns:
+            None
+
+        """
+        # Update
+        with self.lock:
+            self.host_agents.add((idx_host, idx_agent))
+
+    def unprocessed(self, uid, hostname, timestamp):
+        """Determine whether data is newer than that already ingested.
+
+        Args:
+            uid: UID of agent
+            hostname: Hostname the data was collected for
+            timestamp: Timestamp of the data
+
+        Returns:
+            valid: True if the data hasn't been processed before
+
+        """
+        # Return
+        with self.lock:
+            last_timestamp = self.host_agent_timestamps.get(
+                (hostname, uid), 0)
+        valid = timestamp > last_timestamp
+        return valid
+
+    def update_host_agent(self, hostname, uid, timestamp):
+        """Update the timestamp of a host / agent after a commit.
+
+        Args:
+            hostname: Hostname the data was collected for
+            uid: UID of agent
+            timestamp: Timestamp of the data
+
+        Returns:
+            None
+
+        """
+        # Update
+        with self.lock:
+            self._update_host_agent(hostname, uid, timestamp)
+
+    def _update_host_agent(self, hostname, uid, timestamp):
+        """Update the timestamp of a host / agent. The lock must be held.
+
+        Args:
+            hostname: Hostname the data was collected for
+            uid: UID of agent
+            timestamp: Timestamp of the data
+
+        Returns:
+            None
+
+        """
+        # Never go backwards
+        key = (hostname, uid)
+        if key in self.host_agent_timestamps:
+            timestamp = max(timestamp, self.host_agent_timestamps[key])
+        self.host_agent_timestamps[key] = timestamp
+
+
+def digest(value):
+    """Create a digest of an uncharted_value value.
+
+    Args:
+        value: Value as stored in the database
+
+    Returns:
+        result: Digest
+
+    """
+    # Values read from the database are bytes
+    if isinstance(value, bytes) is False:
+        value = str(value).encode()
+
+    # Return
+    result = hashlib.sha1(value).digest()
+    return result
+
+
+# Registry shared by all ingest threads for the life of the daemon
+REGISTRY = Registry()
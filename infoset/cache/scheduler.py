@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+"""Scheduler of the cache files processed by ingest threads.
+
+Cache files are grouped by key, the (hosthash, uid) pair in their name.
+Files of a key are always processed in timestamp order by a single
+thread. Older data is rejected once newer data for a host / agent has
+been ingested.
+
+Keys whose oldest file is recent are processed first, so dashboards stay
+current. Keys with a backlog are processed in the background, a slice of
+files at a time, in round-robin order.
+
+"""
+
+# Standard libraries
+import os
+import time
+import bisect
+import threading
+from collections import deque
+
+# Infoset libraries
+from infoset.utils import spool
+
+# Keys whose oldest file is at most this many seconds old are fresh
+_FRESH_AGE = 900
+
+# Maximum number of files of a backlogged key processed at a time
+_SLICE = 20
+
+
+class Scheduler(object):
+    """Thread-safe scheduler of cache files.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        add:
+        next:
+        done:
+        idle:
+        status:
+
+    """
+
+    def __init__(self):
+        """Method initializing the class.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.condition = threading.Condition()
+
+        # Key keyed dict of sorted lists of (timestamp, filepath) tuples
+        self.pending = {}
+
+        # Filepaths pending or in progress. Files are only queued once
+        self.queued = set()
+
+        # Keys being processed and the number of their files in progress
+        self.busy = {}
+
+        # Keys with pending files that aren't being processed
+        self.rotation = deque()
+
+    def add(self, filepaths):
+        """Add cache files to the scheduler.
+
+        Args:
+            filepaths: Iterable of cache filepaths
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        entries = []
+
+        # Get keys from the filenames
+        for filepath in filepaths:
+            filename = os.path.basename(filepath)
+            if bool(spool.FILENAME_REGEX.match(filename)) is False:
+                continue
+            name = filename.split('.')[0]
+            (tstamp, uid, hosthash) = name.split('_')
+            entries.append(((hosthash, uid), int(tstamp), filepath))
+
+        with self.condition:
+            # Queue files
+            for (key, timestamp, filepath) in entries:
+                if filepath in self.queued:
+                    continue
+                self.queued.add(filepath)
+                if key not in self.pending:
+                    self.pending[key] = []
+                    if key not in self.busy:
+                        self.rotation.append(key)
+                bisect.insort(self.pending[key], (timestamp, filepath))
+
+            # Wake up threads
+            self.condition.notify_all()
+
+    def next(self):
+        """Get the next files to process. Blocks until there are some.
+
+        Args:
+            None
+
+        Returns:
+            value: Tuple of (key, metadata)
+                key: (hosthash, uid) tuple
+                metadata: List of (timestamp, filepath) tuples, oldest first
+
+        """
+        with self.condition:
+            # Wait for work
+            while bool(self.rotation) is False:
+                self.condition.wait()
+
+            # Fresh keys first, otherwise the next key in the rotation
+            fresh = time.time() - _FRESH_AGE
+            key = None
+            for candidate in self.rotation:
+                if self.pending[candidate][0][0] >= fresh:
+                    key = candidate
+                    break
+            if key is None:
+                key = self.rotation[0]
+            self.rotation.remove(key)
+
+            # Take a slice of the key's files
+            metadata = self.pending[key][:_SLICE]
+            del self.pending[key][:_SLICE]
+            if bool(self.pending[key]) is False:
+                del self.pending[key]
+            self.busy[key] = len(metadata)
+
+        # Return
+        value = (key, metadata)
+        return value
+
+    def done(self, key, metadata):
+        """Report that files returned by next() have been processed.
+
+        Args:
+            key: Key returned by next()
+            metadata: Metadata returned by next()
+
+        Returns:
+            None
+
+        """
+        with self.condition:
+            # Forget the files
+            for (_, filepath) in metadata:
+                self.queued.discard(filepath)
+            del self.busy[key]
+
+            # Put the key back in the rotation if it has more files
+            if key in self.pending:
+                self.rotation.append(key)
+                self.condition.notify()
+
+    def idle(self):
+        """Determine whether there are no files to process.
+
+        Args:
+            None
+
+        Returns:
+            value: True if idle
+
+        """
+        # Return
+        with self.condition:
+            value = self._idle()
+        return value
+
+    def _idle(self):
+        """Determine whether there are no files to process. Lock held.
+
+        Args:
+            None
+
+        Returns:
+            value: True if idle
+
+        """
+        # Return
+        value = bool(self.queued) is False
+        return value
+
+    def status(self):
+        """Get the state of the queue.
+
+        Args:
+            None
+
+        Returns:
+            data: Dict of
+                pending: Number of files waiting to be processed
+                in_progress: Number of files being processed
+                keys: Number of host / agent keys with files
+                backlogged: Number of keys whose oldest file isn't fresh
+                oldest_age: Age in seconds of the oldest pending file's
+                    data. None if there are no pending files
+
+        """
+        # Initialize key variables
+        now = time.time()
+        pending = 0
+        backlogged = 0
+        oldest = None
+
+        with self.condition:
+            for metadata in self.pending.values():
+                pending += len(metadata)
+                timestamp = metadata[0][0]
+                if timestamp < now - _FRESH_AGE:
+                    backlogged += 1
+                if oldest is None or timestamp < oldest:
+                    oldest = timestamp
+            data = {
+                'pending': pending,
+                'in_progress': sum(self.busy.values()),
+                'keys': len(set(self.pending.keys()) | set(self.busy.keys())),
+                'backlogged': backlogged,
+                'oldest_age': None}
+        if oldest is not None:
+            data['oldest_age'] = int(now - oldest)
+
+        # Return
+        return data
@@ -10,13 +10,22 @@ This could be a modified to be a daemon
 import os
 import re
 import json
+import random
+from collections import defaultdict
 
 # Infoset libraries
 from infoset.utils import log
 from infoset.utils import jm_general
-from infoset.db import db_hostagent
-from infoset.db import db_agent
-from infoset.db import db_host
+from infoset.utils import spool
+from infoset.utils import compact
+from infoset.cache import registry
+
+# Fraction of the DIDs precomputed by agents that are verified. The first
+# precomputed DID of each file is always verified.
+_DID_SAMPLE_RATE = 0.01
+
+# UIDs are used in cache filenames
+_UID_REGEX = re.compile(r'^[0-9a-f]+$')
 
 
 class ValidateCache(object):
@@ -34,12 +43,14 @@ class ValidateCache(object):
         post:
     """
 
-    def __init__(self, filepath=None, data=None):
+    def __init__(self, filepath=None, data=None, validated=False):
         """Method initializing the class.
 
         Args:
             filepath: Cache filename
             data: Data dict expected to be in a cache file (Agent or server)
+            validated: True if the data was validated when it was received.
+                Cache files of such data are recognized by their filename.
 
         Returns:
             None
@@ -50,19 +61,31 @@ class ValidateCache(object):
         self.information = {}
         self.filename = None
         self.filepath = filepath
+        self.prevalidated = validated
 
-        # Filenames must start with a numeric timestamp and #
-        # end with a hex string. This will be tested later
-        regex = re.compile(r'^\d+_[0-9a-f]+_[0-9a-f]+.json')
+        # Decoded data created while validating
+        self.agent_meta = {}
+        self.data = defaultdict(dict)
+        self.metadata = []
 
         if filepath is not None:
             # Try reading file if filename format is OK
             self.filename = os.path.basename(filepath)
-            if bool(regex.match(self.filename)) is True:
+            if spool.validated(self.filename) is True:
+                self.prevalidated = True
+            if bool(spool.FILENAME_REGEX.match(self.filename)) is True:
                 # Ingest data
                 try:
-                    with open(filepath, 'r') as f_handle:
-                        self.information = json.load(f_handle)
+                    if self.filename.endswith(compact.EXTENSION) is True:
+                        with open(filepath, 'rb') as f_handle:
+                            self.information = compact.decode(
+                                f_handle.read())
+                    else:
+                        with open(filepath, 'r') as f_handle:
+                            self.information = json.load(f_handle)
+                    if isinstance(self.information, dict) is False:
+                        self.information = {}
+                        self.validated = False
                 except:
                     self.information = {}
                     self.validated = False
@@ -74,11 +97,11 @@ class ValidateCache(object):
             else:
                 self.validated = False
 
-    def getinfo(self):
+    def getinfo(self, duplicates=True):
         """Provide validated information when valid.
 
         Args:
-            None
+            duplicates: Check the database for duplicate data if True
 
         Returns:
             data: Data
@@ -88,30 +111,56 @@ class ValidateCache(object):
         data = False
 
         # Return
-        if self.valid() is True:
+        if self.valid(duplicates=duplicates) is True:
             data = self.information
         return data
 
-    def valid(self):
-        """Master method that defines whether data is OK.
+    def decoded(self):
+        """Provide the data decoded while validating.
 
         Args:
             None
 
+        Returns:
+            value: Tuple of (agent_meta, data, metadata)
+                agent_meta: Dict of timestamp, uid, agent and hostname
+                data: Dict of lists of (uid, did, value, timestamp) tuples
+                    keyed by data type and base type
+                metadata: List of
+                    (uid, did, label, source, description, base_type) tuples
+
+        """
+        # Return
+        value = (self.agent_meta, self.data, self.metadata)
+        return value
+
+    def valid(self, duplicates=True):
+        """Master method that defines whether data is OK.
+
+        The data is decoded in the same pass that checks its structure.
+        Tests stop at the first failure.
+
+        Args:
+            duplicates: Check for data older than that already ingested
+                if True
+
         Returns:
             all_ok:
 
         """
         # Initialize key variables
-        validity = [self.validated]
+        all_ok = self.validated
 
-        # Append results of tests
-        validity.append(self._check_meta())
-        validity.append(self._check_data_types())
-        validity.append(self._check_duplicates())
+        # Do tests
+        if all_ok is True:
+            all_ok = self._check_meta()
+        if all_ok is True:
+            all_ok = self._decode()
+        if all_ok is True and duplicates is True:
+            all_ok = self._check_duplicates()
 
         # Do final check
-        if False in validity:
+        if all_ok is False:
             all_ok = False
             # Error message
             if self.filepath is not None:
@@ -122,8 +171,6 @@ class ValidateCache(object):
             else:
                 log_message = ('Cache data is invalid')
                 log.log2warn(1059, log_message)
-        else:
-            all_ok = True
 
         # Return
         return all_ok
@@ -157,7 +204,7 @@ class ValidateCache(object):
 
             # Parse filename for information
             if self.filename is not None:
-                (name, _) = self.filename.split('.')
+                name = self.filename.split('.')[0]
                 (tstamp, uid, _) = name.split('_')
                 timestamp = int(tstamp)
 
@@ -172,11 +219,32 @@ class ValidateCache(object):
                     valid = False
                 if jm_general.validate_timestamp(timestamp) is False:
                     valid = False
+
+            # Received data is spooled in files named after its UID and
+            # timestamp, which ingest trusts
+            else:
+                timestamp = self.information['timestamp']
+                if isinstance(timestamp, int) is False:
+                    valid = False
+                elif jm_general.validate_timestamp(timestamp) is False:
+                    valid = False
+                if isinstance(self.information['uid'], str) is False:
+                    valid = False
+                elif bool(_UID_REGEX.match(
+                        self.information['uid'])) is False:
+                    valid = False
+                for key in ['agent', 'hostname']:
+                    if isinstance(self.information[key], str) is False:
+                        valid = False
+
         # Return
         return valid
 
-    def _check_data_types(self):
-        """Method initializing the class.
+    def _decode(self):
+        """Check the structure of the data and decode it in a single pass.
+
+        Checks that don't affect decoding are skipped if the data was
+        validated when it was received.
 
         Args:
             None
@@ -186,48 +254,107 @@ class ValidateCache(object):
 
         """
         # Initialize key variables
-        valid = True
         data_types = ['chartable', 'other']
+        data = defaultdict(dict)
+        metadata = []
+        agent_meta = {
+            'timestamp': int(self.information['timestamp']),
+            'uid': self.information['uid'],
+            'agent': self.information['agent'],
+            'hostname': self.information['hostname']}
+        timestamp = agent_meta['timestamp']
+        uid = agent_meta['uid']
+        verify = True
+        check = self.prevalidated is False
 
         # Process chartable data
         for data_type in data_types:
             # Skip if data type isn't in the data
             if data_type not in self.information:
                 continue
+            chartable = data_type == 'chartable'
 
             # Process the data type
-            for _, group in sorted(
-                    self.information[data_type].items()):
+            try:
+                groups = sorted(self.information[data_type].items())
+            except:
+                return False
+            for label, group in groups:
                 # Process keys
-                for key in ['base_type', 'description', 'data']:
-                    if key not in group:
-                        valid = False
+                try:
+                    base_type = group['base_type']
+                    description = group['description']
+                    datapoints = group['data']
+                except:
+                    return False
 
                 # Make sure the base types are numeric
-                if 'base_type' in group and data_type == 'chartable':
+                if chartable is True and check is True:
                     try:
-                        float(group['base_type'])
+                        float(base_type)
                     except:
-                        valid = False
+                        return False
+                base_type = _base_type(base_type)
+                rows = data[data_type].setdefault(base_type, [])
 
-                # Process data
-                for datapoint in group['data']:
-                    if len(datapoint) != 3:
-                        valid = False
+                # Process data. Agents can append a precomputed DID
+                for datapoint in datapoints:
+                    try:
+                        if len(datapoint) == 4:
+                            (index, value, source, did) = datapoint
+                            if isinstance(did, str) is False:
+                                return False
+                        else:
+                            (index, value, source) = datapoint
+                            did = None
+                    except:
+                        return False
 
                     # Check to make sure value is numeric
-                    if data_type == 'chartable':
-                        value = datapoint[1]
+                    if chartable is True and check is True:
                         try:
-                            float(value)
+                            value = float(value)
                         except:
-                            valid = False
+                            return False
+
+                    # Create the DID if the agent didn't send it.
+                    # Otherwise verify a sample of the DIDs sent
+                    if did is None:
+                        did = jm_general.did(
+                            uid, label, index,
+                            agent_meta['agent'], agent_meta['hostname'])
+                    elif check is True and (
+                            verify is True or
+                            random.random() < _DID_SAMPLE_RATE):
+                        verify = False
+                        if did != jm_general.did(
+                                uid, label, index,
+                                agent_meta['agent'], agent_meta['hostname']):
+                            log_message = (
+                                'Precomputed DID for label %s index %s from '
+                                'agent UID %s is incorrect.'
+                                '') % (label, index, uid)
+                            log.log2warn(1115, log_message)
+                            return False
+
+                    # Update data and sources
+                    rows.append((uid, did, value, timestamp))
+                    metadata.append(
+                        (uid, did, label, source, description, base_type))
+
+        # Save the decoded data
+        self.agent_meta = agent_meta
+        self.data = data
+        self.metadata = metadata
 
         # Return
-        return valid
+        return True
 
     def _check_duplicates(self):
-        """Method initializing the class.
+        """Check whether the data is older than that already ingested.
+
+        Uses the host / agent timestamps kept in memory by the ingest
+        daemon instead of querying the database.
 
         Args:
             None
@@ -236,32 +363,54 @@ class ValidateCache(object):
             valid: True if valid
 
         """
-        # Initialize key variables
-        valid = True
+        # Return
+        valid = registry.REGISTRY.unprocessed(
+            self.agent_meta['uid'], self.agent_meta['hostname'],
+            self.agent_meta['timestamp'])
+        return valid
 
-        # Get values
-        timestamp = int(self.information['timestamp'])
-        uid = self.information['uid']
-        hostname = self.information['hostname']
 
-        # Check if there is a duplicate entry for this UID
-        if db_agent.uid_exists(uid) is not False:
-            idx_agent = db_agent.GetUID(uid).idx()
+def check(data):
+    """Check the structure of agent data when it is received.
 
-            # Check if host exists
-            if db_host.hostname_exists(hostname) is True:
-                idx_host = db_host.GetHost(hostname).idx()
+    Args:
+        data: Agent data
 
-                # Check for host / agent entry existence
-                if db_hostagent.host_agent_exists(
-                        idx_host, idx_agent) is True:
-                    # Check if this host / agent has been updated before
-                    last_timesamp = db_hostagent.GetHostAgent(
-                        idx_host, idx_agent).last_timestamp()
+    Returns:
+        valid: True if valid
 
-                    # Validate
-                    if timestamp <= last_timesamp:
-                        valid = False
+    """
+    # Return
+    validator = ValidateCache(data=data)
+    valid = validator.valid(duplicates=False)
+    return valid
 
-        # Return
-        return valid
+
+def _base_type(data):
+    """Create a base_type integer value from the string sent by agents.
+
+    Args:
+        data: base_type value as string
+
+    Returns:
+        base_type: Base type value as integer
+
+    """
+    # Initialize key variables
+    if bool(data) is False:
+        value = 'NULL'
+    else:
+        value = data
+
+    # Assign base type code
+    if value == 1:
+        base_type = 1
+    elif value == 32:
+        base_type = 32
+    elif value == 64:
+        base_type = 64
+    else:
+        base_type = 0
+
+    # Return
+    return base_type
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+"""Watch the ingest cache directory for new cache files.
+
+Uses the Linux inotify API through ctypes. Callers fall back to polling
+the directory when inotify isn't available.
+
+"""
+
+# Standard libraries
+import os
+import select
+import struct
+import time
+import ctypes
+import ctypes.util
+
+# Infoset libraries
+from infoset.utils import log
+from infoset.utils import spool
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Size of the fixed part of a struct inotify_event
+_EVENT_FORMAT = 'iIII'
+_EVENT_SIZE = struct.calcsize(_EVENT_FORMAT)
+
+
+class Watcher(object):
+    """Report cache files as soon as they appear in a directory.
+
+    Files are reported when they are renamed into the directory or
+    closed after writing. Shard sub-directories are watched too.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        enabled:
+        wait:
+        close:
+
+    """
+
+    def __init__(self, directory):
+        """Method initializing the class.
+
+        Args:
+            directory: Directory to watch
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.directory = directory
+        self.fd = None
+        self.libc = None
+
+        # Directories keyed by inotify watch descriptor
+        self.watches = {}
+
+        # Setup inotify
+        libc = _libc()
+        if libc is None:
+            log_message = (
+                'inotify is not available. Polling directory %s for '
+                'cache files instead.') % (directory)
+            log.log2quiet(1111, log_message)
+            return
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            log_message = (
+                'Could not initialize inotify. Polling directory %s for '
+                'cache files instead.') % (directory)
+            log.log2warn(1112, log_message)
+            return
+
+        # Watch the directory and its shards
+        self.fd = fd
+        self.libc = libc
+        for path in spool.shards(directory):
+            if self._watch(path) is False:
+                self.close()
+                log_message = (
+                    'Could not watch directory %s with inotify. Polling it '
+                    'for cache files instead.') % (path)
+                log.log2warn(1113, log_message)
+                return
+
+    def enabled(self):
+        """Determine whether inotify is being used.
+
+        Args:
+            None
+
+        Returns:
+            value: True if enabled
+
+        """
+        # Return
+        value = self.fd is not None
+        return value
+
+    def wait(self, timeout):
+        """Wait for new cache files.
+
+        Args:
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            filepaths: List of new cache filepaths. None if the directory
+                needs to be rescanned because events were lost.
+
+        """
+        # Initialize key variables
+        filepaths = []
+        deadline = time.time() + timeout
+
+        # Wait until there are cache files or the timeout expires.
+        # Temporary files also generate events that are ignored.
+        while filepaths == []:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            (readable, _, _) = select.select([self.fd], [], [], remaining)
+            if bool(readable) is False:
+                break
+            filepaths = self._read()
+
+        # Return
+        return filepaths
+
+    def _read(self):
+        """Read all queued inotify events.
+
+        Args:
+            None
+
+        Returns:
+            filepaths: List of new cache filepaths. None if events were lost.
+
+        """
+        # Initialize key variables
+        filepaths = []
+
+        # Read all queued events
+        while True:
+            try:
+                buffer = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+
+            # Parse events
+            offset = 0
+            while offset + _EVENT_SIZE <= len(buffer):
+                (wd, mask, _, length) = struct.unpack_from(
+                    _EVENT_FORMAT, buffer, offset)
+                offset += _EVENT_SIZE
+                name = buffer[offset:offset + length].rstrip(b'\0').decode()
+                offset += length
+
+                # The kernel event queue overflowed
+                if mask & IN_Q_OVERFLOW:
+                    filepaths = None
+                    continue
+                if wd not in self.watches or filepaths is None:
+                    continue
+                path = self.watches[wd]
+
+                # Watch new shard directories. Files may have been added
+                # before the watch was created
+                if mask & IN_ISDIR:
+                    if path == self.directory and bool(
+                            spool.SHARD_REGEX.match(name)) is True:
+                        shard = os.path.join(path, name)
+                        self._watch(shard)
+                        filepaths.extend(spool.files_in(shard))
+                    continue
+
+                # Only report cache files
+                if bool(spool.FILENAME_REGEX.match(name)) is True:
+                    filepaths.append(os.path.join(path, name))
+
+        # Return
+        return filepaths
+
+    def _watch(self, path):
+        """Add an inotify watch for a directory.
+
+        Args:
+            path: Directory to watch
+
+        Returns:
+            success: True if successful
+
+        """
+        # Initialize key variables
+        success = False
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO
+        if path == self.directory:
+            mask = mask | IN_CREATE
+
+        # Add watch
+        wd = self.libc.inotify_add_watch(self.fd, path.encode(), mask)
+        if wd >= 0:
+            self.watches[wd] = path
+            success = True
+
+        # Return
+        return success
+
+    def close(self):
+        """Stop watching.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Close
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.watches = {}
+
+
+def _libc():
+    """Get the C library if it supports inotify.
+
+    Args:
+        None
+
+    Returns:
+        libc: ctypes CDLL object. None if inotify isn't supported
+
+    """
+    # Initialize key variables
+    libc = None
+
+    # Get library
+    try:
+        name = ctypes.util.find_library('c')
+        candidate = ctypes.CDLL(name, use_errno=True)
+        candidate.inotify_init1.argtypes = [ctypes.c_int]
+        candidate.inotify_add_watch.argtypes = [
+            ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc = candidate
+    except:
+        libc = None
+
+    # Return
+    return libc
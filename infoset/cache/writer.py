@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+
+"""Group commit of received data to the ingest cache directory.
+
+Data received by the web server that can't be ingested right away is
+handed to a writer thread rather than saved by the request thread. The
+data must have been checked with validate.check. The thread collects data
+for up to ingest_spool_interval seconds, then:
+
+    1) Writes each item to a hidden temporary file
+    2) Flushes all the temporary files to disk
+    3) Renames them, so the ingest daemon only sees complete files
+    4) Flushes the directories of the renamed files
+
+Data is refused when the queue of the thread is full. Web servers answer
+with HTTP 503 and a Retry-After header so that agents try again later.
+
+Data queued by request handlers is acknowledged right away, so up to
+ingest_spool_interval seconds of data can be lost if the web server
+stops. Callers that pass a receipt are told when the data is on disk.
+
+"""
+
+# Standard libraries
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+# Infoset libraries
+from infoset.utils import compact
+from infoset.utils import log
+from infoset.utils import spool
+from infoset.utils.log import LogThread
+
+# Writer of the web server. Created on first use
+WRITER = None
+_LOCK = threading.Lock()
+
+# Seconds agents are asked to wait when data is refused
+RETRY_AFTER = 30
+
+
+class Writer(object):
+    """Queue received data for the writer thread.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        submit:
+        pending:
+        done:
+
+    """
+
+    def __init__(self, cache_dir, sharded, size, interval):
+        """Method initializing the class.
+
+        Args:
+            cache_dir: Cache directory
+            sharded: Use the sharded layout if True
+            size: Maximum number of queued items
+            interval: Seconds during which data is collected before it
+                is flushed to disk
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.cache_dir = cache_dir
+        self.sharded = sharded
+        self.interval = interval
+        self.items = queue.Queue(maxsize=max(1, size))
+        self.lock = threading.Lock()
+        self.counts = defaultdict(int)
+
+        # Start the thread
+        write_thread = _Write(self)
+        write_thread.daemon = True
+        write_thread.start()
+
+    def submit(self, data, hosthash, payload=None, receipt=None):
+        """Queue received data for saving.
+
+        Args:
+            data: Dict of validated agent data
+            hosthash: Hash of the hostname
+            payload: Data in the compact format
+            receipt: Object whose done method is called with True once
+                the data is on disk, or False if it couldn't be saved
+
+        Returns:
+            success: True if queued. The data must be sent again later if
+                False
+
+        """
+        # Initialize key variables
+        success = False
+        key = (data['uid'], hosthash)
+
+        # Queue
+        with self.lock:
+            try:
+                self.items.put_nowait((data, hosthash, payload, receipt))
+                self.counts[key] += 1
+                success = True
+            except queue.Full:
+                pass
+
+        # Return
+        return success
+
+    def pending(self, uid, hosthash):
+        """Determine whether data of a host / agent is waiting to be saved.
+
+        Args:
+            uid: UID of the agent
+            hosthash: Hash of the hostname
+
+        Returns:
+            value: True if there is data waiting
+
+        """
+        # Return
+        with self.lock:
+            value = (uid, hosthash) in self.counts
+        return value
+
+    def done(self, keys):
+        """Record that data was saved.
+
+        Args:
+            keys: List of (uid, hosthash) tuples of the saved data
+
+        Returns:
+            None
+
+        """
+        # Update counts
+        with self.lock:
+            for key in keys:
+                self.counts[key] -= 1
+                if self.counts[key] <= 0:
+                    del self.counts[key]
+
+
+class _Write(LogThread):
+    """Writer thread of the web server."""
+
+    def __init__(self, writer):
+        """Initialize the thread.
+
+        Args:
+            writer: Writer object
+
+        Returns:
+            None
+
+        """
+        LogThread.__init__(self)
+        self.writer = writer
+
+    def run(self):
+        """Save queued data in groups."""
+        while True:
+            # Collect data until the interval expires
+            items = [self.writer.items.get()]
+            deadline = time.time() + self.writer.interval
+            while True:
+                remaining = deadline - time.time()
+                try:
+                    if remaining > 0:
+                        items.append(
+                            self.writer.items.get(timeout=remaining))
+                    else:
+                        items.append(self.writer.items.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._commit(items)
+            finally:
+                self.writer.done(
+                    [(data['uid'], hosthash)
+                     for (data, hosthash, _, _) in items])
+
+    def _commit(self, items):
+        """Save a group of data as cache files.
+
+        Args:
+            items: List of (data, hosthash, payload, receipt) tuples
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        paths = []
+        receipts = []
+        directories = set()
+        success = False
+
+        # Write temporary files
+        for (data, hosthash, payload, receipt) in items:
+            extension = 'json'
+            if payload is not None:
+                extension = compact.EXTENSION
+            extension = spool.validated_extension(extension)
+            path = spool.filepath(
+                self.writer.cache_dir, data['timestamp'], data['uid'],
+                hosthash, self.writer.sharded, extension=extension)
+            try:
+                spool.write(spool.temporary(path), data, payload=payload)
+            except OSError as exception_error:
+                log_message = (
+                    'Could not save received data as %s. Error: %s'
+                    '') % (path, exception_error)
+                log.log2warn(1128, log_message)
+                if receipt is not None:
+                    receipt.done(False)
+                continue
+            paths.append(path)
+            directories.add(os.path.dirname(path))
+            if receipt is not None:
+                receipts.append(receipt)
+
+        # Flush them together, then make them visible to ingest daemons
+        try:
+            for path in paths:
+                spool.sync(spool.temporary(path))
+            for path in paths:
+                os.rename(spool.temporary(path), path)
+            for directory in sorted(directories):
+                spool.sync(directory)
+            success = True
+        except OSError as exception_error:
+            log_message = (
+                'Could not flush %s received cache files to disk. Error: %s'
+                '') % (len(paths), exception_error)
+            log.log2warn(1129, log_message)
+
+        # Tell the callers waiting for the data to be saved
+        for receipt in receipts:
+            receipt.done(success)
+
+
+def save(config, data, hosthash, payload=None, receipt=None):
+    """Queue received data for saving in the ingest cache directory.
+
+    Args:
+        config: Config object
+        data: Dict of validated agent data
+        hosthash: Hash of the hostname
+        payload: Data in the compact format
+        receipt: Object whose done method is called with True once the
+            data is on disk, or False if it couldn't be saved
+
+    Returns:
+        success: True if queued. The data must be sent again later if False
+
+    """
+    # Initialize key variables
+    global WRITER
+
+    # Start the writer
+    with _LOCK:
+        if WRITER is None:
+            WRITER = Writer(
+                config.ingest_cache_directory(),
+                config.ingest_cache_sharded(),
+                config.ingest_spool_queue(),
+                config.ingest_spool_interval())
+
+    # Queue
+    success = WRITER.submit(
+        data, hosthash, payload=payload, receipt=receipt)
+    return success
+
+
+def pending(uid, hosthash):
+    """Determine whether data of a host / agent is waiting to be saved.
+
+    Args:
+        uid: UID of the agent
+        hosthash: Hash of the hostname
+
+    Returns:
+        value: True if there is data waiting
+
+    """
+    # Return
+    value = False
+    if WRITER is not None:
+        value = WRITER.pending(uid, hosthash)
+    return value
@@ -164,6 +164,43 @@ class Database(object):
         # disconnect from server
         session.close()
 
+    def execute(self, session, statement, error_code, parameters=None):
+        """Execute a statement in a session without committing it.
+
+        Args:
+            session: Session
+            statement: SQLAlchemy statement object
+            error_code: Error number to use if one occurs
+            parameters: List of parameter dicts. Executed as a single
+                multi-row (executemany) statement if a list is provided.
+
+        Returns:
+            result: Result of the statement
+
+        """
+        # Initialize key variables
+        result = None
+
+        try:
+            # Execute statement. Commit is done by the caller.
+            result = session.execute(statement, parameters)
+
+        except Exception as exception_error:
+            session.rollback()
+            session.close()
+            log_message = (
+                'Unable to modify database connection. '
+                'Error: \"%s\"') % (exception_error)
+            log.log2die(error_code, log_message)
+        except:
+            session.rollback()
+            session.close()
+            log_message = ('Unexpected database exception')
+            log.log2die(error_code, log_message)
+
+        # Return
+        return result
+
     def session(self):
         """Return a session to the database pool.
 
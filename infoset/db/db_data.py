@@ -15,6 +15,15 @@ from infoset.db import db
 from infoset.db.db_orm import Data
 from infoset.db.db_datapoint import GetIDX
 
+# Maximum number of rows in a single multi-row INSERT statement. Each row
+# uses three bind parameters. SQLite only allows 999 per statement.
+_INSERT_CHUNK = 300
+
+# Inserts that skip rows whose (idx_datapoint, timestamp) primary key
+# already exists
+_INSERT_IGNORE = Data.__table__.insert().prefix_with(
+    'IGNORE', dialect='mysql').prefix_with('OR IGNORE', dialect='sqlite')
+
 
 class GetIDX(object):
     """Class to return agent data.
@@ -202,3 +211,26 @@ class GetIDX(object):
             chart_values.append(
                 {'x': timestamp, 'y': value, 'group': self.agent_label})
         return chart_values
+
+
+def insert_rows(database, session, rows, error_code):
+    """Insert rows into the iset_data table, ignoring existing rows.
+
+    Rows are inserted with chunked multi-row INSERT IGNORE statements, so
+    replaying data that is already in the database is harmless. The
+    caller commits the session.
+
+    Args:
+        database: Database object
+        session: Database session
+        rows: List of dicts with idx_datapoint, timestamp and value keys
+        error_code: Error number to use if one occurs
+
+    Returns:
+        None
+
+    """
+    # Insert
+    for start in range(0, len(rows), _INSERT_CHUNK):
+        statement = _INSERT_IGNORE.values(rows[start:start + _INSERT_CHUNK])
+        database.execute(session, statement, error_code)
@@ -76,6 +76,20 @@ class GetDID(object):
         # Return the session to the database pool after processing
         session.close()
 
+    def idx(self):
+        """Get idx value.
+
+        Args:
+            None
+
+        Returns:
+            value: Value to return
+
+        """
+        # Initialize key variables
+        value = self.data_dict['idx']
+        return value
+
     def last_timestamp(self):
         """Get last_timestamp value.
 
@@ -611,3 +625,43 @@ def datapoint_host_agent(idx_host, idx_agent):
 
     # Return
     return dict_list
+
+
+def datapoints_modified(ts_modified=None):
+    """Get ingest metadata for datapoints modified since a point in time.
+
+    Args:
+        ts_modified: Only get datapoints whose ts_modified value is on or
+            after this datetime. Get all datapoints if None.
+
+    Returns:
+        data: List of tuples (did, idx, idx_agent, last_timestamp,
+            enabled, ts_modified, uncharted_value)
+
+    """
+    # Initialize key variables
+    data = []
+
+    # Establish a database session
+    database = db.Database()
+    session = database.session()
+    result = session.query(
+        Datapoint.id, Datapoint.idx, Datapoint.idx_agent,
+        Datapoint.last_timestamp, Datapoint.enabled, Datapoint.ts_modified,
+        Datapoint.uncharted_value)
+    if ts_modified is not None:
+        result = result.filter(Datapoint.ts_modified >= ts_modified)
+
+    # Massage data
+    for instance in result:
+        data.append(
+            (jm_general.decode(instance.id), instance.idx,
+             instance.idx_agent, instance.last_timestamp,
+             bool(instance.enabled), instance.ts_modified,
+             instance.uncharted_value))
+
+    # Return the session to the database pool after processing
+    session.close()
+
+    # Return
+    return data
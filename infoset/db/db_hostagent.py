@@ -11,8 +11,9 @@ from sqlalchemy import and_
 
 # Infoset libraries
 from infoset.db import db
-from infoset.db.db_orm import HostAgent
+from infoset.db.db_orm import HostAgent, Host, Agent
 from infoset.utils import log
+from infoset.utils import jm_general
 
 
 class GetHostAgent(object):
@@ -113,6 +114,40 @@ def host_agent_exists(idx_host, idx_agent):
     return found
 
 
+def host_agent_timestamps():
+    """Get the last_timestamp of all host / agent entries.
+
+    Args:
+        None
+
+    Returns:
+        data: List of tuples (hostname, uid, last_timestamp)
+
+    """
+    # Initialize key variables
+    data = []
+
+    # Establish a database session
+    database = db.Database()
+    session = database.session()
+    result = session.query(
+        Host.hostname, Agent.id, HostAgent.last_timestamp).filter(and_(
+            HostAgent.idx_host == Host.idx,
+            HostAgent.idx_agent == Agent.idx))
+
+    # Massage data
+    for instance in result:
+        data.append(
+            (jm_general.decode(instance.hostname),
+             jm_general.decode(instance.id), instance.last_timestamp))
+
+    # Return the session to the database pool after processing
+    session.close()
+
+    # Return
+    return data
+
+
 def all_host_indices():
     """Get list of all host indexes in database.
 
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Test the agent module."""
+
+import unittest
+import threading
+import tempfile
+import shutil
+import json
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+
+import requests
+
+from infoset.utils import segment
+from infoset.utils import encoding
+from infoset.agents import agent as testimport
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Reply to requests, recording the port of each client."""
+
+    protocol_version = 'HTTP/1.1'
+    ports = set()
+    posts = []
+    batches = True
+    compressed = True
+
+    def do_GET(self):
+        """Reply to a GET request."""
+        self.ports.add(self.client_address[1])
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def do_POST(self):
+        """Reply to a POST request, recording the posted data."""
+        length = int(self.headers['Content-Length'])
+        body = self.rfile.read(length)
+        content_encoding = self.headers.get('Content-Encoding')
+        if content_encoding is not None:
+            if self.compressed is False:
+                self._reply(415)
+                return
+            body = encoding.decompress(body, content_encoding)
+        data = json.loads(body.decode())
+        if 'invalid' in data:
+            self._reply(400)
+            return
+        if '/batch/' not in self.path:
+            self.posts.append(data)
+            self.send_response(200)
+        elif self.batches is True:
+            self.posts.extend(data)
+            self.send_response(200)
+        else:
+            self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _reply(self, status):
+        """Reply to a request without data."""
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        """Don't log requests."""
+        pass
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    def setUp(self):
+        """Start a server."""
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        server_thread = threading.Thread(target=self.server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        self.url = ('http://127.0.0.1:%s') % (self.server.server_address[1])
+        self.session = testimport.Session(1, 1, 0, 1)
+
+    def tearDown(self):
+        """Stop the server."""
+        # Close the connection so that the server can stop
+        self.session.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session(self):
+        """Testing class Session keeping connections alive."""
+        # All requests use the same connection
+        _Handler.ports.clear()
+        for _ in range(3):
+            self.assertEqual(self.session.get(self.url).status_code, 200)
+        self.assertEqual(len(_Handler.ports), 1)
+
+        # Connections to several servers are kept alive
+        session = testimport.Session(1, 1, 0, 1, servers=2)
+        other = self.url.replace('127.0.0.1', 'localhost')
+        _Handler.ports.clear()
+        for _ in range(3):
+            self.assertEqual(session.get(self.url).status_code, 200)
+            self.assertEqual(session.get(other).status_code, 200)
+        self.assertEqual(len(_Handler.ports), 2)
+        session.session.close()
+
+    def test_request(self):
+        """Testing method request retrying when the server is down."""
+        session = testimport.Session(1, 1, 2, 1)
+        with patch.object(testimport.time, 'sleep') as sleep:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                session.post('http://127.0.0.1:1', data=b'{}')
+        self.assertEqual(sleep.call_count, 2)
+        for (delay,), _ in sleep.call_args_list:
+            self.assertLessEqual(delay, 1)
+
+    def test_breaker(self):
+        """Testing class Breaker."""
+        recovered = threading.Event()
+        breaker = testimport.Breaker(self.url, 2, recover=recovered.set)
+
+        # Open after two failures
+        self.assertEqual(breaker.allow(), True)
+        breaker.update(False)
+        self.assertEqual(breaker.allow(), True)
+        breaker.update(False)
+        self.assertEqual(breaker.allow(), False)
+
+        # Let a single probe through after the delay
+        breaker.retry = 0
+        self.assertEqual(breaker.allow(), True)
+        self.assertEqual(breaker.allow(), False)
+        breaker.update(False)
+        self.assertEqual(breaker.delay, breaker.backoff * 2)
+        self.assertEqual(breaker.allow(), False)
+
+        # Close when the probe succeeds
+        breaker.retry = 0
+        self.assertEqual(breaker.allow(), True)
+        breaker.update(True)
+        self.assertEqual(breaker.allow(), True)
+        self.assertEqual(recovered.wait(5), True)
+
+    def test_post_json(self):
+        """Testing function post_json."""
+        url = ('%s/receive/abc') % (self.url)
+        body = json.dumps({'timestamp': 1}).encode()
+        _Handler.posts.clear()
+
+        # Compressed data is posted
+        (result, compression) = testimport.post_json(
+            self.session, url, body, compression='gzip')
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(compression, 'gzip')
+
+        # Compression is kept if invalid data is refused uncompressed too
+        invalid = json.dumps({'invalid': True}).encode()
+        (result, compression) = testimport.post_json(
+            self.session, url, invalid, compression='gzip')
+        self.assertEqual(result.status_code, 400)
+        self.assertEqual(compression, 'gzip')
+
+        # Compression stops if the server doesn't support it
+        _Handler.compressed = False
+        (result, compression) = testimport.post_json(
+            self.session, url, body, compression='gzip')
+        _Handler.compressed = True
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(compression, None)
+        self.assertEqual(_Handler.posts, [{'timestamp': 1}] * 2)
+
+    def test_purge(self):
+        """Testing class Purge."""
+        directory = tempfile.mkdtemp()
+        segments = segment.SegmentLog(directory, 1024 * 1024)
+        purge = testimport.Purge(
+            self.session, self.url, 'abc', segments, 100, 2)
+
+        # Post batches
+        _Handler.posts.clear()
+        for timestamp in range(5):
+            segments.append({'timestamp': timestamp})
+        purge.run()
+        self.assertEqual(
+            sorted(post['timestamp'] for post in _Handler.posts),
+            list(range(5)))
+        self.assertEqual(segments.pending(), False)
+
+        # Post one record at a time if the server doesn't support batches
+        _Handler.posts.clear()
+        _Handler.batches = False
+        for timestamp in range(3):
+            segments.append({'timestamp': timestamp})
+        purge.run()
+        _Handler.batches = True
+        self.assertEqual(purge.size, 1)
+        self.assertEqual(len(_Handler.posts), 3)
+        self.assertEqual(segments.pending(), False)
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
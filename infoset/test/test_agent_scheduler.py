@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Test the agent scheduler module."""
+
+import unittest
+import threading
+import os
+
+from infoset.utils import hidden
+from infoset.agents import scheduler as testimport
+
+
+class _Poller(object):
+    """Record the threads that poll a host."""
+
+    def __init__(self, hostname, threads):
+        """Initialize the poller."""
+        self.hostname = hostname
+        self.threads = threads
+
+    def query(self):
+        """Poll the host."""
+        self.threads.add(threading.current_thread().name)
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    def setUp(self):
+        """Create the PID file of the agent."""
+        self.pidfile = hidden.File().pid('test_scheduler')
+        open(self.pidfile, 'a').close()
+
+    def tearDown(self):
+        """Delete the PID file of the agent."""
+        os.remove(self.pidfile)
+
+    def test_offset(self):
+        """Testing method offset."""
+        scheduler = testimport.Scheduler('test_scheduler', 300, 2)
+        offsets = [scheduler.offset('host%s' % (index)) for index in range(50)]
+        self.assertEqual(scheduler.offset('host0'), offsets[0])
+        self.assertGreater(len(set(offsets)), 40)
+        for offset in offsets:
+            self.assertGreaterEqual(offset, 0)
+            self.assertLess(offset, 300 * testimport._SPREAD)
+
+        # Hosts are polled right away without an interval
+        scheduler = testimport.Scheduler('test_scheduler', 0, 2)
+        self.assertEqual(scheduler.offset('host0'), 0)
+
+    def test_cycle(self):
+        """Testing method cycle."""
+        threads = set()
+        pollers = [_Poller('host%s' % (index), threads) for index in range(5)]
+        scheduler = testimport.Scheduler('test_scheduler', 0, 2)
+
+        # All hosts are polled and their lag recorded
+        scheduler.cycle(pollers)
+        hostnames = [poller.hostname for poller in pollers]
+        self.assertEqual(sorted(scheduler.lags()), hostnames)
+        self.assertEqual(len(scheduler.workers), 2)
+
+        # The same threads poll the next cycle
+        workers = list(scheduler.workers)
+        scheduler.cycle(pollers)
+        self.assertEqual(scheduler.workers, workers)
+        self.assertLessEqual(threads, {worker.name for worker in workers})
+
+    def test_wait(self):
+        """Testing cycles starting at multiples of the interval."""
+        scheduler = testimport.Scheduler('test_scheduler', 0.5, 2)
+        first = scheduler._wait()
+        self.assertEqual(first % 0.5, 0)
+        self.assertEqual(scheduler._wait(), first + 0.5)
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Test the cache module."""
+
+import unittest
+import tempfile
+import shutil
+import json
+import time
+import os
+from unittest.mock import patch
+
+from infoset.utils import jm_general
+from infoset.utils import spool
+from infoset.cache import claim
+from infoset.cache import scheduler
+from infoset.cache import cache as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    data = {
+        'timestamp': 1468173300,
+        'uid': '9f86d081884c',
+        'agent': 'snmp',
+        'hostname': 'switch1',
+        'chartable': {
+            'ifInOctets': {
+                'base_type': 32, 'description': 'Incoming Traffic',
+                'data': [[1, 100, 'Gi0/1']]}}}
+
+    def setUp(self):
+        """Create a temporary cache directory."""
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Delete the temporary cache directory."""
+        shutil.rmtree(self.cache_dir)
+
+    def test_process_uid(self):
+        """Testing class ProcessUID with database errors."""
+        hosthash = jm_general.hashstring(self.data['hostname'], sha=1)
+        filepath = spool.filepath(
+            self.cache_dir, self.data['timestamp'], self.data['uid'],
+            hosthash, False)
+        with open(filepath, 'w') as f_handle:
+            json.dump(self.data, f_handle)
+        schedule = scheduler.Scheduler()
+        claims = claim.Claims(self.cache_dir, 60)
+        schedule.add([filepath])
+        calls = []
+
+        def update(_):
+            """Fail like the database layer the first time."""
+            calls.append(os.path.isfile(filepath))
+            if len(calls) == 1:
+                raise SystemExit(2)
+
+        # Files are returned to the spool and processed again
+        with patch.object(testimport, '_RETRY_DELAY', 0), \
+                patch.object(testimport.UpdateDB, 'update', update), \
+                patch.object(
+                    testimport.registry.REGISTRY, 'unprocessed',
+                    return_value=True):
+            thread = testimport.ProcessUID(schedule, claims, 0)
+            thread.daemon = True
+            thread.start()
+            for _ in range(100):
+                if len(calls) == 2 and schedule.idle() is True:
+                    break
+                time.sleep(0.05)
+        self.assertEqual(calls, [False, False])
+        self.assertEqual(schedule.idle(), True)
+        self.assertEqual(os.path.isfile(filepath), False)
+        self.assertEqual(claims.held, set())
+        self.assertEqual(spool.files_in(claims.directory), [])
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
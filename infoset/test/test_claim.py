@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Test the claim module."""
+
+import unittest
+import threading
+import tempfile
+import shutil
+import time
+import os
+import socket
+import subprocess
+import sys
+
+from infoset.cache import claim as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    def setUp(self):
+        """Create a temporary cache directory."""
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Delete the temporary cache directory."""
+        shutil.rmtree(self.cache_dir)
+
+    def _worker(self, name):
+        """Create the claims of a worker with a given name."""
+        claims = testimport.Claims(self.cache_dir, 60)
+        os.rename(claims.directory, os.path.join(claims.progress_dir, name))
+        claims.worker = name
+        claims.directory = os.path.join(claims.progress_dir, name)
+        claims.token = os.path.join(claims.directory, '.token')
+        with open(claims.token, 'w') as f_handle:
+            f_handle.write(name)
+        return claims
+
+    def test_claim(self):
+        """Testing methods claim and release."""
+        first = self._worker('first')
+        second = self._worker('second')
+        key = ('aa11', 'abc123')
+
+        # Only one worker can hold a claim
+        self.assertTrue(first.claim(key))
+        self.assertFalse(second.claim(key))
+        self.assertTrue(second.claim(('bb22', 'abc123')))
+
+        # Claims can be taken once released
+        first.release(key)
+        self.assertTrue(second.claim(key))
+
+    def test_claim_file(self):
+        """Testing method claim_file."""
+        claims = self._worker('first')
+        filepath = os.path.join(self.cache_dir, '300_abc123_aa11.json')
+        open(filepath, 'w').close()
+
+        # Files can only be claimed once
+        result = claims.claim_file(filepath)
+        self.assertEqual(
+            result, os.path.join(claims.directory, '300_abc123_aa11.json'))
+        self.assertTrue(os.path.isfile(result))
+        self.assertIsNone(claims.claim_file(filepath))
+
+    def test_reap(self):
+        """Testing method reap."""
+        dead = self._worker('dead')
+        live = self._worker('live')
+        key = ('aa11', 'abc123')
+        filepath = os.path.join(self.cache_dir, '300_abc123_aa11.json')
+        open(filepath, 'w').close()
+        dead.claim(key)
+        dead.claim_file(filepath)
+
+        # Nothing is reaped while the lease is current
+        live.reap()
+        self.assertFalse(live.claim(key))
+
+        # Expired workers' files go back to the spool
+        expired = time.time() - 120
+        os.utime(dead.token, (expired, expired))
+        live.reap()
+        self.assertTrue(os.path.isfile(filepath))
+        self.assertEqual(os.listdir(live.progress_dir), ['live'])
+        self.assertTrue(live.claim(key))
+
+        # Workers on this host are reaped once their process stops
+        live.release(key)
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        stopped = self._worker(
+            ('%s-%s') % (socket.gethostname(), process.pid))
+        stopped.claim(key)
+        self.assertFalse(live.claim(key))
+        live.reap()
+        self.assertEqual(os.listdir(live.progress_dir), ['live'])
+        self.assertTrue(live.claim(key))
+
+    def test_renew(self):
+        """Testing methods renew and holds."""
+        first = self._worker('first')
+        second = self._worker('second')
+        key = ('aa11', 'abc123')
+        self.assertTrue(first.claim(key))
+        self.assertTrue(first.holds(key))
+        self.assertFalse(second.holds(key))
+
+        # Workers that were reaped drop their claims
+        expired = time.time() - 120
+        os.utime(first.token, (expired, expired))
+        second.reap()
+        self.assertTrue(second.claim(key))
+        first.renew()
+        self.assertFalse(first.holds(key))
+        self.assertTrue(os.path.isfile(first.token))
+
+        # Claims that were dropped aren't released
+        first.release(key)
+        self.assertFalse(first.claim(key))
+        self.assertTrue(second.holds(key))
+
+        # Threads that find the token missing together all carry on
+        errors = []
+
+        def renew():
+            """Renew the lease, recording errors."""
+            try:
+                first.renew()
+            except Exception as exception_error:
+                errors.append(exception_error)
+
+        os.remove(first.token)
+        threads = [threading.Thread(target=renew) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(os.path.isfile(first.token))
+        self.assertTrue(first.claim(('bb22', 'abc123')))
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Test the compact module."""
+
+import unittest
+import json
+import zlib
+
+from infoset.utils import compact as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    data = {
+        'timestamp': 1468173300,
+        'uid': '9f86d081884c',
+        'agent': 'snmp',
+        'hostname': 'switch1',
+        'chartable': {
+            'ifInOctets': {
+                'base_type': 32,
+                'description': 'Incoming Traffic',
+                'data': [[1, 100.5, 'Gi0/1'], [2, 200.0, 'Gi0/2']]},
+            'ifOutOctets': {
+                'base_type': 64,
+                'description': 'Outgoing Traffic',
+                'data': [[1, 5.0, 'Gi0/1', 'abc'], [2, 6.0, 'Gi0/2', 'def']]}
+        },
+        'other': {
+            'sysName': {
+                'base_type': None,
+                'description': 'System Name',
+                'data': [[0, 'switch1', None]]}
+        }
+    }
+
+    def test_encode(self):
+        """Testing function encode."""
+        # Test conversion in both directions
+        payload = testimport.encode(self.data)
+        self.assertTrue(payload.startswith(testimport.MAGIC))
+        self.assertEqual(testimport.decode(payload), self.data)
+        self.assertLess(len(payload), len(json.dumps(self.data)))
+
+        # Test with data that can't be converted
+        bad_data = {
+            'chartable': {
+                'label': {
+                    'base_type': 1, 'description': None,
+                    'data': [[0, 'not a number', None]]}}}
+        with self.assertRaises(ValueError):
+            testimport.encode(bad_data)
+
+    def test_meta(self):
+        """Testing function meta."""
+        # Test
+        payload = testimport.encode(self.data)
+        result = testimport.meta(payload)
+        for key in ['timestamp', 'uid', 'agent', 'hostname']:
+            self.assertEqual(result[key], self.data[key])
+        self.assertNotIn('chartable', result)
+
+    def test_decode(self):
+        """Testing function decode."""
+        # Test with invalid data
+        payload = testimport.encode(self.data)
+        for bad_payload in [
+                b'', testimport.MAGIC, payload[:-4],
+                b'JSON' + payload[len(testimport.MAGIC):]]:
+            with self.assertRaises(ValueError):
+                testimport.decode(bad_payload)
+
+        # Data can't be decompressed beyond the limit
+        testimport.decode(payload, limit=len(zlib.decompress(payload[4:])))
+        with self.assertRaises(ValueError):
+            testimport.decode(payload, limit=64)
+        bomb = testimport.MAGIC + zlib.compress(b'\0' * (1024 * 1024))
+        with self.assertRaises(ValueError):
+            testimport.decode(bomb, limit=1024)
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Test the direct module."""
+
+import unittest
+import tempfile
+import shutil
+import time
+import os
+
+from infoset.utils import spool
+from infoset.cache import writer
+from infoset.cache import direct as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    data = {
+        'timestamp': 1468173300,
+        'uid': '9f86d081884c',
+        'agent': 'snmp',
+        'hostname': 'switch1'}
+
+    def setUp(self):
+        """Create a temporary cache directory."""
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Delete the temporary cache directory."""
+        shutil.rmtree(self.cache_dir)
+
+    def test_receipt(self):
+        """Testing methods done and wait."""
+        receipt = testimport.Receipt()
+        self.assertEqual(receipt.wait(0), False)
+        receipt.done(True)
+        self.assertEqual(receipt.wait(0), True)
+
+        # Receipts are completed once the writer thread saved the data
+        saver = writer.Writer(self.cache_dir, False, 100, 0.01)
+        receipt = testimport.Receipt()
+        saver.submit(self.data, 'abc', receipt=receipt)
+        self.assertEqual(receipt.wait(5), True)
+        self.assertEqual(
+            os.listdir(self.cache_dir),
+            ['1468173300_9f86d081884c_abc.v1.json'])
+
+    def test_pending(self):
+        """Testing methods pending, add and scan."""
+        uid = self.data['uid']
+        filepath = spool.save(self.cache_dir, self.data, 'abc', False)
+        spooled = testimport.Spooled(self.cache_dir)
+        self.assertEqual(spooled.pending(uid, 'abc'), True)
+        self.assertEqual(spooled.pending(uid, 'def'), False)
+
+        # Files are forgotten once removed
+        os.remove(filepath)
+        self.assertEqual(spooled.pending(uid, 'abc'), False)
+
+        # Files saved by other processes are found
+        spool.save(self.cache_dir, self.data, 'def', True)
+        for _ in range(100):
+            if spooled.pending(uid, 'def') is True:
+                break
+            time.sleep(0.05)
+        self.assertEqual(spooled.pending(uid, 'def'), True)
+
+        # Files that were never written are forgotten
+        spooled.add([spool.filepath(
+            self.cache_dir, 1468173600, uid, 'abc', False)])
+        spooled.scan()
+        self.assertEqual(spooled.paths, {(uid, 'def'): set([os.path.join(
+            self.cache_dir, 'de',
+            '1468173300_9f86d081884c_def.json')])})
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Test the encoding module."""
+
+import unittest
+import gzip
+import json
+
+from infoset.utils import encoding as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    body = json.dumps({
+        'uid': '9f86d081884c',
+        'chartable': {
+            'ifInOctets': {
+                'data': [[index, index * 10, 'Gi0/%s' % (index)]
+                         for index in range(100)]}}}).encode()
+
+    def test_name(self):
+        """Testing function name."""
+        self.assertEqual(testimport.name(' GZip '), 'gzip')
+        self.assertEqual(testimport.name('x-gzip'), 'gzip')
+        self.assertEqual(testimport.name('identity'), None)
+        self.assertEqual(testimport.name(''), None)
+        self.assertEqual(testimport.name(None), None)
+
+    def test_supported(self):
+        """Testing function supported."""
+        self.assertEqual(testimport.supported('gzip'), True)
+        self.assertEqual(testimport.supported('deflate'), True)
+        self.assertEqual(testimport.supported(None), True)
+        self.assertEqual(testimport.supported('br'), False)
+
+    def test_compress(self):
+        """Testing functions compress and decompress."""
+        for value in testimport.ENCODINGS + [None]:
+            result = testimport.compress(self.body, value)
+            self.assertEqual(
+                testimport.decompress(result, value), self.body)
+
+        # gzip data is readable by other implementations
+        result = testimport.compress(self.body, 'gzip')
+        self.assertLess(len(result), len(self.body) / 2)
+        self.assertEqual(gzip.decompress(result), self.body)
+
+    def test_decompress(self):
+        """Testing function decompress with invalid data."""
+        result = testimport.compress(self.body, 'gzip')
+        with self.assertRaises(ValueError):
+            testimport.decompress(result[:-10], 'gzip')
+        with self.assertRaises(ValueError):
+            testimport.decompress(self.body, 'gzip')
+        with self.assertRaises(ValueError):
+            testimport.decompress(result, 'br')
+        with self.assertRaises(ValueError):
+            testimport.decompress(result, 'gzip', limit=100)
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
@@ -152,6 +152,30 @@ two: test 2
         # Delete directory
         shutil.rmtree(path)
 
+    def test_did(self):
+        """Testing function did."""
+        # Initializing key variables
+        prehash = ('%s%s%s%s%s') % (
+            self.random_string, 'label', 1, 'agent', 'hostname')
+        expected = testimport.hashstring(prehash)
+
+        # Test result. Repeated calls use the memo table
+        for _ in range(2):
+            result = testimport.did(
+                self.random_string, 'label', 1, 'agent', 'hostname')
+            self.assertEqual(result, expected)
+        self.assertGreater(testimport.did_cache_info().hits, 0)
+
+        # Equal values of different types create different DIDs
+        result = testimport.did(
+            self.random_string, 'label', True, 'agent', 'hostname')
+        self.assertNotEqual(result, expected)
+
+        # Values that can't be memoized
+        result = testimport.did(
+            self.random_string, 'label', [1], 'agent', 'hostname')
+        self.assertEqual(len(result), 64)
+
     def test_cleanstring(self):
         """Testing method / function cleanstring."""
         # Initializing key variables
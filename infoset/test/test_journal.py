@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Test the journal module."""
+
+import unittest
+import tempfile
+import shutil
+import os
+
+from infoset.cache import journal as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    def setUp(self):
+        """Create a temporary worker directory."""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Delete the temporary worker directory."""
+        shutil.rmtree(self.directory)
+
+    def test_read(self):
+        """Testing function read."""
+        # Journals of two threads
+        first = testimport.Journal(self.directory, 0)
+        second = testimport.Journal(self.directory, 1)
+        first.start()
+        second.start()
+        first.commit('100_abc_aa.json', 0)
+        first.commit('100_abc_aa.json', 1)
+        first.done('100_abc_aa.json')
+        second.commit('200_abc_bb.json', 0)
+
+        # A checkpoint of chunks committed by a previous worker
+        testimport.save(os.path.join(self.directory, '200_abc_bb.json'), [3])
+
+        # Incomplete lines are ignored
+        with open(second.path, 'a') as f_handle:
+            f_handle.write('300_abc_cc.json')
+
+        result = testimport.read(self.directory)
+        self.assertEqual(
+            result, {'100_abc_aa.json': None, '200_abc_bb.json': {0, 3}})
+
+        # Starting again empties the journal
+        first.start()
+        result = testimport.read(self.directory)
+        self.assertEqual(result, {'200_abc_bb.json': {0, 3}})
+
+    def test_checkpoint(self):
+        """Testing functions save, load and remove."""
+        filepath = os.path.join(self.directory, '100_abc_aa.json')
+        self.assertEqual(testimport.load(filepath), set())
+        testimport.save(filepath, {2, 0, 1})
+        self.assertEqual(testimport.load(filepath), {0, 1, 2})
+        self.assertEqual(
+            os.listdir(self.directory), ['.100_abc_aa.json.checkpoint'])
+        testimport.remove(filepath)
+        testimport.remove(filepath)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
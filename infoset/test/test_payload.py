@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Test the payload module."""
+
+import unittest
+import json
+
+from infoset.utils import compact
+from infoset.agents import payload as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    def test_data(self):
+        """Testing method data."""
+        # Empty groups are left out
+        payload = testimport.Payload(1468173300, 'abc', 'linux', 'host1')
+        self.assertEqual(payload.data(), {
+            'timestamp': 1468173300, 'uid': 'abc',
+            'agent': 'linux', 'hostname': 'host1'})
+
+        # Labels are added to groups by base_type
+        datapoints = [['sda', 5, 'sda']]
+        payload.add('disk_io', 64, 'Disk IO', datapoints)
+        payload.add('release', None, '', [[0, '4.4', None]])
+        payload.add('cpu_count', 1, 'CPUs', [[0, 8, None]])
+        payload.add('cpu_count', 1, 'CPUs', [[0, 4, None]])
+        data = payload.data()
+        self.assertEqual(sorted(data['chartable']), ['cpu_count', 'disk_io'])
+        self.assertEqual(data['chartable']['cpu_count'], {
+            'base_type': 1, 'description': 'CPUs', 'data': [[0, 4, None]]})
+        self.assertEqual(data['other'], {'release': {
+            'base_type': None, 'description': '', 'data': [[0, '4.4', None]]}})
+
+        # Datapoints are not copied
+        self.assertIs(data['chartable']['disk_io']['data'], datapoints)
+
+    def test_compact(self):
+        """Testing data in the compact format."""
+        payload = testimport.Payload(1468173300, 'abc', 'snmp', 'switch1')
+        payload.add('ifInOctets', 32, 'Incoming Traffic', [
+            [index, index * 10, 'Gi0/%s' % (index)] for index in range(10)])
+        payload.add('sysName', None, 'Name', [[0, 'switch1', None]])
+        data = json.loads(json.dumps(payload.data()))
+        self.assertEqual(compact.decode(compact.encode(data)), data)
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
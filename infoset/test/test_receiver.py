@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Test the receiver module."""
+
+import unittest
+import asyncio
+import json
+from unittest.mock import patch
+
+from infoset.utils import encoding
+from infoset.cache import receiver as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    data = {
+        'timestamp': 1468173300,
+        'uid': '9f86d081884c',
+        'agent': 'snmp',
+        'hostname': 'switch1'}
+
+    def test_receive(self):
+        """Testing function receive with invalid requests."""
+        body = json.dumps(self.data).encode()
+        self.assertEqual(
+            testimport.receive(None, 'text/plain', body), 415)
+        self.assertEqual(
+            testimport.receive(None, 'application/json', body, 'br'), 415)
+        self.assertEqual(
+            testimport.receive(None, 'application/json', body, 'gzip'), 400)
+        self.assertEqual(
+            testimport.receive(None, 'application/json', b'[]'), 400)
+        self.assertEqual(
+            testimport.receive(None, 'application/json', b'{"uid": 1}'), 400)
+
+        # Metadata used to name cache files must be valid
+        for (key, value) in [
+                ('timestamp', 1468173301), ('timestamp', '1468173300'),
+                ('timestamp', 1468173300.0), ('uid', 'NOT-HEX'),
+                ('uid', '../9f86'), ('uid', 123), ('agent', None),
+                ('hostname', ['switch1'])]:
+            data = dict(self.data)
+            data[key] = value
+            self.assertEqual(
+                testimport.receive(
+                    None, 'application/json', json.dumps(data).encode()),
+                400)
+
+        # Values of chartable data must be numeric
+        data = dict(self.data, chartable={
+            'ifInOctets': {
+                'base_type': 32, 'description': 'Incoming Traffic',
+                'data': [[1, 'abc', 'Gi0/1']]}})
+        self.assertEqual(
+            testimport.receive(
+                None, 'application/json', json.dumps(data).encode()), 400)
+
+    def test_receive_batch(self):
+        """Testing function receive_batch with invalid requests."""
+        body = json.dumps([self.data, {'uid': 1}]).encode()
+        self.assertEqual(
+            testimport.receive_batch(None, 'text/plain', b'[]'), 415)
+        self.assertEqual(
+            testimport.receive_batch(None, 'application/json', b'{}'), 400)
+        self.assertEqual(
+            testimport.receive_batch(
+                None, 'application/json',
+                encoding.compress(body, 'gzip'), 'gzip'), 400)
+
+    def _serve(self, request):
+        """Send a request to a Receiver and read the reply."""
+        async def exchange():
+            receiver = testimport.Receiver(None, 1, 1)
+            server = await asyncio.start_server(
+                receiver.handle, host='127.0.0.1', port=0)
+            port = server.sockets[0].getsockname()[1]
+            (reader, writer) = await asyncio.open_connection(
+                '127.0.0.1', port)
+            writer.write(request)
+            reply = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return reply
+
+        with patch.object(testimport, '_READ_TIMEOUT', 0.2):
+            reply = asyncio.run(exchange())
+        return reply
+
+    def test_handle(self):
+        """Testing method handle with bad clients."""
+        # Connections are closed if the headers don't arrive in time
+        self.assertEqual(self._serve(b'POST /receive/abc HTTP/1.1\r\n'), b'')
+
+        # Connections are closed if there are too many headers
+        headers = b''.join(
+            [('X-Header-%s: 1\r\n' % (index)).encode()
+             for index in range(101)])
+        self.assertEqual(self._serve(
+            b'POST /receive/abc HTTP/1.1\r\n' + headers + b'\r\n'), b'')
+
+        # The body of bad requests isn't read
+        reply = self._serve(
+            b'POST /unknown HTTP/1.1\r\nContent-Length: 1000\r\n\r\n')
+        self.assertTrue(reply.startswith(b'HTTP/1.1 404 Not Found\r\n'))
+        self.assertIn(b'Connection: close', reply)
+
+        # Connections are closed if the body doesn't arrive in time
+        self.assertEqual(self._serve(
+            b'POST /receive/abc HTTP/1.1\r\nContent-Length: 10\r\n\r\n'
+            b'{}'), b'')
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Test the scheduler module."""
+
+import unittest
+import time
+
+from infoset.cache import scheduler as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    # Recent timestamp
+    now = (int(time.time()) // 300) * 300
+
+    def _filepaths(self, hosthash, count, start):
+        """Create a list of cache filepaths for a host."""
+        filepaths = []
+        for offset in range(count):
+            filepaths.append(('/tmp/%s_abc123_%s.json') % (
+                start + (offset * 300), hosthash))
+        return filepaths
+
+    def test_next(self):
+        """Testing method next."""
+        # A host with a backlog is added before a host with fresh data
+        schedule = testimport.Scheduler()
+        old = self.now - (300 * 100)
+        backlog = self._filepaths('aa', 50, old)
+        fresh = self._filepaths('bb', 1, self.now)
+        schedule.add(list(reversed(backlog)))
+        schedule.add(fresh)
+
+        # Fresh data is processed first
+        (key, metadata) = schedule.next()
+        self.assertEqual(key, ('bb', 'abc123'))
+        self.assertEqual([filepath for (_, filepath) in metadata], fresh)
+        schedule.done(key, metadata)
+
+        # The backlog is processed in slices, oldest first
+        (key, metadata) = schedule.next()
+        self.assertEqual(key, ('aa', 'abc123'))
+        self.assertEqual(
+            [filepath for (_, filepath) in metadata],
+            backlog[:testimport._SLICE])
+        status = schedule.status()
+        self.assertEqual(status['pending'], 50 - testimport._SLICE)
+        self.assertEqual(status['in_progress'], testimport._SLICE)
+        self.assertEqual(status['backlogged'], 1)
+
+        # Files of a key being processed aren't handed to other threads
+        self.assertEqual(len(schedule.rotation), 0)
+        schedule.done(key, metadata)
+        self.assertEqual(len(schedule.rotation), 1)
+
+    def test_add(self):
+        """Testing method add."""
+        # Files are only queued once
+        schedule = testimport.Scheduler()
+        filepaths = self._filepaths('aa', 3, self.now)
+        schedule.add(filepaths)
+        schedule.add(filepaths + ['/tmp/invalid.json'])
+        self.assertEqual(schedule.status()['pending'], 3)
+
+        # Files can be queued again once they are done
+        (key, metadata) = schedule.next()
+        schedule.done(key, metadata)
+        self.assertTrue(schedule.idle())
+        schedule.add(filepaths[:1])
+        self.assertEqual(schedule.status()['pending'], 1)
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
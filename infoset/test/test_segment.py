@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Test the segment module."""
+
+import unittest
+import tempfile
+import shutil
+import json
+import os
+
+from infoset.utils import segment as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    def setUp(self):
+        """Create a temporary log directory."""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Delete the temporary log directory."""
+        shutil.rmtree(self.directory)
+
+    def _data(self, records):
+        """Convert records to agent data."""
+        return [json.loads(record.decode()) for record in records]
+
+    def test_read(self):
+        """Testing methods append, read and commit."""
+        log = testimport.SegmentLog(self.directory, 1024 * 1024)
+        self.assertEqual(log.pending(), False)
+        for index in range(5):
+            log.append({'timestamp': index})
+        self.assertEqual(log.pending(), True)
+
+        # Read in order
+        (records, position) = log.read(log.start(), 3)
+        self.assertEqual(
+            self._data(records),
+            [{'timestamp': 0}, {'timestamp': 1}, {'timestamp': 2}])
+        log.commit(position)
+
+        # The position is kept when the log is opened again
+        log = testimport.SegmentLog(self.directory, 1024 * 1024)
+        log.append({'timestamp': 5})
+        (records, position) = log.read(log.start(), 10)
+        self.assertEqual(
+            self._data(records),
+            [{'timestamp': 3}, {'timestamp': 4}, {'timestamp': 5}])
+        log.commit(position)
+        self.assertEqual(log.pending(), False)
+
+        # Only the segment being appended to is left
+        self.assertEqual(len(log.segments), 1)
+
+    def test_rotate(self):
+        """Testing segments being deleted when posted."""
+        log = testimport.SegmentLog(self.directory, 1024 * 1024, 1)
+        for index in range(4):
+            log.append({'timestamp': index})
+        self.assertEqual(len(log.segments), 4)
+
+        # Segments are deleted when all their records are posted
+        (records, position) = log.read(log.start(), 3)
+        self.assertEqual(len(records), 3)
+        log.commit(position)
+        self.assertEqual(len(log.segments), 1)
+        (records, position) = log.read(position, 3)
+        self.assertEqual(self._data(records), [{'timestamp': 3}])
+
+    def test_evict(self):
+        """Testing the oldest segments being deleted over the quota."""
+        log = testimport.SegmentLog(self.directory, 100, 1)
+        for index in range(20):
+            log.append({'timestamp': index})
+        self.assertLessEqual(log.total, 100)
+
+        # Only the newest records are left
+        (records, _) = log.read(log.start(), 20)
+        records = self._data(records)
+        self.assertLess(len(records), 20)
+        self.assertEqual(records[-1], {'timestamp': 19})
+
+    def test_corrupted(self):
+        """Testing partially written records being skipped."""
+        log = testimport.SegmentLog(self.directory, 1024 * 1024)
+        log.append({'timestamp': 0})
+        with open(log._path(log.current), 'ab') as f_handle:
+            f_handle.write(b'\x00\x00\x01\x00abc')
+
+        # New records are appended to a new segment
+        log = testimport.SegmentLog(self.directory, 1024 * 1024)
+        log.append({'timestamp': 1})
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        (records, _) = log.read(log.start(), 10)
+        self.assertEqual(
+            self._data(records), [{'timestamp': 0}, {'timestamp': 1}])
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
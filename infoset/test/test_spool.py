@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Test the spool module."""
+
+import unittest
+import tempfile
+import shutil
+import json
+import os
+
+from infoset.utils import spool as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    hosthash = 'd8a2f4e1c0'
+    uid = '9f86d081884c'
+
+    def setUp(self):
+        """Create a temporary cache directory."""
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Delete the temporary cache directory."""
+        shutil.rmtree(self.cache_dir)
+
+    def test_filename(self):
+        """Testing function filename."""
+        # Test
+        result = testimport.filename(100, self.uid, self.hosthash)
+        self.assertEqual(result, '100_9f86d081884c_d8a2f4e1c0.json')
+        self.assertTrue(bool(testimport.FILENAME_REGEX.match(result)))
+
+    def test_validated(self):
+        """Testing functions validated_extension and validated."""
+        extension = testimport.validated_extension('isc')
+        result = testimport.filename(
+            100, self.uid, self.hosthash, extension=extension)
+        self.assertEqual(result, '100_9f86d081884c_d8a2f4e1c0.v1.isc')
+        self.assertTrue(bool(testimport.FILENAME_REGEX.match(result)))
+        self.assertEqual(testimport.validated(result), True)
+        self.assertEqual(
+            testimport.validated('100_9f86d081884c_d8a2f4e1c0.json'), False)
+
+    def test_filepath(self):
+        """Testing function filepath."""
+        # Flat layout
+        result = testimport.filepath(
+            self.cache_dir, 100, self.uid, self.hosthash, False)
+        self.assertEqual(os.path.dirname(result), self.cache_dir)
+
+        # Sharded layout
+        result = testimport.filepath(
+            self.cache_dir, 100, self.uid, self.hosthash, True)
+        shard = os.path.join(self.cache_dir, 'd8')
+        self.assertEqual(os.path.dirname(result), shard)
+        self.assertTrue(os.path.isdir(shard))
+
+    def test_files(self):
+        """Testing function files."""
+        # Create files in both layouts
+        expected = []
+        for (timestamp, hosthash, sharded) in [
+                (100, self.hosthash, False),
+                (200, self.hosthash, True),
+                (300, 'aa1234', True)]:
+            filepath = testimport.filepath(
+                self.cache_dir, timestamp, self.uid, hosthash, sharded)
+            open(filepath, 'w').close()
+            expected.append(filepath)
+
+        # Other files are ignored
+        open(os.path.join(self.cache_dir, '.100_ab_cd.json.tmp'), 'w').close()
+
+        # Test
+        result = sorted(testimport.files(self.cache_dir))
+        self.assertEqual(result, sorted(expected))
+        result = sorted(testimport.files(self.cache_dir, self.hosthash))
+        self.assertEqual(result, sorted(expected[:2]))
+
+    def test_save(self):
+        """Testing function save."""
+        data = {'timestamp': 100, 'uid': self.uid, 'hostname': 'host'}
+        result = testimport.save(self.cache_dir, data, self.hosthash, True)
+        self.assertEqual(result, testimport.filepath(
+            self.cache_dir, 100, self.uid, self.hosthash, True))
+        with open(result, 'r') as f_handle:
+            self.assertEqual(json.load(f_handle), data)
+
+        # Payloads are saved as is. No temporary files are left behind
+        result = testimport.save(
+            self.cache_dir, data, self.hosthash, False, payload=b'ISC',
+            extension='isc')
+        with open(result, 'rb') as f_handle:
+            self.assertEqual(f_handle.read(), b'ISC')
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_migrate(self):
+        """Testing function migrate."""
+        # Create a flat file
+        filepath = testimport.filepath(
+            self.cache_dir, 100, self.uid, self.hosthash, False)
+        open(filepath, 'w').close()
+
+        # Test
+        self.assertEqual(testimport.migrate(self.cache_dir), 1)
+        expected = testimport.filepath(
+            self.cache_dir, 100, self.uid, self.hosthash, True)
+        self.assertTrue(os.path.isfile(expected))
+        self.assertFalse(os.path.isfile(filepath))
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Test the watch module."""
+
+import unittest
+import tempfile
+import shutil
+import struct
+import os
+from unittest.mock import patch
+
+from infoset.utils import spool
+from infoset.cache import watch as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    data = {
+        'timestamp': 1468173300,
+        'uid': '9f86d081884c',
+        'agent': 'snmp',
+        'hostname': 'switch1'}
+
+    def setUp(self):
+        """Create a temporary cache directory with a shard."""
+        self.cache_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.cache_dir, 'ab'))
+        self.watcher = testimport.Watcher(self.cache_dir)
+        if self.watcher.enabled() is False:
+            self.skipTest('inotify is not available')
+
+    def tearDown(self):
+        """Stop watching and delete the temporary cache directory."""
+        self.watcher.close()
+        shutil.rmtree(self.cache_dir)
+
+    def _events(self, events):
+        """Replace the inotify file descriptor with a pipe of events."""
+        # The write end is kept open so that reads of an empty pipe would
+        # block, as they do with inotify
+        (reader, writer) = os.pipe()
+        self.addCleanup(os.close, writer)
+        os.set_blocking(reader, False)
+        for (wd, mask, name) in events:
+            name = name.encode().ljust(16, b'\0')
+            os.write(writer, struct.pack(
+                testimport._EVENT_FORMAT, wd, mask, 0, len(name)) + name)
+        os.close(self.watcher.fd)
+        self.watcher.fd = reader
+
+    def test_init(self):
+        """Testing watches of the directory and its shards."""
+        self.assertEqual(
+            sorted(self.watcher.watches.values()),
+            [self.cache_dir, os.path.join(self.cache_dir, 'ab')])
+
+        # Polling is used without inotify
+        with patch.object(testimport, '_libc', return_value=None):
+            watcher = testimport.Watcher(self.cache_dir)
+        self.assertEqual(watcher.enabled(), False)
+        self.assertEqual(watcher.watches, {})
+
+    def test_wait(self):
+        """Testing method wait."""
+        # Cache files are reported, temporary files aren't
+        flat = spool.save(self.cache_dir, self.data, 'cd12', False)
+        sharded = spool.save(self.cache_dir, self.data, 'ab12', True)
+        self.assertEqual(sorted(self.watcher.wait(5)), [flat, sharded])
+        self.assertEqual(self.watcher.wait(0.1), [])
+
+        # New shards are watched. Files saved before the watch was
+        # created are reported too.
+        first = spool.save(self.cache_dir, self.data, 'ef12', True)
+        self.assertEqual(self.watcher.wait(5), [first])
+        self.assertIn(
+            os.path.join(self.cache_dir, 'ef'), self.watcher.watches.values())
+        data = dict(self.data, timestamp=1468173600)
+        second = spool.save(self.cache_dir, data, 'ef12', True)
+        self.assertEqual(self.watcher.wait(5), [second])
+
+    def test_read(self):
+        """Testing the mapping of inotify events to filepaths."""
+        watches = {
+            path: wd for (wd, path) in self.watcher.watches.items()}
+        shard = os.path.join(self.cache_dir, 'ab')
+        filename = spool.filename(1468173300, '9f86d081884c', 'ab12')
+
+        # Only cache files in watched directories are reported
+        self._events([
+            (watches[shard], testimport.IN_MOVED_TO, filename),
+            (watches[shard], testimport.IN_CLOSE_WRITE, '.temp'),
+            (watches[self.cache_dir], testimport.IN_CREATE, 'notes.txt'),
+            (-2, testimport.IN_MOVED_TO, filename)])
+        self.assertEqual(
+            self.watcher.wait(1), [os.path.join(shard, filename)])
+
+        # Directories that aren't shards aren't watched
+        self._events([(
+            watches[self.cache_dir],
+            testimport.IN_CREATE | testimport.IN_ISDIR, 'failures')])
+        self.assertEqual(self.watcher.wait(0.1), [])
+
+    def test_overflow(self):
+        """Testing lost events."""
+        watches = {
+            path: wd for (wd, path) in self.watcher.watches.items()}
+        filename = spool.filename(1468173300, '9f86d081884c', 'ab12')
+
+        # The directory needs to be rescanned if the event queue overflowed
+        self._events([
+            (watches[self.cache_dir], testimport.IN_MOVED_TO, filename),
+            (-1, testimport.IN_Q_OVERFLOW, ''),
+            (watches[self.cache_dir], testimport.IN_MOVED_TO, filename)])
+        self.assertIsNone(self.watcher.wait(1))
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
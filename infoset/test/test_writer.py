@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Test the writer module."""
+
+import unittest
+import tempfile
+import shutil
+import time
+import os
+from unittest.mock import patch
+
+from infoset.cache import writer as testimport
+
+
+class KnownValues(unittest.TestCase):
+    """Checks all functions and methods."""
+
+    #########################################################################
+    # General object setup
+    #########################################################################
+
+    # Required
+    maxDiff = None
+
+    data = {
+        'timestamp': 1468173300,
+        'uid': '9f86d081884c',
+        'agent': 'snmp',
+        'hostname': 'switch1'}
+
+    def setUp(self):
+        """Create a temporary cache directory."""
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Delete the temporary cache directory."""
+        shutil.rmtree(self.cache_dir)
+
+    def test_submit(self):
+        """Testing method submit."""
+        # Queue data
+        writer = testimport.Writer(self.cache_dir, False, 100, 0.01)
+        self.assertEqual(writer.submit(self.data, 'abc'), True)
+        self.assertEqual(writer.submit(self.data, 'def', b'ISC'), True)
+
+        # Wait for the data to be saved
+        for _ in range(100):
+            if writer.pending(self.data['uid'], 'def') is False:
+                break
+            time.sleep(0.01)
+        self.assertEqual(writer.pending(self.data['uid'], 'abc'), False)
+        self.assertEqual(writer.pending(self.data['uid'], 'def'), False)
+        self.assertEqual(
+            sorted(os.listdir(self.cache_dir)),
+            ['1468173300_9f86d081884c_abc.v1.json',
+             '1468173300_9f86d081884c_def.v1.isc'])
+
+    def test_pending(self):
+        """Testing methods pending and done with a full queue."""
+        # Don't start the thread
+        with patch.object(testimport._Write, 'start'):
+            writer = testimport.Writer(self.cache_dir, False, 1, 0.01)
+
+        self.assertEqual(writer.submit(self.data, 'abc'), True)
+        self.assertEqual(writer.submit(self.data, 'abc'), False)
+        self.assertEqual(writer.pending(self.data['uid'], 'abc'), True)
+        writer.done([(self.data['uid'], 'abc')])
+        self.assertEqual(writer.pending(self.data['uid'], 'abc'), False)
+
+
+if __name__ == '__main__':
+
+    # Do the unit test
+    unittest.main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""Compact binary format for agent data.
+
+An alternative to JSON for agent data. Labels, descriptions, indexes and
+sources are stored once in a table of unique values. Datapoints refer to
+the table by position and chartable values are stored as an array of
+floats. The result is compressed with zlib.
+
+Layout:
+    4 byte magic number
+    zlib compressed body:
+        16 byte header with the lengths of the four sections
+        JSON document of top level values (timestamp, uid etc.)
+        JSON document with the table of unique values and the groups
+        Array of unsigned 32 bit table references for each datapoint
+        Array of 64 bit floats with the values of chartable datapoints
+
+Arrays are little-endian.
+
+"""
+
+# Standard libraries
+import sys
+import json
+import zlib
+import struct
+from array import array
+
+# Infoset libraries
+from infoset.utils import encoding
+
+# Magic number at the start of compact data
+MAGIC = b'ISC\x01'
+
+# HTTP Content-Type of compact data
+CONTENT_TYPE = 'application/x-infoset-compact'
+
+# Cache file extension of compact data
+EXTENSION = 'isc'
+
+# Section lengths
+_LENGTHS = struct.Struct('<IIII')
+
+# Typecode of unsigned 32 bit integers
+if array('I').itemsize == 4:
+    _REF_TYPECODE = 'I'
+else:
+    _REF_TYPECODE = 'L'
+
+_DATA_TYPES = ['chartable', 'other']
+
+
+class _Table(object):
+    """Table of unique values.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        ref:
+
+    """
+
+    def __init__(self):
+        """Method initializing the class.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.values = []
+        self.positions = {}
+
+    def ref(self, value):
+        """Get the position of a value in the table, adding it if needed.
+
+        Args:
+            value: Value
+
+        Returns:
+            position: Position of the value
+
+        """
+        # Values that are equal, but of different types, are different.
+        # Values that can't be hashed are never shared.
+        key = (type(value), value)
+        try:
+            position = self.positions.get(key)
+        except TypeError:
+            key = None
+            position = None
+
+        # Add to the table
+        if position is None:
+            position = len(self.values)
+            self.values.append(value)
+            if key is not None:
+                self.positions[key] = position
+
+        # Return
+        return position
+
+
+def encode(data):
+    """Convert agent data to the compact format.
+
+    Args:
+        data: Dict of agent data
+
+    Returns:
+        payload: Compact data as bytes. A ValueError is raised if the data
+            can't be converted.
+
+    """
+    # Initialize key variables
+    table = _Table()
+    groups = []
+    refs = array(_REF_TYPECODE)
+    values = array('d')
+
+    try:
+        # Top level values
+        meta = {}
+        for key, value in data.items():
+            if key not in _DATA_TYPES:
+                meta[key] = value
+
+        # Process groups
+        for data_type in _DATA_TYPES:
+            if data_type not in data:
+                continue
+            chartable = data_type == 'chartable'
+
+            for label, group in sorted(data[data_type].items()):
+                # All datapoints of a group must have the same length
+                datapoints = group['data']
+                width = 3
+                if bool(datapoints) is True:
+                    width = len(datapoints[0])
+                if width not in [3, 4]:
+                    raise ValueError('Invalid datapoint length')
+
+                groups.append([
+                    data_type, table.ref(label),
+                    table.ref(group['description']),
+                    table.ref(group['base_type']), len(datapoints), width])
+
+                # Process datapoints
+                for datapoint in datapoints:
+                    if len(datapoint) != width:
+                        raise ValueError('Invalid datapoint length')
+                    refs.append(table.ref(datapoint[0]))
+                    if chartable is True:
+                        values.append(float(datapoint[1]))
+                    else:
+                        refs.append(table.ref(datapoint[1]))
+                    refs.append(table.ref(datapoint[2]))
+                    if width == 4:
+                        refs.append(table.ref(datapoint[3]))
+
+        # Create sections
+        meta_bytes = json.dumps(meta).encode()
+        table_bytes = json.dumps(
+            {'table': table.values, 'groups': groups}).encode()
+    except (KeyError, TypeError, AttributeError) as exception_error:
+        raise ValueError(exception_error)
+
+    if sys.byteorder == 'big':
+        refs.byteswap()
+        values.byteswap()
+    refs_bytes = refs.tobytes()
+    values_bytes = values.tobytes()
+
+    # Return
+    body = b''.join([
+        _LENGTHS.pack(
+            len(meta_bytes), len(table_bytes),
+            len(refs_bytes), len(values_bytes)),
+        meta_bytes, table_bytes, refs_bytes, values_bytes])
+    payload = MAGIC + zlib.compress(body)
+    return payload
+
+
+def meta(payload):
+    """Get the top level values of compact data without decoding it all.
+
+    Args:
+        payload: Compact data as bytes
+
+    Returns:
+        data: Dict of top level values (timestamp, uid, agent, hostname).
+            A ValueError is raised if the data is invalid.
+
+    """
+    try:
+        if payload[:len(MAGIC)] != MAGIC:
+            raise ValueError('Invalid magic number')
+
+        # Only decompress the start of the body
+        decompressor = zlib.decompressobj()
+        body = decompressor.decompress(payload[len(MAGIC):], _LENGTHS.size)
+        (meta_length, _, _, _) = _LENGTHS.unpack(body)
+        if meta_length > encoding.LIMIT:
+            raise ValueError('Decompressed data is too large')
+        body = decompressor.decompress(
+            decompressor.unconsumed_tail, meta_length)
+        if len(body) != meta_length:
+            raise ValueError('Truncated data')
+        data = json.loads(body.decode())
+        if isinstance(data, dict) is False:
+            raise ValueError('Invalid top level values')
+    except (zlib.error, struct.error, UnicodeDecodeError) as exception_error:
+        raise ValueError(exception_error)
+
+    # Return
+    return data
+
+
+def decode(payload, limit=encoding.LIMIT):
+    """Convert compact data to agent data.
+
+    Args:
+        payload: Compact data as bytes
+        limit: Largest accepted size of the decompressed body in bytes
+
+    Returns:
+        data: Dict of agent data in the same form as the JSON format.
+            A ValueError is raised if the data is invalid or too large.
+
+    """
+    try:
+        if payload[:len(MAGIC)] != MAGIC:
+            raise ValueError('Invalid magic number')
+        body = encoding.decompress(
+            payload[len(MAGIC):], 'deflate', limit=limit)
+
+        # Split the sections
+        lengths = _LENGTHS.unpack_from(body)
+        if _LENGTHS.size + sum(lengths) != len(body):
+            raise ValueError('Invalid section lengths')
+        sections = []
+        offset = _LENGTHS.size
+        for length in lengths:
+            sections.append(body[offset:offset + length])
+            offset += length
+
+        data = json.loads(sections[0].decode())
+        tables = json.loads(sections[1].decode())
+        table = tables['table']
+        refs = array(_REF_TYPECODE)
+        refs.frombytes(sections[2])
+        values = array('d')
+        values.frombytes(sections[3])
+        if sys.byteorder == 'big':
+            refs.byteswap()
+            values.byteswap()
+
+        # Rebuild the groups. Columns are sliced out of the arrays rather
+        # than read one datapoint at a time.
+        ref_offset = 0
+        value_offset = 0
+        for (data_type, label, description,
+             base_type, count, width) in tables['groups']:
+            # Number of table references per datapoint
+            step = width
+            if data_type == 'chartable':
+                step = width - 1
+            group_refs = refs[ref_offset:ref_offset + step * count]
+            if len(group_refs) != step * count:
+                raise ValueError('Truncated datapoints')
+            ref_offset += step * count
+
+            # Create the columns
+            columns = [
+                [table[ref] for ref in group_refs[column::step]]
+                for column in range(step)]
+            if data_type == 'chartable':
+                group_values = values[value_offset:value_offset + count]
+                if len(group_values) != count:
+                    raise ValueError('Truncated values')
+                value_offset += count
+                columns.insert(1, group_values.tolist())
+            datapoints = [list(datapoint) for datapoint in zip(*columns)]
+
+            # Update data
+            if data_type not in data:
+                data[data_type] = {}
+            data[data_type][table[label]] = {
+                'base_type': table[base_type],
+                'description': table[description],
+                'data': datapoints}
+    except (zlib.error, struct.error, UnicodeDecodeError,
+            KeyError, IndexError, TypeError) as exception_error:
+        raise ValueError(exception_error)
+
+    # Return
+    return data
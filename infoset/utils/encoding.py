@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""HTTP Content-Encoding of agent data.
+
+Agents can compress the data they post to the server. Labels, sources and
+descriptions repeat a lot, so agent data usually compresses 10 to 20
+times.
+
+gzip and deflate are always supported. zstd is supported when the
+zstandard package is installed.
+
+"""
+
+# Standard libraries
+import io
+import zlib
+
+# PIP libraries. zstandard is optional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Largest accepted size of decompressed data in bytes
+LIMIT = 16 * 1024 * 1024
+
+# Names meaning the data isn't compressed
+_IDENTITY = [None, '', 'identity']
+
+# zlib window bits of each format
+_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+# Other names of encodings
+_ALIASES = {'x-gzip': 'gzip'}
+
+# Supported encodings
+ENCODINGS = ['gzip', 'deflate']
+_ERRORS = (zlib.error,)
+if zstandard is not None:
+    ENCODINGS.append('zstd')
+    _ERRORS = (zlib.error, zstandard.ZstdError)
+
+
+def name(value):
+    """Get the standard name of an encoding.
+
+    Args:
+        value: Encoding, as found in a Content-Encoding header
+
+    Returns:
+        result: Lower case name of the encoding. None if the data isn't
+            compressed
+
+    """
+    # Initialize key variables
+    result = value
+    if isinstance(value, str) is True:
+        result = value.strip().lower()
+        result = _ALIASES.get(result, result)
+    if result in _IDENTITY:
+        result = None
+
+    # Return
+    return result
+
+
+def supported(value):
+    """Determine whether an encoding is supported.
+
+    Args:
+        value: Encoding
+
+    Returns:
+        result: True if supported, or if the data isn't compressed
+
+    """
+    # Return
+    encoding = name(value)
+    result = encoding is None or encoding in ENCODINGS
+    return result
+
+
+def compress(body, value):
+    """Compress data.
+
+    Args:
+        body: Data as bytes
+        value: Encoding
+
+    Returns:
+        result: Compressed data as bytes
+
+    """
+    # Initialize key variables
+    encoding = name(value)
+
+    # Compress
+    if encoding is None:
+        result = body
+    elif encoding == 'zstd':
+        result = zstandard.ZstdCompressor().compress(body)
+    else:
+        compressor = zlib.compressobj(wbits=_WBITS[encoding])
+        result = compressor.compress(body) + compressor.flush()
+    return result
+
+
+def decompress(body, value, limit=LIMIT):
+    """Decompress data.
+
+    Args:
+        body: Compressed data as bytes
+        value: Encoding
+        limit: Largest accepted size of decompressed data in bytes
+
+    Returns:
+        result: Decompressed data as bytes. A ValueError is raised if the
+            encoding isn't supported, or the data is invalid or too large.
+
+    """
+    # Initialize key variables
+    encoding = name(value)
+    if supported(encoding) is False:
+        raise ValueError(('Unsupported encoding %s') % (value))
+
+    # Decompress no more than the limit
+    try:
+        if encoding is None:
+            result = body
+        elif encoding == 'zstd':
+            reader = zstandard.ZstdDecompressor().stream_reader(
+                io.BytesIO(body))
+            result = reader.read(limit + 1)
+        else:
+            decompressor = zlib.decompressobj(wbits=_WBITS[encoding])
+            result = decompressor.decompress(body, limit + 1)
+            if len(result) <= limit and decompressor.eof is False:
+                raise ValueError('Truncated data')
+    except _ERRORS as exception_error:
+        raise ValueError(exception_error)
+    if len(result) > limit:
+        raise ValueError('Decompressed data is too large')
+
+    # Return
+    return result
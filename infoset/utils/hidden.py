@@ -80,6 +80,20 @@ class Directory:
         value = ('%s/lock') % self.root
         return value
 
+    def status(self):
+        """Method for defining the hidden status directory.
+
+        Args:
+            None
+
+        Returns:
+            value: status directory
+
+        """
+        # Return
+        value = ('%s/status') % self.root
+        return value
+
 
 class File:
     """A class for creating the names of hidden files."""
@@ -157,6 +171,21 @@ class File:
         value = ('%s/%s.lock') % (self.directory.lock(), prefix)
         return value
 
+    def status(self, prefix):
+        """Method for defining the hidden status file.
+
+        Args:
+            prefix: Prefix of file
+
+        Returns:
+            value: status file
+
+        """
+        # Return
+        _mkdir(self.directory.status())
+        value = ('%s/%s.json') % (self.directory.status(), prefix)
+        return value
+
 
 class Touch:
     """A class for updating modifed times for hidden files."""
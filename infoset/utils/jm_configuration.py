@@ -202,6 +202,26 @@ class Config(object):
         # Return
         return value
 
+    def ingest_cache_sharded(self):
+        """Get ingest_cache_sharded.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_cache_sharded'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to False
+        if result is None:
+            result = False
+        return bool(result)
+
     def ingest_failures_directory(self):
         """Determine the ingest_failures_directory.
 
@@ -342,6 +362,248 @@ class Config(object):
             result = 20
         return result
 
+    def ingest_processes(self):
+        """Get ingest_processes.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_processes'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 0. Files are then processed by the ingest threads
+        if result is None:
+            result = 0
+        return int(result)
+
+    def ingest_lease_timeout(self):
+        """Get ingest_lease_timeout.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_lease_timeout'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 600. Ingest daemons renew their leases every minute
+        if result is None:
+            result = 600
+        return int(result)
+
+    def ingest_watch(self):
+        """Get ingest_watch.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_watch'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to True
+        if result is None:
+            result = True
+        return bool(result)
+
+    def ingest_registry_refresh(self):
+        """Get ingest_registry_refresh.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_registry_refresh'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 300
+        if result is None:
+            result = 300
+        return int(result)
+
+    def ingest_direct(self):
+        """Get ingest_direct.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_direct'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to True
+        if result is None:
+            result = True
+        return bool(result)
+
+    def ingest_direct_threads(self):
+        """Get ingest_direct_threads.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_direct_threads'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 4
+        if result is None:
+            result = 4
+        return int(result)
+
+    def ingest_direct_queue(self):
+        """Get ingest_direct_queue.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_direct_queue'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 1000. Data is saved in the cache directory when the
+        # queue is full
+        if result is None:
+            result = 1000
+        return int(result)
+
+    def ingest_direct_timeout(self):
+        """Get ingest_direct_timeout.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_direct_timeout'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 10 seconds. Agents are asked to send the data again
+        # if it isn't ingested or saved by then
+        if result is None:
+            result = 10
+        return float(result)
+
+    def ingest_spool_queue(self):
+        """Get ingest_spool_queue.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_spool_queue'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 10000. Received data is refused when the queue is full
+        if result is None:
+            result = 10000
+        return int(result)
+
+    def ingest_spool_interval(self):
+        """Get ingest_spool_interval.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'ingest_spool_interval'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 0.1 seconds
+        if result is None:
+            result = 0.1
+        return float(result)
+
+    def receiver_concurrency(self):
+        """Get receiver_concurrency.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'receiver_concurrency'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 256
+        if result is None:
+            result = 256
+        return int(result)
+
+    def receiver_threads(self):
+        """Get receiver_threads.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Get result
+        key = 'server'
+        sub_key = 'receiver_threads'
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 16
+        if result is None:
+            result = 16
+        return int(result)
+
     def log_file(self):
         """Get log_file.
 
@@ -529,6 +791,229 @@ class ConfigAgent(object):
         # Return
         return value
 
+    def agent_precompute_dids(self):
+        """Get agent_precompute_dids.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Initialize key variables
+        key = 'agents_common'
+        sub_key = 'agent_precompute_dids'
+
+        # Get result
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+        if result is None:
+            result = False
+        return bool(result)
+
+    def agent_compact_format(self):
+        """Get agent_compact_format.
+
+        Args:
+            None
+
+        Returns:
+            result: result
+
+        """
+        # Initialize key variables
+        key = 'agents_common'
+        sub_key = 'agent_compact_format'
+
+        # Get result
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+        if result is None:
+            result = False
+        return bool(result)
+
+    def agent_compression(self):
+        """Get agent_compression.
+
+        Args:
+            None
+
+        Returns:
+            result: Content-Encoding of posted data. None if data isn't
+                compressed
+
+        """
+        # Initialize key variables
+        key = 'agents_common'
+        sub_key = 'agent_compression'
+
+        # Get result
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to no compression
+        if result is None or result is False:
+            result = None
+        else:
+            result = str(result).lower()
+        return result
+
+    def agent_batch_size(self):
+        """Get agent_batch_size.
+
+        Args:
+            None
+
+        Returns:
+            result: Number of hosts whose data is posted in one request
+
+        """
+        # Initialize key variables
+        key = 'agents_common'
+        sub_key = 'agent_batch_size'
+
+        # Get result
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 100
+        if result is None:
+            result = 100
+        return int(result)
+
+    def agent_connect_timeout(self):
+        """Get agent_connect_timeout.
+
+        Args:
+            None
+
+        Returns:
+            result: Seconds to wait for a connection to the server
+
+        """
+        # Initialize key variables
+        key = 'agents_common'
+        sub_key = 'agent_connect_timeout'
+
+        # Get result
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 5
+        if result is None:
+            result = 5
+        return float(result)
+
+    def agent_read_timeout(self):
+        """Get agent_read_timeout.
+
+        Args:
+            None
+
+        Returns:
+            result: Seconds to wait for a response from the server
+
+        """
+        # Initialize key variables
+        key = 'agents_common'
+        sub_key = 'agent_read_timeout'
+
+        # Get result
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 30
+        if result is None:
+            result = 30
+        return float(result)
+
+    def agent_retries(self):
+        """Get agent_retries.
+
+        Args:
+            None
+
+        Returns:
+            result: Number of times a request is retried when the server
+                can't be reached
+
+        """
+        # Initialize key variables
+        key = 'agents_common'
+        sub_key = 'agent_retries'
+
+        # Get result
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 2
+        if result is None:
+            result = 2
+        return int(result)
+
+    def agent_breaker_failures(self):
+        """Get agent_breaker_failures.
+
+        Args:
+            None
+
+        Returns:
+            result: Number of consecutive failures to reach the server
+                after which agents stop contacting it for a while
+
+        """
+        # Initialize key variables
+        key = 'agents_common'
+        sub_key = 'agent_breaker_failures'
+
+        # Get result
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 3
+        if result is None:
+            result = 3
+        return int(result)
+
+    def agent_purge_rate(self):
+        """Get agent_purge_rate.
+
+        Args:
+            None
+
+        Returns:
+            result: Maximum number of requests per second made to post
+                cached data
+
+        """
+        # Initialize key variables
+        key = 'agents_common'
+        sub_key = 'agent_purge_rate'
+
+        # Get result
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 10
+        if result is None:
+            result = 10
+        return float(result)
+
+    def agent_cache_quota(self):
+        """Get agent_cache_quota.
+
+        Args:
+            None
+
+        Returns:
+            result: Maximum size of the cached data of an agent in bytes.
+                The configured value is in megabytes.
+
+        """
+        # Initialize key variables
+        key = 'agents_common'
+        sub_key = 'agent_cache_quota'
+
+        # Get result
+        result = _key_sub_key(key, sub_key, self.config_dict, die=False)
+
+        # Default to 1024
+        if result is None:
+            result = 1024
+        return int(float(result) * 1024 * 1024)
+
     def language(self):
         """Get language.
 
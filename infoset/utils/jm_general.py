@@ -8,6 +8,7 @@ import time
 import subprocess
 import locale
 import hashlib
+import functools
 # Pip libraries
 import yaml
 
@@ -15,6 +16,10 @@ import yaml
 from infoset.utils import log
 from infoset import infoset
 
+# Maximum number of DIDs to memoize. DID inputs rarely change from poll
+# to poll, so this should exceed the number of datapoints being tracked.
+_DID_CACHE_SIZE = 131072
+
 
 def root_directory():
     """Getermine the root directory in which infoset is installed.
@@ -122,6 +127,74 @@ def hashstring(string, sha=256, utf8=False):
     return result
 
 
+def did(uid, label, index, agent_name, hostname):
+    """Create a unique datapoint ID (DID) from agent data.
+
+    Recently created DIDs are memoized.
+
+    Args:
+        uid: UID of device that created the agent data
+        label: Label of the data
+        index: Index of the data
+        agent_name: Name of agent
+        hostname: Hostname
+
+    Returns:
+        value: Datapoint ID
+
+    """
+    # Use the memo table unless the values can't be hashed
+    try:
+        value = _did_memoized(uid, label, index, agent_name, hostname)
+    except TypeError:
+        value = _did(uid, label, index, agent_name, hostname)
+
+    # Return
+    return value
+
+
+def did_cache_info():
+    """Get the DID memo table statistics of the current process.
+
+    Args:
+        None
+
+    Returns:
+        value: Named tuple of (hits, misses, maxsize, currsize)
+
+    """
+    # Return
+    value = _did_memoized.cache_info()
+    return value
+
+
+def _did(uid, label, index, agent_name, hostname):
+    """Create a unique datapoint ID (DID) from agent data.
+
+    Args:
+        uid: UID of device that created the agent data
+        label: Label of the data
+        index: Index of the data
+        agent_name: Name of agent
+        hostname: Hostname
+
+    Returns:
+        value: Datapoint ID
+
+    """
+    # Initialize key variables
+    prehash = ('%s%s%s%s%s') % (uid, label, index, agent_name, hostname)
+    value = hashstring(prehash)
+
+    # Return
+    return value
+
+
+# Keys must be typed. 1, 1.0 and True are equal but create different DIDs
+_did_memoized = functools.lru_cache(
+    maxsize=_DID_CACHE_SIZE, typed=True)(_did)
+
+
 def validate_timestamp(timestamp):
     """Validate timestamp to be a multiple of 300 seconds.
 
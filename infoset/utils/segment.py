@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+
+"""Append-only segment log of agent data that could not be posted.
+
+Records are appended to numbered segment files in a directory per agent:
+
+    <sequence>.seg
+
+Each record is agent data as zlib compressed JSON, preceded by a header
+with the length and CRC32 checksum of the compressed data. A new segment
+is started when the current one is full, and whenever the log is opened
+so that records are never appended after a partially written one. The
+"index" file holds the segment and offset of the first record that
+hasn't been posted.
+
+Segments are deleted once all their records have been posted. The oldest
+segments are deleted, posted or not, when the log exceeds its quota.
+
+"""
+
+# Standard libraries
+import os
+import json
+import struct
+import threading
+import zlib
+
+# Infoset libraries
+from infoset.utils import log
+
+# Record header. Length and CRC32 checksum of the compressed data
+_HEADER = struct.Struct('>II')
+
+# Filename extension of segments
+_EXTENSION = '.seg'
+
+# Name of the index file
+_INDEX = 'index'
+
+# Default maximum size of a segment in bytes
+SEGMENT_SIZE = 4 * 1024 * 1024
+
+
+class SegmentLog(object):
+    """Segment log of a single agent.
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Methods:
+        append:
+        start:
+        read:
+        commit:
+        pending:
+
+    """
+
+    def __init__(self, directory, quota, segment_size=SEGMENT_SIZE):
+        """Method initializing the class.
+
+        Args:
+            directory: Directory of the log. It is created if it doesn't
+                exist.
+            quota: Maximum size of the log in bytes
+            segment_size: Size after which a new segment is started
+
+        Returns:
+            None
+
+        """
+        # Initialize key variables
+        self.directory = directory
+        self.quota = quota
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        self.handle = None
+
+        # Get existing segments
+        os.makedirs(directory, exist_ok=True)
+        self.segments = []
+        self.sizes = {}
+        for name in os.listdir(directory):
+            (sequence, extension) = os.path.splitext(name)
+            if extension == _EXTENSION and sequence.isdigit() is True:
+                self.segments.append(int(sequence))
+                self.sizes[int(sequence)] = os.path.getsize(
+                    os.path.join(directory, name))
+        self.segments.sort()
+        self.total = sum(self.sizes.values())
+
+        # Records are appended to a new segment
+        if bool(self.segments) is True:
+            self.current = self.segments[-1] + 1
+        else:
+            self.current = 0
+
+        # Get the position of the first record that hasn't been posted
+        self.position = self._load()
+
+    def append(self, data):
+        """Append agent data to the log.
+
+        Args:
+            data: Dict of agent data
+
+        Returns:
+            None
+
+        """
+        # Create record
+        payload = zlib.compress(json.dumps(data).encode())
+        record = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        # Append
+        with self.lock:
+            if self.handle is None or (
+                    self.sizes[self.current] >= self.segment_size):
+                self._rotate()
+            self.handle.write(record)
+            self.handle.flush()
+            self.sizes[self.current] += len(record)
+            self.total += len(record)
+
+            # Keep the log within its quota
+            self._evict()
+
+    def start(self):
+        """Get the position of the first record that hasn't been posted.
+
+        Args:
+            None
+
+        Returns:
+            position: (segment, offset) tuple
+
+        """
+        # Return
+        with self.lock:
+            position = self.position
+        return position
+
+    def read(self, position, limit):
+        """Read records in the order they were appended.
+
+        Args:
+            position: (segment, offset) tuple of the first record to read
+            limit: Maximum number of records to read
+
+        Returns:
+            (records, position): List of records as JSON bytes, and the
+                position of the record after them
+
+        """
+        # Initialize key variables
+        records = []
+        (last, offset) = position
+
+        with self.lock:
+            for segment in self.segments:
+                # Skip segments that have already been read
+                if segment < position[0]:
+                    continue
+                if segment != last:
+                    (last, offset) = (segment, 0)
+                if offset >= self.sizes[segment]:
+                    continue
+
+                # Read records
+                offset = self._read(
+                    segment, offset, limit - len(records), records)
+                if len(records) >= limit:
+                    break
+
+        # Return
+        return (records, (last, offset))
+
+    def commit(self, position):
+        """Record that the records before a position have been posted.
+
+        Args:
+            position: (segment, offset) tuple returned by read
+
+        Returns:
+            None
+
+        """
+        with self.lock:
+            # Ignore positions of records that were evicted
+            if position <= self.position:
+                return
+            self.position = position
+
+            # Delete segments whose records have all been posted
+            while bool(self.segments) is True:
+                segment = self.segments[0]
+                if segment > position[0]:
+                    break
+                if segment == position[0] and (
+                        segment == self.current or
+                        position[1] < self.sizes[segment]):
+                    break
+                self._remove()
+
+            # Save the position
+            self._save()
+
+    def pending(self):
+        """Determine whether there are records that haven't been posted.
+
+        Args:
+            None
+
+        Returns:
+            value: True if there are records
+
+        """
+        # Initialize key variables
+        value = False
+
+        # Check
+        with self.lock:
+            (current, offset) = self.position
+            for segment in self.segments:
+                if segment > current and self.sizes[segment] > 0:
+                    value = True
+                elif segment == current and self.sizes[segment] > offset:
+                    value = True
+
+        # Return
+        return value
+
+    def _path(self, segment):
+        """Get the path of a segment.
+
+        Args:
+            segment: Sequence number of the segment
+
+        Returns:
+            value: Path
+
+        """
+        # Return
+        value = os.path.join(
+            self.directory, ('%012d%s') % (segment, _EXTENSION))
+        return value
+
+    def _read(self, segment, offset, limit, records):
+        """Read records from a segment.
+
+        Args:
+            segment: Sequence number of the segment
+            offset: Offset of the first record
+            limit: Maximum number of records to read
+            records: List to append records to
+
+        Returns:
+            offset: Offset of the record after the last one read
+
+        """
+        # Initialize key variables
+        size = self.sizes[segment]
+        count = 0
+
+        with open(self._path(segment), 'rb') as f_handle:
+            f_handle.seek(offset)
+            while offset < size and count < limit:
+                # Read the record. The rest of the segment is skipped if
+                # the record was only partially written.
+                header = f_handle.read(_HEADER.size)
+                record = None
+                if len(header) == _HEADER.size:
+                    (length, checksum) = _HEADER.unpack(header)
+                    payload = f_handle.read(length)
+                    if len(payload) == length and (
+                            zlib.crc32(payload) == checksum):
+                        try:
+                            record = zlib.decompress(payload)
+                        except zlib.error:
+                            pass
+                if record is None:
+                    log_message = (
+                        'Segment %s is corrupted after offset %s. Skipping '
+                        'the rest of the segment.'
+                        '') % (self._path(segment), offset)
+                    log.log2warn(1137, log_message)
+                    offset = size
+                    break
+
+                records.append(record)
+                count += 1
+                offset += _HEADER.size + length
+
+        # Return
+        return offset
+
+    def _rotate(self):
+        """Start a new segment.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Close the current segment
+        if self.handle is not None:
+            self.handle.close()
+            self.current += 1
+
+        # Open the new one
+        self.handle = open(self._path(self.current), 'ab')
+        self.segments.append(self.current)
+        self.sizes[self.current] = 0
+
+    def _evict(self):
+        """Delete the oldest segments if the log exceeds its quota.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        while self.total > self.quota and len(self.segments) > 1:
+            # Delete the oldest segment
+            segment = self.segments[0]
+            unposted = self.position < (segment, self.sizes[segment])
+            self._remove()
+
+            # Skip its records when posting
+            if self.position < (self.segments[0], 0):
+                self.position = (self.segments[0], 0)
+                self._save()
+
+            # Log
+            if unposted is True:
+                log_message = (
+                    'Agent cache %s exceeds its quota of %s bytes. Deleted '
+                    'data that was not posted in segment %s.'
+                    '') % (self.directory, self.quota, self._path(segment))
+                log.log2warn(1138, log_message)
+
+    def _remove(self):
+        """Delete the oldest segment.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Delete
+        segment = self.segments.pop(0)
+        self.total -= self.sizes.pop(segment)
+        try:
+            os.remove(self._path(segment))
+        except FileNotFoundError:
+            pass
+
+    def _load(self):
+        """Read the position of the first record that hasn't been posted.
+
+        Args:
+            None
+
+        Returns:
+            position: (segment, offset) tuple
+
+        """
+        # Initialize key variables
+        position = (self.current, 0)
+        if bool(self.segments) is True:
+            position = (self.segments[0], 0)
+
+        # Read the index
+        try:
+            with open(os.path.join(self.directory, _INDEX), 'r') as f_handle:
+                (segment, offset) = f_handle.read().split()
+            position = max(position, (int(segment), int(offset)))
+        except (OSError, ValueError):
+            pass
+
+        # Return
+        return position
+
+    def _save(self):
+        """Save the position of the first record that hasn't been posted.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        """
+        # Replace the index so that it is never partially written
+        path = os.path.join(self.directory, _INDEX)
+        temporary = ('%s.tmp') % (path)
+        with open(temporary, 'w') as f_handle:
+            f_handle.write(('%s %s\n') % self.position)
+        os.replace(temporary, path)
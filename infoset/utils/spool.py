@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""Functions for managing agent and ingest cache directories.
+
+Cache files are named "<timestamp>_<uid>_<hosthash>.<extension>" where
+the extension is "json", or "isc" for data in the compact format. The
+extension of files whose data was validated when it was received starts
+with "v1.", the version of the validation. They are either stored
+directly in the cache directory (flat layout) or in a sub-directory named
+after the first two characters of the hosthash (sharded layout). Readers
+always handle both layouts.
+
+"""
+
+import os
+import re
+import json
+
+# Marker of files whose data was validated when it was received
+VALIDATED = 'v1'
+
+# Filenames must start with a numeric timestamp and
+# end with a hex string
+FILENAME_REGEX = re.compile(
+    r'^\d+_[0-9a-f]+_[0-9a-f]+\.(%s\.)?(json|isc)$' % (VALIDATED))
+
+# Shard sub-directories are named with two hex characters
+SHARD_REGEX = re.compile(r'^[0-9a-f]{2}$')
+
+
+def filename(timestamp, uid, hosthash, extension='json'):
+    """Create the name of a cache file.
+
+    Args:
+        timestamp: Timestamp of the data
+        uid: UID of the agent
+        hosthash: Hash of the hostname
+        extension: Filename extension
+
+    Returns:
+        value: Filename
+
+    """
+    # Return
+    value = ('%s_%s_%s.%s') % (timestamp, uid, hosthash, extension)
+    return value
+
+
+def validated_extension(extension):
+    """Get the extension of a cache file whose data was validated.
+
+    Args:
+        extension: Filename extension of the format of the data
+
+    Returns:
+        value: Filename extension
+
+    """
+    # Return
+    value = ('%s.%s') % (VALIDATED, extension)
+    return value
+
+
+def validated(name):
+    """Determine whether the data of a cache file was validated.
+
+    Args:
+        name: Filename
+
+    Returns:
+        value: True if the data was validated when it was received
+
+    """
+    # Return
+    value = ('.%s.') % (VALIDATED) in name
+    return value
+
+
+def shard(hosthash):
+    """Get the name of the shard for a hosthash.
+
+    Args:
+        hosthash: Hash of the hostname
+
+    Returns:
+        value: Shard name
+
+    """
+    # Return
+    value = hosthash[:2]
+    return value
+
+
+def directory(cache_dir, hosthash, sharded):
+    """Get the directory in which to store a host's cache files.
+
+    Args:
+        cache_dir: Cache directory
+        hosthash: Hash of the hostname
+        sharded: Use the sharded layout if True
+
+    Returns:
+        value: Directory. It is created if it doesn't exist.
+
+    """
+    # Initialize key variables
+    value = cache_dir
+
+    # Get shard directory
+    if sharded is True:
+        value = os.path.join(cache_dir, shard(hosthash))
+        if os.path.isdir(value) is False:
+            try:
+                os.mkdir(value)
+            except FileExistsError:
+                # Created by another thread or process
+                pass
+
+    # Return
+    return value
+
+
+def filepath(cache_dir, timestamp, uid, hosthash, sharded, extension='json'):
+    """Create the path of a cache file.
+
+    Args:
+        cache_dir: Cache directory
+        timestamp: Timestamp of the data
+        uid: UID of the agent
+        hosthash: Hash of the hostname
+        sharded: Use the sharded layout if True
+        extension: Filename extension
+
+    Returns:
+        value: Filepath
+
+    """
+    # Return
+    value = os.path.join(
+        directory(cache_dir, hosthash, sharded),
+        filename(timestamp, uid, hosthash, extension=extension))
+    return value
+
+
+def save(cache_dir, data, hosthash, sharded, payload=None, extension='json'):
+    """Save agent data as a cache file.
+
+    The data is written to a hidden temporary file that is then renamed.
+    Ingest daemons only see complete files.
+
+    Args:
+        cache_dir: Cache directory
+        data: Dict of agent data
+        hosthash: Hash of the hostname
+        sharded: Use the sharded layout if True
+        payload: Bytes to write instead of data converted to JSON
+        extension: Filename extension
+
+    Returns:
+        value: Filepath
+
+    """
+    # Initialize key variables
+    value = filepath(
+        cache_dir, data['timestamp'], data['uid'], hosthash, sharded,
+        extension=extension)
+    temp_path = temporary(value)
+
+    # Write
+    write(temp_path, data, payload=payload)
+    os.rename(temp_path, value)
+
+    # Return
+    return value
+
+
+def temporary(path):
+    """Get the path of the hidden temporary file of a cache file.
+
+    Args:
+        path: Path of the cache file
+
+    Returns:
+        value: Path of the temporary file
+
+    """
+    # Return
+    value = ('%s/.%s.tmp') % (os.path.dirname(path), os.path.basename(path))
+    return value
+
+
+def write(path, data, payload=None):
+    """Write agent data to a file.
+
+    Args:
+        path: Path of the file
+        data: Dict of agent data
+        payload: Bytes to write instead of data converted to JSON
+
+    Returns:
+        None
+
+    """
+    # Write
+    if payload is None:
+        with open(path, 'w') as f_handle:
+            json.dump(data, f_handle)
+    else:
+        with open(path, 'wb') as f_handle:
+            f_handle.write(payload)
+
+
+def sync(path):
+    """Flush a file or directory to disk.
+
+    Args:
+        path: Path of the file or directory
+
+    Returns:
+        None
+
+    """
+    # Flush
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def shards(cache_dir):
+    """List the directories that can contain cache files.
+
+    Args:
+        cache_dir: Cache directory
+
+    Returns:
+        directories: List of directories, starting with cache_dir
+
+    """
+    # Initialize key variables
+    directories = [cache_dir]
+
+    # Get shard directories
+    for name in sorted(os.listdir(cache_dir)):
+        if bool(SHARD_REGEX.match(name)) is True:
+            path = os.path.join(cache_dir, name)
+            if os.path.isdir(path) is True:
+                directories.append(path)
+
+    # Return
+    return directories
+
+
+def files(cache_dir, hosthash=None):
+    """Get cache files, listing one directory at a time.
+
+    Args:
+        cache_dir: Cache directory
+        hosthash: Only list the flat directory and the shard for this
+            hosthash if not None
+
+    Returns:
+        None
+
+    Yields:
+        path: Path of a cache file
+
+    """
+    # Get the directories to list
+    if hosthash is None:
+        directories = shards(cache_dir)
+    else:
+        directories = [cache_dir, os.path.join(cache_dir, shard(hosthash))]
+
+    # List directories
+    for path in directories:
+        for filepath in files_in(path):
+            yield filepath
+
+
+def files_in(path):
+    """Get the cache files in a single directory.
+
+    Args:
+        path: Directory
+
+    Returns:
+        filepaths: List of cache filepaths
+
+    """
+    # Initialize key variables
+    filepaths = []
+
+    # List directory
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        if bool(FILENAME_REGEX.match(name)) is True:
+            filepaths.append(os.path.join(path, name))
+
+    # Return
+    return filepaths
+
+
+def migrate(cache_dir):
+    """Move cache files in a flat directory into the sharded layout.
+
+    Args:
+        cache_dir: Cache directory
+
+    Returns:
+        count: Number of files moved
+
+    """
+    # Initialize key variables
+    count = 0
+
+    # Move files
+    for name in os.listdir(cache_dir):
+        if bool(FILENAME_REGEX.match(name)) is False:
+            continue
+        hosthash = name.split('.')[0].split('_')[2]
+        target = directory(cache_dir, hosthash, True)
+        os.rename(os.path.join(cache_dir, name), os.path.join(target, name))
+        count += 1
+
+    # Return
+    return count
@@ -6,14 +6,13 @@ Contains all routes that infoset's Flask webserver uses
 # Standard imports
 from datetime import datetime
 import time
-import json
 import operator
 from os import path
 from os import walk
 
 # Pip imports
 import yaml
-from flask import render_template, jsonify, request
+from flask import render_template, jsonify, request, abort
 
 # Infoset imports
 from infoset.db.db_agent import GetUID
@@ -25,9 +24,10 @@ from infoset.db.db_host import GetIDX as GetHostIDX
 from infoset.db.db import Database
 from infoset.charts import TimeStamp
 from infoset.charts import ColorWheel
-from infoset.utils import jm_general
 from infoset.metadata import language
 from infoset.db import db_datapoint
+from infoset.cache import receiver
+from infoset.cache import writer
 from infoset.db import db_agent
 from infoset.db import db_host
 from infoset.topology import pages
@@ -367,25 +367,61 @@ def receive(uid):
     """
     # TODO replace with config obj
     config = infoset.config['GLOBAL_CONFIG']
-    cache_dir = config.ingest_cache_directory()
 
-    # Get Json from incoming agent POST
-    data = request.json
-    timestamp = data['timestamp']
-    uid = data['uid']
-    hostname = data['hostname']
+    # Ingest the data, or save it in the ingest cache directory if it
+    # can't be ingested right away
+    status = receiver.receive(
+        config, request.mimetype, request.get_data(),
+        request.headers.get('Content-Encoding'))
+    if status == 503:
+        return _busy()
+    if status != 200:
+        abort(status)
 
-    # Create a hash of the hostname
-    host_hash = jm_general.hashstring(hostname, sha=1)
-    json_path = ('%s/%s_%s_%s.json') % (cache_dir, timestamp, uid, host_hash)
+    return "Received"
+
+
+@infoset.route('/receive/batch/<uid>', methods=["POST"])
+def receive_batch(uid):
+    """Function for handling /receive/batch/<uid> route.
 
-    with open(json_path, "w+") as temp_file:
-        json.dump(data, temp_file)
-        temp_file.close()
+    Args:
+        uid: Unique Identifier of the Infoset Agent posting the batch
+
+    Returns:
+        Text response of Received
+
+    """
+    # Initialize key variables
+    config = infoset.config['GLOBAL_CONFIG']
+
+    # Ingest the data of each host in the batch
+    status = receiver.receive_batch(
+        config, request.mimetype, request.get_data(),
+        request.headers.get('Content-Encoding'))
+    if status == 503:
+        return _busy()
+    if status != 200:
+        abort(status)
 
     return "Received"
 
 
+def _busy():
+    """Create the response to data that can't be accepted right now.
+
+    Args:
+        None
+
+    Returns:
+        HTTP 503 response with a Retry-After header
+
+    """
+    return (
+        'Service Unavailable', 503,
+        {'Retry-After': str(writer.RETRY_AFTER)})
+
+
 @infoset.route('/fetch/agent/<uid>', methods=["GET", "POST"])
 def fetch_agent_dp(uid):
     """Function for handling /fetch/agent/<uid> route.